@@ -0,0 +1,76 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Compares BuchiAutomaton.ap_substitute against the old edge-by-edge bdd_compose substitution
+# on a chain of adders: a_0 + a_1 = a_2, a_2 + a_3 = a_4, ...
+# Usage: python3 benchmarks/ap_substitute.py [num_adders]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+import buddy
+
+from pecan.automata.buchi import BuchiAutomaton, Builder, buchi_transform
+from pecan.tools.hoa_loader import load_hoa
+from pecan.utility import VarMap
+
+class SequentialSubstitution(Builder):
+    def __init__(self, subs):
+        self.subs = subs
+
+    def pre_build(self, new_aut):
+        for k, v in self.subs.items():
+            self.subs[k] = buddy.bdd_ithvar(new_aut.register_ap(v))
+
+    def build_cond(self, cond):
+        for var, new_formula in self.subs.items():
+            cond = buddy.bdd_compose(cond, new_formula, var)
+        return cond
+
+def adder_chain(n):
+    adder = load_hoa(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'library', 'automata', 'bin_add.aut'))
+    env = VarMap()
+
+    result = None
+    for i in range(n):
+        arg_map = {'a': 'a_{}'.format(2 * i), 'b': 'a_{}'.format(2 * i + 1), 'c': 'a_{}'.format(2 * i + 2)}
+        step = adder.substitute(arg_map, env)
+        result = step if result is None else result & step
+
+    return result
+
+def time_it(f):
+    start = time.time()
+    res = f()
+    return res, time.time() - start
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    aut = adder_chain(n)
+
+    print('Adder chain of length {}: {} states, {} edges'.format(n, aut.num_states(), aut.num_edges()))
+
+    ap_subs = {}
+    for v, aps in aut.get_var_map().items():
+        for ap in aps:
+            ap_subs[ap] = BuchiAutomaton.fresh_ap()
+
+    def old_substitute():
+        bdd_subs = {aut.get_aut().register_ap(k): v for k, v in ap_subs.items()}
+        return buchi_transform(aut.get_aut(), SequentialSubstitution(bdd_subs))
+
+    old_aut, old_time = time_it(old_substitute)
+    new_aut, new_time = time_it(lambda: aut.ap_substitute(ap_subs).get_aut())
+
+    print('edge-by-edge bdd_compose: {:.4f} seconds'.format(old_time))
+    print('ap_substitute:            {:.4f} seconds'.format(new_time))
+
+    if not old_aut.equivalent_to(new_aut):
+        print('ERROR: substitution results differ!')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Counts how many AP substitutions have to rewrite an automaton's edges when running the examples,
+# with and without the program-wide AP registry (see pecan.utility.APRegistry).
+# Usage: python3 benchmarks/ap_substitutions.py [example.pn ...]
+
+import glob
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+import spot
+
+from pecan import program
+from pecan.settings import settings
+
+def run_examples(filenames, canonical_aps):
+    settings.set_canonical_aps(canonical_aps)
+    settings.stdlib_prog = None
+
+    counts = {}
+    for filename in filenames:
+        settings.reset_stats()
+
+        try:
+            program.load(filename).evaluate()
+        except Exception as e:
+            print('[WARN] {} failed: {}'.format(filename, e))
+            continue
+
+        counts[filename] = settings.get_stats().get('AP substitutions rewriting edges', 0)
+
+    return counts
+
+def main():
+    filenames = sys.argv[1:] or sorted(glob.glob(os.path.join('examples', '*.pn')))
+
+    settings.set_quiet(True)
+    spot.setup()
+
+    before = run_examples(filenames, False)
+    after = run_examples(filenames, True)
+
+    print('{:<50} {:>10} {:>10}'.format('file', 'fresh', 'canonical'))
+    for filename in filenames:
+        if filename in before and filename in after:
+            print('{:<50} {:>10} {:>10}'.format(os.path.basename(filename), before[filename], after[filename]))
+
+    total_before = sum(v for k, v in before.items() if k in after)
+    total_after = sum(v for k, v in after.items() if k in before)
+    print('{:<50} {:>10} {:>10}'.format('total', total_before, total_after))
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(2000)
+    main()
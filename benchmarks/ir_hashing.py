@@ -0,0 +1,44 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Times ExpressionFrequency (the counting pass of CSE) on formulas of growing size, like the long sums that Praline's
+# emit generates. With cached hashes, the time per node should stay about the same.
+# Usage: python3 benchmarks/ir_hashing.py [max size]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from pecan.lang.ir import *
+from pecan.lang.optimizer.tools import ExpressionFrequency
+
+def make_formula(n):
+    # x + y0 + ... + yn = z: each partial sum is a node whose hash covers the whole sum below it
+    total = VarRef('x')
+    for i in range(n):
+        total = Add(total, VarRef('y{}'.format(i)))
+    return Equals(total, VarRef('z'))
+
+def main():
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1600
+
+    print('{:>8} {:>12} {:>12} {:>14}'.format('size', 'expressions', 'seconds', 'us per node'))
+
+    n = 100
+    while n <= max_size:
+        formula = make_formula(n)
+
+        start_time = time.time()
+        freq = ExpressionFrequency().count(formula)
+        elapsed = time.time() - start_time
+
+        nodes = sum(freq.values())
+        print('{:>8} {:>12} {:>12.4f} {:>14.2f}'.format(n, len(freq), elapsed, 1e6 * elapsed / nodes))
+
+        n *= 2
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(100000)
+    main()
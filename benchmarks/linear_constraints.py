@@ -0,0 +1,54 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Compares building linear constraints directly (see pecan.tools.linear_constraint) against combining adders,
+# on constraints with growing coefficients.
+# Usage: python3 benchmarks/linear_constraints.py [max coefficient exponent]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+import spot
+
+from pecan import program
+from pecan.settings import settings
+
+CONSTRAINTS = [
+    'x + {c}*y = {c}*z + 7',
+    '{c}*x + 3*y < z + {c}',
+    'x - {c}*y = z',
+]
+
+def run(source, linear_constraints):
+    settings.set_linear_constraints(linear_constraints)
+
+    prog = program.from_source(source)
+
+    start_time = time.time()
+    prog.evaluate()
+    aut = prog.call('p')
+    return aut.num_states(), time.time() - start_time
+
+def main():
+    max_exp = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+
+    settings.set_quiet(True)
+    spot.setup()
+
+    print('{:<30} {:>14} {:>14} {:>12} {:>12}'.format('constraint', 'states (adders)', 'states (direct)', 'time (adders)', 'time (direct)'))
+    for constraint in CONSTRAINTS:
+        for exp in range(max_exp + 1):
+            formula = constraint.format(c=2**exp + 1)
+            source = 'Restrict x, y, z are nat.\np(x, y, z) := {}\n'.format(formula)
+
+            states_before, time_before = run(source, False)
+            states_after, time_after = run(source, True)
+
+            print('{:<30} {:>14} {:>14} {:>12.3f} {:>12.3f}'.format(formula, states_before, states_after, time_before, time_after))
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(2000)
+    main()
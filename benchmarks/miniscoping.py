@@ -0,0 +1,57 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Compares the largest automaton built (and the runtime) for each example with and without the miniscoping pass
+# (see pecan.lang.optimizer.miniscoping_optimizer).
+# Usage: python3 benchmarks/miniscoping.py [example.pn ...]   (defaults to every example in examples/)
+
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+import spot
+
+from pecan import program
+from pecan.settings import settings
+
+def run_examples(filenames, miniscoping):
+    settings.set_miniscoping(miniscoping)
+
+    results = {}
+    for filename in filenames:
+        settings.reset_stats()
+
+        start_time = time.time()
+        try:
+            program.load(filename).evaluate()
+        except Exception as e:
+            print('[WARN] {} failed: {}'.format(filename, e))
+            continue
+
+        stats = settings.get_stats()
+        results[filename] = (stats.get('peak automaton states', 0), stats.get('peak automaton edges', 0), time.time() - start_time)
+
+    return results
+
+def main():
+    filenames = sys.argv[1:] or sorted(glob.glob(os.path.join('examples', '*.pn')))
+
+    settings.set_quiet(True)
+    spot.setup()
+
+    before = run_examples(filenames, False)
+    after = run_examples(filenames, True)
+
+    print('{:<40} {:>14} {:>14} {:>10} {:>10}'.format('file', 'peak (before)', 'peak (after)', 'time (before)', 'time (after)'))
+    for filename in filenames:
+        if filename in before and filename in after:
+            (states_before, edges_before, time_before), (states_after, edges_after, time_after) = before[filename], after[filename]
+            print('{:<40} {:>14} {:>14} {:>10.2f} {:>10.2f}'.format(os.path.basename(filename),
+                '{}/{}'.format(states_before, edges_before), '{}/{}'.format(states_after, edges_after), time_before, time_after))
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(2000)
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Measures how long it takes to get the AST of a large generated .pn file by parsing it, and by loading it from the
+# parse cache (see pecan.tools.parse_cache).
+# Usage: python3 benchmarks/parse_cache.py [number of predicates] [runs]
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from pecan.lang.parser import pecan_parser
+from pecan.settings import settings
+from pecan.tools import parse_cache
+
+def generate_source(num_preds):
+    lines = ['Restrict x, y, z is nat.']
+    for i in range(num_preds):
+        lines.append('p{}(x, y) := x + {} = y & (y < x | exists z. z + x = y + {})'.format(i, i, i + 1))
+        lines.append('m{}(y) := y = min {{ x : p{}(x, y) }}'.format(i, i))
+    return '\n'.join(lines) + '\n'
+
+def time_parse(source_code, runs):
+    times = []
+    for _ in range(runs):
+        start_time = time.time()
+        parse_cache.parse(pecan_parser, source_code)
+        times.append(time.time() - start_time)
+    return sum(times) / len(times)
+
+def main():
+    num_preds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    source_code = generate_source(num_preds)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        settings.set_cache_dir(cache_dir)
+
+        settings.set_parse_cache(False)
+        no_cache = time_parse(source_code, runs)
+
+        settings.set_parse_cache(True)
+        cold = time_parse(source_code, 1)
+        warm = time_parse(source_code, runs)
+
+    print('{} lines'.format(source_code.count('\n')))
+    print('{:<30} {:>10.3f}s'.format('no cache (average)', no_cache))
+    print('{:<30} {:>10.3f}s'.format('cold (writes cache)', cold))
+    print('{:<30} {:>10.3f}s'.format('warm (average)', warm))
+
+if __name__ == '__main__':
+    main()
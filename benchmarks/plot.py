@@ -0,0 +1,86 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Times finding the cells hit by some of the fractals in examples/fractal.pn at each layer, with the layer-by-layer
+# sweep used by BuchiPlotter (see pecan.lib.plot.LayerSweep), and, for the layers where it's feasible, by testing every
+# prefix separately (the old way). The sweep's cost should grow with the number of cells hit, not with the number of
+# cells (the "volume"). Then compares building the bitmap for the last layer in one process and in several.
+# Usage: python3 benchmarks/plot.py [max layer] [max prefixes to test separately] [workers]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+import spot
+
+from pecan import program
+from pecan.lib.plot import BuchiPlotter
+from pecan.settings import settings
+
+# (name, alphabet sizes, default max layer)
+CURVES = [
+    ('peano', { 'x': 3, 'y': 3, 't': 9 }, 6),
+    ('hilbert', { 'x': 2, 'y': 2, 't': 4 }, 6),
+    ('sierpinski3', { 'x': 3, 'y': 3 }, 10),
+    ('menger3', { 'x': 3, 'y': 3, 'z': 3 }, 7),
+]
+
+SOURCE = '''
+#load("fractal/peano.txt", "walnut", peano(x, y, t))
+#load("fractal/hilbert.txt", "walnut", hilbert(x, y, t))
+#load("fractal/sierpinski-3-self-similar.txt", "walnut", sierpinski3(x, y))
+#load("fractal/menger-3-self-similar.txt", "walnut", menger3(x, y, z))
+'''
+
+def main():
+    max_layer_arg = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    max_prefixes = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+
+    settings.set_quiet(True)
+    settings.set_show_progress(False)
+    spot.setup()
+
+    prog = program.from_source(SOURCE, filename=os.path.join(os.getcwd(), 'plot_benchmark.pn'))
+    prog.evaluate()
+
+    print('{:<12} {:>6} {:>12} {:>16} {:>14} {:>14}'.format('fractal', 'layer', 'cells hit', 'cells', 'sweep', 'per prefix'))
+
+    for name, alphabets, max_layer in CURVES:
+        max_layer = max_layer_arg or max_layer
+
+        aut = prog.call(name)
+        plotter = BuchiPlotter(prog, alphabets, aut, layer=max_layer, save_to=None)
+
+        radix = 1
+        for k in alphabets.values():
+            radix *= k
+
+        # One sweep gives us every layer, so time each layer separately
+        start_time = time.time()
+        for layer, cells, _ in plotter.encoder.make_layer_sweep(aut).layers(max_layer):
+            sweep_time = time.time() - start_time
+
+            if radix ** layer <= max_prefixes:
+                prefix_start_time = time.time()
+                bitmap = plotter.get_hit_cell_bitmap_by_prefixes(aut, layer)
+                prefix_time = '{:.3f}s'.format(time.time() - prefix_start_time)
+                assert bitmap.count() == len(cells)
+            else:
+                prefix_time = '-'
+
+            print('{:<12} {:>6} {:>12} {:>16} {:>13.3f}s {:>14}'.format(name, layer, len(cells), radix ** layer, sweep_time, prefix_time))
+
+            start_time = time.time()
+
+        for num_workers in [1, workers]:
+            plotter.workers = num_workers
+
+            start_time = time.time()
+            plotter.get_hit_cell_bitmap(aut, max_layer)
+            print('{:<12} {:>6} {:>12} {:>16} {:>13.3f}s   ({} workers)'.format(name, max_layer, '', '', time.time() - start_time, num_workers))
+
+if __name__ == '__main__':
+    main()
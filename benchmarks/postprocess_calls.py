@@ -0,0 +1,55 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Counts how many times spot's postprocessing runs for each example, with and without keeping weak deterministic
+# automata in their own class (see pecan.automata.weak).
+# Usage: python3 benchmarks/postprocess_calls.py [example.pn ...]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+import spot
+
+from pecan import program
+from pecan.settings import settings
+
+def run_examples(filenames, weak_automata):
+    settings.set_weak_automata(weak_automata)
+    settings.stdlib_prog = None
+
+    results = {}
+    for filename in filenames:
+        settings.reset_stats()
+
+        start_time = time.time()
+        try:
+            program.load(filename).evaluate()
+        except Exception as e:
+            print('[WARN] {} failed: {}'.format(filename, e))
+            continue
+
+        results[filename] = (settings.get_stats().get('postprocess calls', 0), time.time() - start_time)
+
+    return results
+
+def main():
+    filenames = sys.argv[1:] or [os.path.join('examples', 'arith_props.pn'), os.path.join('examples', 'chicken_mcnugget.pn')]
+
+    settings.set_quiet(True)
+    spot.setup()
+
+    before = run_examples(filenames, False)
+    after = run_examples(filenames, True)
+
+    print('{:<30} {:>12} {:>12} {:>10} {:>10}'.format('file', 'calls (NBA)', 'calls (WDBA)', 'time (NBA)', 'time (WDBA)'))
+    for filename in filenames:
+        if filename in before and filename in after:
+            (calls_before, time_before), (calls_after, time_after) = before[filename], after[filename]
+            print('{:<30} {:>12} {:>12} {:>10.2f} {:>10.2f}'.format(os.path.basename(filename), calls_before, calls_after, time_before, time_after))
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(2000)
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Times some of the list functions from library/std.pn (foldl, map, filter, length) on [1..n], running Praline functions
+# by walking their bodies (--no-praline-compiler) and by compiling them first (see pecan.lang.praline_compiler).
+# Usage: python3 benchmarks/praline.py [largest n] [runs]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+import spot
+
+from pecan import program
+from pecan.lang.ir.praline import PralineApp, PralineVar, PralineInt
+from pecan.settings import settings
+
+SOURCE = '''
+Define benchFoldl n := foldl (\\acc x => acc + x) 0 [1..n].
+Define benchMap n := map (\\x => x * x) [1..n].
+Define benchFilter n := filter isEven [1..n].
+Define benchLength n := length [1..n].
+'''
+
+BENCHMARKS = ['benchFoldl', 'benchMap', 'benchFilter', 'benchLength']
+
+def time_call(prog, name, n, runs):
+    times = []
+
+    for _ in range(runs):
+        start_time = time.time()
+        PralineApp(PralineVar(name), PralineInt(n)).evaluate(prog)
+        times.append(time.time() - start_time)
+
+    return min(times)
+
+def main():
+    max_n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    # Most of these functions recurse once per element
+    sys.setrecursionlimit(max(2000, 50 * max_n))
+
+    settings.set_quiet(True)
+    settings.set_show_progress(False)
+    spot.setup()
+
+    prog = program.from_source(SOURCE, filename=os.path.join(os.getcwd(), 'praline_benchmark.pn'))
+    prog.evaluate()
+    prog.enter_praline_env()
+
+    print('{:<12} {:>8} {:>14} {:>14}'.format('function', 'n', 'interpreted', 'compiled'))
+
+    n = 250
+    while n <= max_n:
+        for name in BENCHMARKS:
+            settings.set_praline_compiler(False)
+            interpreted_time = time_call(prog, name, n, runs)
+
+            settings.set_praline_compiler(True)
+            compiled_time = time_call(prog, name, n, runs)
+
+            print('{:<12} {:>8} {:>13.3f}s {:>13.3f}s'.format(name, n, interpreted_time, compiled_time))
+
+        n *= 2
+
+if __name__ == '__main__':
+    main()
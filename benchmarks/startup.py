@@ -0,0 +1,43 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Measures how long it takes to run a trivial Pecan program, which is mostly the time it takes to load the standard
+# library: without the stdlib snapshot (see pecan.tools.stdlib_snapshot), on the run that writes the snapshot (cold),
+# and on runs that load it (warm).
+# Usage: python3 benchmarks/startup.py [runs]
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+pecan_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+
+def run_pecan(filename, home, extra_args):
+    # The snapshot goes in the cache directory, which is in the home directory
+    env = dict(os.environ, HOME=home)
+
+    start_time = time.time()
+    subprocess.run([sys.executable, os.path.join(pecan_dir, 'pecan.py'), '--quiet', filename] + extra_args,
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.time() - start_time
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as home:
+        filename = os.path.join(home, 'trivial.pn')
+        with open(filename, 'w') as f:
+            f.write('Restrict x is nat.\nt() := forall x. x = x\n#assert_prop(true, t)\n')
+
+        no_snapshot = [run_pecan(filename, home, ['--no-stdlib-snapshot']) for _ in range(runs)]
+        cold = run_pecan(filename, home, [])
+        warm = [run_pecan(filename, home, []) for _ in range(runs)]
+
+    print('{:<30} {:>10.2f}s'.format('no snapshot (average)', sum(no_snapshot) / len(no_snapshot)))
+    print('{:<30} {:>10.2f}s'.format('cold (writes snapshot)', cold))
+    print('{:<30} {:>10.2f}s'.format('warm (average)', sum(warm) / len(warm)))
+
+if __name__ == '__main__':
+    main()
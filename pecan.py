@@ -66,12 +66,28 @@ def main():
     parser.add_argument('--no-stdlib', help='Turns off the default behavior of loading the standard library (from library/std.pn in your Pecan installation)', required=False, action='store_false')
     parser.add_argument('--generate', help='Enumerate true statements, argument is how many variables to use', type=int, required=False)
     parser.add_argument('--heuristics', help='Use heuristics to determine how to simplify automata. This flag is typically useful with large automata (>10000 states), and can cause worse performance with smaller automata.', required=False, action='store_true')
+    parser.add_argument('--simplification-policy', help='How to decide how much effort to spend simplifying automata: "default" (the behavior of previous versions, affected by --heuristics), "minimal", or "adaptive" (based on the size and class of each automaton and --simplification-budget). Can be overridden per predicate with annotations like @policy_adaptive[...].', required=False, type=str, default='default', choices=['default', 'minimal', 'adaptive'])
+    parser.add_argument('--simplification-budget', help='The total number of seconds the simplification policy should aim to spend on postprocessing automata', required=False, type=float, metavar='SECONDS')
+    parser.add_argument('--timeout', help='Give up on any theorem (or other top-level definition) that takes longer than this many seconds, reporting it as a failure and moving on to the rest of the program. Once half of the time is used, automata are no longer simplified.', required=False, type=float, metavar='SECONDS')
+    parser.add_argument('--max-states', help='Give up on any theorem (or other top-level definition) that builds an automaton with more than this many states', required=False, type=int, dest='max_states')
+    parser.add_argument('--max-edges', help='Give up on any theorem (or other top-level definition) that builds an automaton with more than this many edges', required=False, type=int, dest='max_edges')
     parser.add_argument('--extract-implications', help='Alternate mode of running a program involving going through each theorem, extracting the top-level implication that needs to be checked (if applicable).', required=False, action='store_true')
     parser.add_argument('--use-var-map', help='Use the var_map from the specified file and convert the main file to use the same var map (i.e., the argument corresponding to <file>)', required=False, type=str)
     parser.add_argument('--stats', help='Write out statistics about each predicate defined and theorem tested (i.e., in save_aut and assert_prop)', required=False, action='store_true')
     parser.add_argument('--output-hoa', help='Outputs encountered Buchi automata into the file', required=False, type=str, dest="output_hoa", metavar="HOA_FILE")
     parser.add_argument('--output-json', help='Write the output in a JSON format of {"stdout": str, "files": array of strings} where the files array is the names of all the files generated by the Pecan program to standard output when Pecan exists. Useful for running headless on a server to gather the result files.', required=False, action='store_true')
     parser.add_argument('--no-progress', help='Disables all progress bars/indicators. Quiet mode implies this option is on. Should use if planning to pipe output to a file.', required=False, action='store_true')
+    parser.add_argument('--cache-dir', help='Cache the automata of all predicates in the specified directory, and reuse them in later runs. Without this option, only predicates annotated with @cache are cached (in ~/.pecan_cache).', required=False, type=str, dest='cache_dir', metavar='DIR')
+    parser.add_argument('--no-cache', help='Never read or write cached predicate automata (including those annotated with @cache)', required=False, action='store_true')
+    parser.add_argument('--no-weak-automata', help='Treat weak deterministic automata (e.g., most arithmetic predicates) like any other Buchi automata, rather than keeping them minimized and deterministic', required=False, action='store_true')
+    parser.add_argument('--no-linear-constraints', help='Build the automata for linear (in)equalities like x + 2*y = 3*z by combining adders, rather than directly', required=False, action='store_true')
+    parser.add_argument('--no-miniscoping', help='Do not push quantifiers inward or reorder the elimination of quantified variables', required=False, action='store_true')
+    parser.add_argument('--subformula-memo-size', help='How many automata for quantified formulas to keep around to reuse for formulas that are the same up to renaming variables (0 turns this off)', required=False, type=int, default=1000)
+    parser.add_argument('-j', '--jobs', help='Check independent theorems in parallel, using up to this many processes', required=False, type=int, default=1, metavar='N')
+    parser.add_argument('--no-stdlib-snapshot', help='Always evaluate the standard library from scratch, rather than loading a snapshot of it from the cache directory', required=False, action='store_true')
+    parser.add_argument('--no-parse-cache', help='Always parse files from scratch, rather than loading their parsed form from the cache directory', required=False, action='store_true')
+    parser.add_argument('--no-module-cache', help='Evaluate a file every time it is imported, rather than only the first time', required=False, action='store_true')
+    parser.add_argument('--no-praline-compiler', help='Run Praline functions by walking their bodies, rather than compiling them first', required=False, action='store_true')
     parser.add_argument('--expand-definition', help='Take the name of a predicate loaded from the main file and expands all uses of intermediate predicates (i.e., predicates not loaded from files).', required=False, type=str)
 
     args = parser.parse_args()
@@ -80,12 +96,31 @@ def main():
     settings.set_opt_level(0 if args.no_opt else 1)
     settings.set_load_stdlib(args.no_stdlib)
     settings.set_use_heuristics(args.heuristics)
+    settings.set_simplification_policy(args.simplification_policy)
+    settings.set_simplification_budget(args.simplification_budget)
+    settings.set_timeout(args.timeout)
+    settings.set_max_states(args.max_states)
+    settings.set_max_edges(args.max_edges)
     settings.set_min_opt(args.min_opt)
     settings.set_extract_implications(args.extract_implications)
     settings.set_write_statistics(args.stats)
     settings.set_output_hoa(args.output_hoa)
     settings.set_output_json(args.output_json)
     settings.set_show_progress(not args.no_progress)
+    settings.set_use_cache(not args.no_cache)
+    settings.set_weak_automata(not args.no_weak_automata)
+    settings.set_linear_constraints(not args.no_linear_constraints)
+    settings.set_miniscoping(not args.no_miniscoping)
+    settings.set_subformula_memo_size(args.subformula_memo_size)
+    settings.set_jobs(args.jobs)
+    settings.set_stdlib_snapshot(not args.no_stdlib_snapshot)
+    settings.set_parse_cache(not args.no_parse_cache)
+    settings.set_module_cache(not args.no_module_cache)
+    settings.set_praline_compiler(not args.no_praline_compiler)
+
+    if args.cache_dir is not None:
+        settings.set_cache_dir(os.path.abspath(args.cache_dir))
+        settings.set_cache_all(True)
 
     if args.debug is None:
         settings.set_debug_level(0)
@@ -148,6 +183,10 @@ def main():
 
         prog = run_repl(env)
 
+    if settings.should_write_statistics():
+        for name, value in sorted(settings.get_stats().items()):
+            print('[INFO] {}: {}'.format(name, value))
+
     if settings.get_output_json():
         if prog is not None:
             print(json.dumps({'output': settings.get_output(), 'files': prog.get_generated_files()}))
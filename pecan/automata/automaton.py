@@ -1,10 +1,15 @@
 #!/usr/bin/env python3.6
 # -*- coding=utf-8 -*-
 
+from pecan.settings import settings
+
 class Automaton:
     def __init__(self, aut_type_name):
         self.aut_type_name = aut_type_name
 
+        # The complement of this automaton, if we've computed it (see link_complement)
+        self.complement_cache = None
+
     def get_aut_type(self):
         return self.aut_type_name
 
@@ -76,12 +81,30 @@ class Automaton:
     def shuffle(self, is_disj, other):
         raise NotImplementedError
 
-    def relabel(self):
+    def relabel(self, ap_registry=None, canonical_vars=()):
         return self
 
     def simplify(self):
         return self
 
+    # Records that `other` is our complement (and so that we are its complement), so that complementing either is free next time
+    def link_complement(self, other):
+        self.complement_cache = other
+        other.complement_cache = self
+        return other
+
+    def get_cached_complement(self):
+        if self.complement_cache is not None:
+            settings.record_stat('complement cache hits')
+
+        return self.complement_cache
+
+    # Must be called whenever we change the underlying automaton in place
+    def drop_complement(self):
+        if self.complement_cache is not None:
+            self.complement_cache.complement_cache = None
+            self.complement_cache = None
+
     # -------------------------------------------------------
     # Default implementations:
     # -------------------------------------------------------
@@ -91,8 +114,17 @@ class Automaton:
     def __or__(self, other):
         return self.disjunction(self.convert(other))
 
+    # Whether some word is accepted by both automata
+    def intersects(self, other):
+        return not (self & other).is_empty()
+
+    # Whether every word is accepted
+    def is_universal(self):
+        return self.complement().is_empty()
+
+    # Whether every word accepted by this automaton is accepted by `other`
     def contains(self, other):
-        return (self.complement() | other).truth_value() == 'true'
+        return not self.intersects(self.convert(other).complement())
 
     def convert(self, other):
         if self.get_aut_type() == other.get_aut_type():
@@ -122,6 +154,15 @@ class TrueAutomaton(Automaton):
     def is_empty(self):
         return False
 
+    def intersects(self, other):
+        return not other.is_empty()
+
+    def is_universal(self):
+        return True
+
+    def contains(self, other):
+        return other.is_universal()
+
     def truth_value(self):
         return 'true'
 
@@ -160,6 +201,15 @@ class FalseAutomaton(Automaton):
     def is_empty(self):
         return True
 
+    def intersects(self, other):
+        return False
+
+    def is_universal(self):
+        return False
+
+    def contains(self, other):
+        return True
+
     def truth_value(self):
         return 'false'
 
@@ -1,15 +1,20 @@
 #!/usr/bin/env python3.6
 # -*- coding=utf-8 -*-
 
+import time
+
 import buddy
 import spot
 
 from pecan.automata.automaton import Automaton, FalseAutomaton
+from pecan.automata.simplification_policy import AutomatonInfo, get_policy
+from pecan.tools.resource_limits import resource_limits
 from pecan.tools.shuffle_automata import ShuffleAutomata
 from pecan.utility import VarMap
 from pecan.settings import settings
 
-def merge(merge_f, aut_a, aut_b):
+# Renames the APs of one of the automata so that both use the same APs for the same variables
+def align(aut_a, aut_b):
     if aut_a.num_states() < aut_b.num_states():
         merged_var_map, subs = aut_b.get_var_map().merge_with(aut_a.get_var_map())
         # print('merge(a into b)', merged_var_map, subs)
@@ -21,6 +26,10 @@ def merge(merge_f, aut_a, aut_b):
         new_a = aut_a
         new_b = BuchiAutomaton(aut_b.get_aut(), aut_b.get_var_map()).ap_substitute(subs)
 
+    return new_a, new_b, merged_var_map
+
+def merge(merge_f, aut_a, aut_b):
+    new_a, new_b, merged_var_map = align(aut_a, aut_b)
     return BuchiAutomaton(merge_f(new_a.get_aut(), new_b.get_aut()), merged_var_map)
 
 def merge_maps(aut, map_a: VarMap, map_b: VarMap):
@@ -64,6 +73,17 @@ class BuchiAutomaton(Automaton):
         # Maps pecan variables to internal variables
         self.var_map = var_map
 
+    # Spot's automata can't be pickled (see pecan.tools.stdlib_snapshot), so we go through HOA
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['aut'] = self.aut.to_str('hoa')
+        state['complement_cache'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.aut = spot.automaton(state['aut'])
+
     def get_var_map(self):
         return self.var_map
 
@@ -89,12 +109,66 @@ class BuchiAutomaton(Automaton):
         result.dump_aut()
         return result
 
+    def intersects(self, other):
+        other = self.convert(other)
+
+        if other.get_aut_type() != 'buchi':
+            return super().intersects(other)
+
+        new_a, new_b, _ = align(self, other)
+
+        # This explores the product on the fly and stops at the first accepting cycle, so it never builds the whole product
+        return new_a.get_aut().intersects(new_b.get_aut())
+
     def complement(self):
-        if settings.get_simplification_level() > 0:
-            self.postprocess()
-        result = BuchiAutomaton(spot.complement(self.get_aut()), self.var_map)
+        cached = self.get_cached_complement()
+        if cached is not None:
+            return cached
+
+        result = self.build_complement()
         result.dump_aut()
-        return result
+        return self.link_complement(result)
+
+    def build_complement(self):
+        if settings.get_simplification_level() > 0:
+            self.postprocess(context='complement')
+        return BuchiAutomaton(spot.complement(self.get_aut()), self.var_map)
+
+    # A complement that is only used to check emptiness of (or intersection with), so we skip the postprocessing and
+    # take the linear-time route for deterministic automata
+    def complement_for_check(self):
+        cached = self.get_cached_complement()
+        if cached is not None:
+            return cached
+
+        aut = self.get_aut()
+
+        if not spot.is_deterministic(aut):
+            # Simulation-based reduction is cheap, and sometimes it's enough to make the automaton deterministic
+            aut = reduce_by_simulation(aut)
+
+        if spot.is_deterministic(aut):
+            # Not cached, because the dual uses co-Buchi acceptance and complement() should always give a Buchi automaton
+            settings.record_stat('complements avoided by dualization')
+            return BuchiAutomaton(spot.dualize(aut), self.var_map)
+        else:
+            settings.record_stat('complements built for universality/inclusion checks')
+            return self.link_complement(BuchiAutomaton(spot.complement(aut), self.var_map))
+
+    def is_universal(self):
+        if self.aut.is_empty():
+            return False
+
+        return self.complement_for_check().is_empty()
+
+    # Whether every word accepted by this automaton is accepted by `other`
+    def contains(self, other):
+        other = self.convert(other)
+
+        if other.get_aut_type() != 'buchi':
+            return super().contains(other)
+
+        return not self.intersects(other.complement_for_check())
 
     def dump_aut(self):
         hoa_file = settings.get_output_hoa()
@@ -102,14 +176,25 @@ class BuchiAutomaton(Automaton):
             with open(hoa_file, "a") as fd:
                 fd.write(self.get_aut().to_str() + "\n\n")
 
-    def relabel(self):
+    # Gives every AP a fresh name, except for the APs of `canonical_vars`, which get the names that `ap_registry` assigns them
+    def relabel(self, ap_registry=None, canonical_vars=()):
         level_before = settings.get_simplification_level()
         settings.set_simplification_level(0)
 
         ap_set = set(map(str, self.aut.ap()))
 
         new_aps = {}
+        if ap_registry is not None:
+            for var_name in canonical_vars:
+                if var_name in self.var_map:
+                    aps = self.var_map[var_name]
+                    for ap, new_ap in zip(aps, ap_registry.get_or_gen(var_name, self.fresh_ap, len(aps))):
+                        new_aps[ap] = new_ap
+
         for ap in self.aut.ap():
+            if ap.ap_name() in new_aps:
+                continue
+
             # Make sure that we don't try to relabel with an AP that's already in the automaton.
             # This can happen when we load an automaton from a file.
             new_ap = self.fresh_ap()
@@ -145,21 +230,23 @@ class BuchiAutomaton(Automaton):
 
         # print('substitute()', arg_map, new_var_map, env_var_map, ap_subs)
 
-        return BuchiAutomaton(self.aut, new_var_map).ap_substitute(ap_subs)
+        return type(self)(self.aut, new_var_map).ap_substitute(ap_subs)
 
     def ap_substitute(self, ap_subs):
         # If we try something like [x/x]P, just don't do anything
         ap_subs = {k: v for k, v in ap_subs.items() if k != v}
 
+        settings.record_stat('AP substitutions')
+
         if not ap_subs:
             return self
 
-        bdd_subs = {self.aut.register_ap(k): v for k, v in ap_subs.items()}
+        settings.record_stat('AP substitutions rewriting edges')
 
         settings.log(3, lambda: 'ap_subs: {}'.format(ap_subs))
 
         if settings.get_simplification_level() > 0:
-            self.postprocess()
+            self.postprocess(context='substitute')
 
         new_var_map = VarMap()
         to_register = []
@@ -174,12 +261,13 @@ class BuchiAutomaton(Automaton):
 
         settings.log(3, lambda: 'ap_subs: {}, {}, {}'.format(ap_subs, self.var_map, new_var_map))
 
-        new_aut = buchi_transform(self.aut, Substitution(bdd_subs))
+        new_aut = rename_aps(self.aut, ap_subs)
 
         for new_ap in to_register:
             new_aut.register_ap(new_ap)
 
-        return BuchiAutomaton(new_aut, new_var_map) #.postprocess()
+        # Renaming APs doesn't change whether we're deterministic (or weak), so we keep our type
+        return type(self)(new_aut, new_var_map) #.postprocess()
 
     def project(self, var_refs, env_var_map):
         from pecan.lang.ir.prog import VarRef
@@ -195,7 +283,7 @@ class BuchiAutomaton(Automaton):
 
         if settings.get_simplification_level() > 0:
             result.merge_states()
-            result.postprocess()
+            result.postprocess(context='project')
 
         for var_name in pecan_var_names:
             # It may not be there (e.g., it's perfectly valid to do "exists x. y = y", even if it's pointless)
@@ -233,7 +321,7 @@ class BuchiAutomaton(Automaton):
     def truth_value(self):
         if self.aut.is_empty(): # If we accept nothing, we are false
             return 'false'
-        elif self.complement().is_empty(): # If our complement accepts nothing, we accept everything, so we are true
+        elif self.is_universal(): # If we accept everything, we are true
             return 'true'
         else: # Otherwise, we are neither true nor false: i.e., not all variables have been eliminated
             return 'sometimes'
@@ -255,6 +343,8 @@ class BuchiAutomaton(Automaton):
         return self.merge_edges()
 
     def simplify_states(self):
+        size_before = (self.num_states(), self.num_edges())
+
         self.get_aut().purge_dead_states()
         settings.log(3, lambda: 'after purge_dead_states: {}'.format(self.num_states()))
         self.get_aut().purge_unreachable_states()
@@ -263,40 +353,39 @@ class BuchiAutomaton(Automaton):
         self.aut = self.get_aut().scc_filter()
         settings.log(3, lambda: 'after scc_filter: {}'.format(self.num_states()))
 
-        if self.num_states() < 10 & self.get_aut().is_deterministic():
+        policy = get_policy()
+        info = AutomatonInfo(self.get_aut())
+
+        if policy.should_sat_minimize(info):
             self.aut = spot.sat_minimize(self.get_aut())
             settings.log(3, lambda: 'after sat_minimize: {}'.format(self.num_states()))
 
-        if settings.use_heuristics():
+        if policy.should_merge_states(info):
             self.merge_states()
-        else:
-            if self.num_states() < 50000:
-                self.merge_states()
+
+        if (self.num_states(), self.num_edges()) != size_before:
+            self.drop_complement()
 
         return self
 
-    def postprocess(self, level=None):
+    def postprocess(self, level=None, context='result'):
         settings.log(3, lambda: 'Empty: {}'.format(self.is_empty()))
         # settings.log(3, lambda: 'Universal: {}'.format(spot.is_universal(self.get_aut())))
 
-        postprocess_settings = ['BA']
-        if level is not None:
-            postprocess_settings.append(level)
-        if not self.aut.is_sba():
-            # Use 'BA' in the option list to ensure that the automata we have is a Buchi (possible nondeterministic) automata
-            if settings.use_heuristics():
-                postprocess_settings.append('Deterministic')
-                if level is None:
-                    if self.aut.num_states() > 300:
-                        postprocess_settings.append('Low')
-                    elif self.aut.num_states() > 100:
-                        postprocess_settings.append('Medium')
-                    else:
-                        postprocess_settings.append('High')
+        if resource_limits.should_skip_simplification():
+            return self
+
+        policy = get_policy()
+        postprocess_settings = policy.decide(context, AutomatonInfo(self.aut), level)
 
+        if postprocess_settings is not None:
             settings.log(1, lambda: 'Postprocessing (before) using {}: {} states and {} edges'.format(postprocess_settings, self.num_states(), self.num_edges()))
+            settings.record_stat('postprocess calls')
 
+            start_time = time.time()
             self.aut = self.aut.postprocess(*postprocess_settings)
+            policy.record_time(time.time() - start_time)
+            self.drop_complement()
 
             settings.log(1, lambda: 'Postprocessing (after): {} states and {} edges'.format(self.num_states(), self.num_edges()))
         return self
@@ -315,9 +404,12 @@ class BuchiAutomaton(Automaton):
             if not ran:
                 settings.log(3, lambda: 'after merge_states: {}'.format(self.num_states()))
         else:
-            self.get_aut().merge_states()
+            ran = self.get_aut().merge_states() > 0
             settings.log(3, lambda: 'after merge_states: {}'.format(self.num_states()))
 
+        if ran:
+            self.drop_complement()
+
         return self
 
     def merge_edges(self):
@@ -402,6 +494,49 @@ class BuchiAutomaton(Automaton):
         with open(filename, 'w') as f:
             f.write(self.to_str())
 
+def reduce_by_simulation(aut):
+    # Renamed to reduce_direct_sim in later versions of spot
+    if hasattr(spot, 'reduce_direct_sim'):
+        return spot.reduce_direct_sim(aut)
+    else:
+        return spot.simulation(aut)
+
+def rename_aps(original_aut, ap_subs):
+    current_aps = set(ap.ap_name() for ap in original_aut.ap())
+    targets = set(ap_subs.values())
+
+    # A renaming that is injective and doesn't land on an AP that stays in the automaton is a plain variable replacement,
+    # which spot can apply to every edge at once. Otherwise we have to compose the conditions ourselves.
+    if hasattr(spot, 'relabel_here') and len(targets) == len(ap_subs) and not (targets & (current_aps - set(ap_subs))):
+        return relabel_aps(original_aut, ap_subs)
+
+    # Composing one AP at a time is only correct if no AP we substitute in is substituted again later (e.g., swapping two APs),
+    # so in that case go through fresh APs first.
+    if targets & set(ap_subs):
+        tmp_subs = {}
+        for k in ap_subs:
+            tmp_ap = BuchiAutomaton.fresh_ap()
+            while tmp_ap in current_aps or tmp_ap in targets:
+                tmp_ap = BuchiAutomaton.fresh_ap()
+            tmp_subs[k] = tmp_ap
+
+        original_aut = rename_aps(original_aut, tmp_subs)
+        ap_subs = {tmp_subs[k]: v for k, v in ap_subs.items()}
+
+    bdd_subs = {original_aut.register_ap(k): v for k, v in ap_subs.items()}
+    return buchi_transform(original_aut, Substitution(bdd_subs))
+
+def relabel_aps(original_aut, ap_subs):
+    new_aut = spot.make_twa_graph(original_aut, spot.twa_prop_set.all())
+
+    relmap = spot.relabeling_map()
+    for k, v in ap_subs.items():
+        relmap[spot.formula.ap(k)] = spot.formula.ap(v)
+
+    spot.relabel_here(new_aut, relmap)
+
+    return new_aut
+
 def buchi_transform(original_aut, builder):
     # Build a new automata with different edges
     new_aut = spot.make_twa_graph()
@@ -453,6 +588,8 @@ class Builder:
 class Substitution(Builder):
     def __init__(self, subs):
         self.subs = subs
+        # Most automata only have a handful of distinct edge labels, so only rewrite each one once
+        self.cond_cache = {}
 
     def pre_build(self, new_aut):
         for k, v in self.subs.items():
@@ -460,12 +597,16 @@ class Substitution(Builder):
                 self.subs[k] = buddy.bdd_ithvar(new_aut.register_ap(v))
 
     def build_cond(self, cond):
-        # TODO: ideally we could use the bdd_veccompose to do them all at once instead of
-        #   one at a time, but spot doesn't expose the bdd_newpair function to python at the moment...
+        cond_id = cond.id()
+        if cond_id in self.cond_cache:
+            return self.cond_cache[cond_id]
+
+        # spot doesn't expose bdd_newpair to python, so we can't use bdd_veccompose to do them all at once.
+        # Substitutions that can be done in bulk go through relabel_aps instead (see rename_aps).
+        new_cond = cond
         for var, new_formula in self.subs.items():
-            # old = cond
-            cond = buddy.bdd_compose(cond, new_formula, var)
-            # print('after ({} |-> {}), is now {}, was {}'.format(spot.bdd_to_formula(buddy.bdd_ithvar(var)), spot.bdd_to_formula(new_formula), spot.bdd_to_formula(cond), spot.bdd_to_formula(old)))
+            new_cond = buddy.bdd_compose(new_cond, new_formula, var)
 
-        return cond
+        self.cond_cache[cond_id] = new_cond
+        return new_cond
 
@@ -153,6 +153,8 @@ class FiniteAutomaton(Automaton):
             return FiniteAutomaton.false_aut()
         elif self.special_attr == 'false':
             return FiniteAutomaton.true_aut()
+        elif self.get_cached_complement() is not None:
+            return self.complement_cache
         else:
             # print('PERFORMING COMPLEMENT')
             # print(self.relabel_states().to_str())
@@ -164,9 +166,9 @@ class FiniteAutomaton(Automaton):
 
             res = FiniteAutomaton(new_aut, self.var_map)
             # print(res.relabel_states().to_str())
-            return res
+            return self.link_complement(res)
 
-    def relabel(self):
+    def relabel(self, ap_registry=None, canonical_vars=()):
         return self
 
     def substitute(self, arg_map, env_var_map):
@@ -257,10 +259,31 @@ class FiniteAutomaton(Automaton):
         else:
             return not NFA.nfa_nonemptiness_check(self.aut)
 
+    def is_universal(self):
+        if self.special_attr == 'true':
+            return True
+        elif self.special_attr == 'false':
+            return False
+        else:
+            return antichain_included(None, self.aut)
+
+    def contains(self, other):
+        other = self.convert(other)
+
+        if self.special_attr == 'false' or other.special_attr == 'true':
+            return True
+        elif other.special_attr == 'false':
+            return self.is_empty()
+        elif self.special_attr == 'true':
+            return other.is_universal()
+        else:
+            aut_l, aut_r, _ = self.augment_vars(other)
+            return antichain_included(aut_l, aut_r)
+
     def truth_value(self):
         if self.is_empty(): # If we accept nothing, we are false
             return 'false'
-        elif self.complement().is_empty(): # If our complement accepts nothing, we accept everything, so we are true
+        elif self.is_universal(): # If we accept everything, we are true
             return 'true'
         else: # Otherwise, we are neither true nor false: i.e., not all variables have been eliminated
             return 'sometimes'
@@ -347,3 +370,47 @@ class FiniteAutomaton(Automaton):
         with open(filename, 'w') as f:
             f.write(self.to_str())
 
+
+def successors(aut, states, sym):
+    res = set()
+    for state in states:
+        res.update(aut['transitions'].get((state, sym), ()))
+    return frozenset(res)
+
+# Checks whether L(sub_aut) is a subset of L(super_aut) (or whether super_aut is universal, if sub_aut is None) by exploring
+# the subset construction of super_aut on the fly, without complementing anything.
+# We search for a pair (p, S), where p is a state of sub_aut and S is the set of states super_aut can be in after reading the
+# same word, such that p is accepting but nothing in S is. If (p, S) and (p, S') with S' a subset of S are both reachable,
+# then any counterexample from (p, S) is also one from (p, S'), so we only need to keep the minimal sets (an antichain).
+def antichain_included(sub_aut, super_aut):
+    if sub_aut is None:
+        sub_aut = {
+            'alphabet': super_aut['alphabet'],
+            'initial_states': {None},
+            'accepting_states': {None},
+            'transitions': {(None, sym): {None} for sym in super_aut['alphabet']}
+        }
+
+    accepting = super_aut['accepting_states']
+    antichain = {}
+    queue = [(p, frozenset(super_aut['initial_states'])) for p in sub_aut['initial_states']]
+
+    while queue:
+        p, super_states = queue.pop()
+
+        if p in sub_aut['accepting_states'] and super_states.isdisjoint(accepting):
+            settings.record_stat('antichain states explored', sum(map(len, antichain.values())))
+            return False
+
+        if any(other <= super_states for other in antichain.get(p, [])):
+            continue
+
+        antichain[p] = [other for other in antichain.get(p, []) if not super_states <= other] + [super_states]
+
+        for sym in super_aut['alphabet']:
+            next_states = successors(super_aut, super_states, sym)
+            for next_p in sub_aut['transitions'].get((p, sym), ()):
+                queue.append((next_p, next_states))
+
+    settings.record_stat('antichain states explored', sum(map(len, antichain.values())))
+    return True
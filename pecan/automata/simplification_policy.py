@@ -0,0 +1,195 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Simplification policies decide how hard we try to simplify Buchi automata (i.e., which options to pass to spot's
+# postprocess, and whether to run merge_states/sat_minimize), based on what we're about to do with the automaton,
+# its size and its class, and how much time we've already spent simplifying.
+# The policy is chosen with --simplification-policy, `set "simplification_policy"` in Praline, or per predicate with
+# annotations like @policy_adaptive[...].
+
+import spot
+
+from pecan.settings import settings
+
+# Why we are simplifying: right before complementing, right after projecting, before renaming APs, or because
+# someone wants the (final) result simplified
+CONTEXTS = ['complement', 'project', 'substitute', 'result']
+
+class AutomatonInfo:
+    def __init__(self, aut):
+        self.aut = aut
+        self.num_states = aut.num_states()
+        self.num_edges = aut.num_edges()
+
+    def is_sba(self):
+        return self.aut.is_sba()
+
+    def is_deterministic(self):
+        return spot.is_deterministic(self.aut)
+
+    def is_weak(self):
+        return spot.is_weak_automaton(self.aut)
+
+    def is_terminal(self):
+        return spot.is_terminal_automaton(self.aut)
+
+class SimplificationPolicy:
+    def __init__(self, name):
+        self.name = name
+        self.time_spent = 0.0
+
+    # Seconds left of the simplification budget (see Settings.get_simplification_budget), or None if there's no budget
+    def remaining_budget(self):
+        budget = settings.get_simplification_budget()
+        if budget is None:
+            return None
+        return budget - self.time_spent
+
+    def out_of_budget(self):
+        remaining = self.remaining_budget()
+        return remaining is not None and remaining <= 0
+
+    def record_time(self, seconds):
+        self.time_spent += seconds
+        return self
+
+    # Returns the list of options to pass to spot's postprocess, or None to leave the automaton alone.
+    # `level` is the level explicitly requested by the caller (e.g., by @postprocess_high), if any.
+    def postprocess_options(self, context, info, level):
+        raise NotImplementedError
+
+    def should_merge_states(self, info):
+        raise NotImplementedError
+
+    def should_sat_minimize(self, info):
+        raise NotImplementedError
+
+    def decide(self, context, info, level=None):
+        options = self.postprocess_options(context, info, level)
+
+        decision = 'skip' if options is None else ' '.join(options)
+        settings.record_stat('simplification policy {}: {} -> {}'.format(self.name, context, decision))
+        settings.log(2, lambda: '[DEBUG] Simplification policy {} for {} ({} states, {} edges): {}'.format(self.name, context, info.num_states, info.num_edges, decision))
+
+        return options
+
+# The behavior Pecan has always had: only postprocess automata without state-based acceptance, and with --heuristics,
+# pick a level based on the size of the automaton
+class DefaultPolicy(SimplificationPolicy):
+    def __init__(self):
+        super().__init__('default')
+
+    def postprocess_options(self, context, info, level):
+        if info.is_sba():
+            return None
+
+        # Use 'BA' in the option list to ensure that the automata we have is a Buchi (possible nondeterministic) automata
+        options = ['BA']
+        if level is not None:
+            options.append(level)
+
+        if settings.use_heuristics():
+            options.append('Deterministic')
+            if level is None:
+                if info.num_states > 300:
+                    options.append('Low')
+                elif info.num_states > 100:
+                    options.append('Medium')
+                else:
+                    options.append('High')
+
+        return options
+
+    def should_merge_states(self, info):
+        return settings.use_heuristics() or info.num_states < 50000
+
+    def should_sat_minimize(self, info):
+        # This used to be `num_states() < 10 & is_deterministic()`, which parses as `num_states() < (10 & ...)` and so was
+        # never true; keep it that way here, and use the adaptive policy to actually run sat_minimize
+        return False
+
+# Do as little as possible: just make sure we have a Buchi automaton
+class MinimalPolicy(SimplificationPolicy):
+    def __init__(self):
+        super().__init__('minimal')
+
+    def postprocess_options(self, context, info, level):
+        if info.is_sba() and level is None:
+            return None
+
+        return ['BA', level or 'Low']
+
+    def should_merge_states(self, info):
+        return False
+
+    def should_sat_minimize(self, info):
+        return False
+
+# Spends effort where it pays off:
+#  - weak automata (e.g., most arithmetic) can be minimized in polynomial time, so always use 'High' for them;
+#  - complementing a deterministic automaton is cheap, so try to determinize small automata before complementing;
+#  - projection usually makes automata nondeterministic, so don't spend much on the result;
+#  - the bigger the automaton and the less of the time budget that is left, the lower the level.
+class AdaptivePolicy(SimplificationPolicy):
+    def __init__(self):
+        super().__init__('adaptive')
+
+    def level_for(self, info):
+        remaining = self.remaining_budget()
+        # Shrink the thresholds as we use up the budget
+        scale = 1.0 if remaining is None else max(0.0, remaining / settings.get_simplification_budget())
+
+        if info.num_states <= 100 * scale:
+            return 'High'
+        elif info.num_states <= 1000 * scale:
+            return 'Medium'
+        else:
+            return 'Low'
+
+    def postprocess_options(self, context, info, level):
+        if level is not None:
+            return ['BA', level]
+
+        if self.out_of_budget():
+            return None if info.is_sba() else ['BA', 'Low']
+
+        if context == 'complement':
+            if info.is_deterministic():
+                return None if info.is_sba() else ['BA', 'Low']
+            elif info.num_states <= 300:
+                return ['BA', 'Deterministic', self.level_for(info)]
+
+        if info.is_sba() and context != 'result':
+            return None
+
+        if info.is_weak() or info.is_terminal():
+            return ['BA', 'Small', 'High']
+
+        if context == 'project':
+            return ['BA', 'Small', 'Low']
+
+        return ['BA', 'Small', self.level_for(info)]
+
+    def should_merge_states(self, info):
+        return not self.out_of_budget() and info.num_states < 50000
+
+    def should_sat_minimize(self, info):
+        return not self.out_of_budget() and info.num_states < 10 and info.is_deterministic()
+
+policies = {}
+
+def register_policy(policy):
+    policies[policy.name] = policy
+    return policy
+
+def get_policy(name=None):
+    name = name or settings.get_simplification_policy()
+
+    if name not in policies:
+        raise Exception('Unknown simplification policy: {} (expected one of {})'.format(name, ', '.join(sorted(policies))))
+
+    return policies[name]
+
+register_policy(DefaultPolicy())
+register_policy(MinimalPolicy())
+register_policy(AdaptivePolicy())
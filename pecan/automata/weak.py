@@ -0,0 +1,103 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+import spot
+
+from pecan.automata.buchi import BuchiAutomaton, align
+from pecan.settings import settings
+
+def is_weak_deterministic(aut):
+    return spot.is_deterministic(aut) and spot.is_weak_automaton(aut)
+
+# Wraps `aut` as a WeakDeterministicAutomaton if it is weak and deterministic (or, if `determinize` is set, if it's
+# equivalent to a weak deterministic automaton that we can find), and as a plain BuchiAutomaton otherwise
+def as_weak(aut, var_map, determinize=False):
+    if not settings.use_weak_automata():
+        return BuchiAutomaton(aut, var_map)
+
+    if is_weak_deterministic(aut):
+        return WeakDeterministicAutomaton(minimize(aut), var_map)
+
+    if determinize and spot.is_weak_automaton(aut):
+        res = determinize_weak(aut)
+        if res is not None:
+            return WeakDeterministicAutomaton(res, var_map)
+
+    settings.record_stat('automata leaving the WDBA class')
+    return BuchiAutomaton(aut, var_map)
+
+# Determinizes a weak automaton with the powerset construction done by the WDBA minimization, which only gives an
+# equivalent automaton if the language is recognized by some WDBA. So we check that it is equivalent, and return None
+# otherwise. (spot.minimize_obligation can't do this check without a formula or a complement, so it doesn't.)
+def determinize_weak(aut):
+    settings.record_stat('WDBA determinizations')
+    res = spot.minimize_wdba(aut)
+
+    # res is deterministic, so dualizing complements it
+    if aut.intersects(spot.dualize(res)):
+        settings.record_stat('WDBA determinizations rejected')
+        return None
+
+    # aut is weak, so its dual is a weak alternating automaton, which spot can make nondeterministic again
+    if res.intersects(spot.remove_alternation(spot.dualize(aut))):
+        settings.record_stat('WDBA determinizations rejected')
+        return None
+
+    return res
+
+def minimize(aut):
+    settings.record_stat('WDBA minimizations')
+    return spot.minimize_wdba(aut)
+
+def weak_merge(merge_f, aut_a, aut_b):
+    new_a, new_b, merged_var_map = align(aut_a, aut_b)
+    # Products of weak deterministic automata are still weak and deterministic
+    return WeakDeterministicAutomaton(minimize(merge_f(new_a.get_aut(), new_b.get_aut())), merged_var_map)
+
+# A weak deterministic Buchi automaton (WDBA), which we minimize after every product, complement, and projection.
+# Unlike general Buchi automata, WDBAs can be complemented by just flipping which states are accepting and minimized in
+# polynomial time, so we never need to call spot's (expensive) postprocessing on them.
+class WeakDeterministicAutomaton(BuchiAutomaton):
+    def conjunction(self, other):
+        if type(other) is not WeakDeterministicAutomaton:
+            return super().conjunction(other)
+
+        result = weak_merge(spot.product, self, other)
+        result.dump_aut()
+        return result
+
+    def disjunction(self, other):
+        if type(other) is not WeakDeterministicAutomaton:
+            return super().disjunction(other)
+
+        result = weak_merge(spot.product_or, self, other)
+        result.dump_aut()
+        return result
+
+    def build_complement(self):
+        settings.record_stat('WDBA complements')
+        return WeakDeterministicAutomaton(minimize(spot.dualize(self.get_aut())), self.var_map)
+
+    def ap_project(self, aps):
+        if not aps:
+            return self
+
+        if self.aut.is_empty():
+            return self.make_empty_aut()
+
+        remover = spot.remove_ap()
+        for ap in aps:
+            remover.add_ap(ap)
+
+        # Projecting makes the automaton nondeterministic (but still weak), so try to get back to a WDBA
+        return as_weak(remover.strip(self.get_aut()), self.get_var_map(), determinize=True)
+
+    # We are already minimal, so there's nothing else to do
+    def simplify_states(self):
+        return self
+
+    def merge_states(self):
+        return self
+
+    def postprocess(self, level=None, context='result'):
+        return self
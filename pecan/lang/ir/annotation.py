@@ -30,6 +30,14 @@ class Annotation(IRPredicate):
             res = self.body.evaluate(prog)
             settings.set_simplification_level(orig_level)
             return res
+        elif self.annotation_name.startswith('@policy_'):
+            orig_policy = settings.get_simplification_policy()
+            settings.set_simplification_policy(self.annotation_name[len('@policy_'):])
+            try:
+                res = self.body.evaluate(prog)
+            finally:
+                settings.set_simplification_policy(orig_policy)
+            return res
         elif self.annotation_name == '@postprocess':
             return self.body.evaluate(prog).postprocess()
         elif self.annotation_name == '@postprocess_high':
@@ -46,6 +54,9 @@ class Annotation(IRPredicate):
             return self.body.evaluate(prog).merge_states()
         elif self.annotation_name == '@merge_edges':
             return self.body.evaluate(prog).merge_edges()
+        elif self.annotation_name == '@cache':
+            # The caching itself is done by NamedPred.call (see pecan.tools.predicate_cache)
+            return self.body.evaluate(prog)
         elif self.annotation_name == '@merge_states_loop':
             aut = self.body.evaluate(prog)
             n = aut.num_states() + 1
@@ -66,5 +77,7 @@ class Annotation(IRPredicate):
         return other is not None and type(other) is self.__class__ and self.annotation_name == other.annotation_name and self.body == other.body
 
     def __hash__(self):
-        return hash((self.annotation_name, self.body))
+        if self.hash_cache is None:
+            self.hash_cache = hash((self.annotation_name, self.body))
+        return self.hash_cache
 
@@ -96,11 +96,10 @@ class Mul(BinaryIRExpression):
             raise AutomatonArithmeticError("At least one argument of multiplication must be an constant integer in {}".format(self))
 
         # We assumed above that a was the int, but it might not be; if it wasn't, just swap the two
-        if not self.a.is_int:
-            self.a, self.b = self.b, self.a
+        a, b = (self.a, self.b) if self.a.is_int else (self.b, self.a)
 
-        # We are guaranteed that self.a will be an integer, so we don't need to worry about transforming it
-        c = self.a.evaluate_int(prog)  # copy of a
+        # We are guaranteed that a will be an integer, so we don't need to worry about transforming it
+        c = a.evaluate_int(prog)  # copy of a
 
         negative = False
 
@@ -111,7 +110,7 @@ class Mul(BinaryIRExpression):
             negative = True
             c = -c
 
-        power = self.b
+        power = b
 
         s = IntConst(0).with_type(self.get_type())
         while True:
@@ -134,7 +133,26 @@ class Mul(BinaryIRExpression):
         assert self.is_int
         return self.a.evaluate_int(prog) * self.b.evaluate_int(prog)
 
-constants_map = {}
+# Builders for constant automata, keyed by the name of the adder of the structure they're for.
+# A builder is called as builder(prog, val, label_var) and returns the automaton accepting only `val` for `label_var`
+# (or None, to fall back to building the constant out of additions).
+constant_builders = {}
+
+def register_constant_builder(adder_name, builder):
+    constant_builders[adder_name] = builder
+
+def build_binary_constant(prog, val, label_var):
+    from pecan.automata.buchi import BuchiAutomaton
+    from pecan.tools.linear_constraint import build_linear_constraint
+
+    var_map = prog.get_var_map()
+    var_map.get_or_gen(label_var.var_name, BuchiAutomaton.fresh_ap, 1)
+
+    # This is just the linear constraint x - val = 0, which gives the automaton reading exactly the bits of val (LSD first)
+    return build_linear_constraint([(label_var.var_name, 1)], -val, '=', var_map)
+
+register_constant_builder('bin_add', build_binary_constant)
+
 class IntConst(IRExpression):
     def __init__(self, val):
         super().__init__()
@@ -145,12 +163,22 @@ class IntConst(IRExpression):
         if self.val < 0:
             return Sub(IntConst(0), IntConst(-self.val)).with_type(self.get_type()).evaluate(prog)
 
-        if (self.val, self.get_type()) in constants_map:
-            return constants_map[(self.val, self.get_type())]
+        constants_cache = prog.get_constants_cache()
+        key = (self.val, self.get_type())
+
+        if key in constants_cache:
+            return constants_cache.get(key)
+
+        builder = constant_builders.get(resolve_name(prog, 'adder', [self.label_var()] * 3))
+        if builder is not None:
+            res = builder(prog, self.val, self.label_var())
+            if res is not None:
+                settings.record_stat('constants built directly')
+                return constants_cache.put(key, (res, self.label_var()))
 
         if self.val == 0:
             res = prog.call('zero', [self.label_var()])
-            constants_map[(self.val, self.get_type())] = (res, self.label_var())
+            result = constants_cache.put(key, (res, self.label_var()))
         elif self.val == 1:
             res = prog.lookup_dynamic_call('one', [self.label_var()])
 
@@ -164,36 +192,37 @@ class IntConst(IRExpression):
                 formula_1 = Conjunction(self.get_type().restrict(self.label_var()),
                                         Conjunction(Less(zero_const, self.label_var()),
                                             Complement(Exists([b_const], [self.get_type().restrict(b_const)], b_in_0_1))))
-                constants_map[(self.val, self.get_type())] = (formula_1.evaluate(prog), self.label_var())
+                result = constants_cache.put(key, (formula_1.evaluate(prog), self.label_var()))
             else:
                 res = prog.call('one', [self.label_var()])
-                constants_map[(self.val, self.get_type())] = (res, self.label_var())
+                result = constants_cache.put(key, (res, self.label_var()))
         else:
             assert self.val >= 2, "constant here should be greater than or equal to 2, while it is {}".format(self.val)
 
             if self.val & (self.val - 1) == 0:
                 half = IntConst(self.val // 2)
-                result = Add(half, half).with_type(self.get_type())
+                sum_node = Add(half, half).with_type(self.get_type())
             else:
                 c = self.val
                 power = 1
                 while c != 1:
                     power  = power << 1
                     c = c >> 1
-                result = Add(IntConst(power), IntConst(self.val - power)).with_type(self.get_type())
+                sum_node = Add(IntConst(power), IntConst(self.val - power)).with_type(self.get_type())
 
-            result.change_label(self.label)
-            result.is_int = False
-            (result_aut, val) = result.evaluate(prog)
+            sum_node.change_label(self.label)
+            sum_node.is_int = False
+            (result_aut, val) = sum_node.evaluate(prog)
 
             # because the powers of two get used so much, it is advantageous to make sure they are as small
             # as possible by postprocessing them
             if is_power_of_two(self.val):
                 result_aut.postprocess()
 
-            constants_map[(self.val, self.get_type())] = (result_aut, val)
+            result = constants_cache.put(key, (result_aut, val))
 
-        return constants_map[(self.val, self.get_type())]
+        # Not constants_cache.get(key): if the cache is small enough (e.g., size 0), what we just put may be gone already
+        return result
 
     def evaluate_int(self, prog):
         return self.val
@@ -218,6 +247,10 @@ class Equals(BinaryIRPredicate):
         if self.a.is_int and self.b.is_int:
             return BoolConst(self.a.evaluate_int(prog) == self.b.evaluate_int(prog)).evaluate(prog)
 
+        linear_aut = compile_linear_constraint(prog, self, '=')
+        if linear_aut is not None:
+            return linear_aut
+
         (aut_a, val_a) = self.a.evaluate(prog)
         (aut_b, val_b) = self.b.evaluate(prog)
 
@@ -239,6 +272,10 @@ class Less(BinaryIRPredicate):
         if self.a.is_int and self.b.is_int:
             return BoolConst(self.a.evaluate_int(prog) < self.b.evaluate_int(prog)).evaluate(prog)
 
+        linear_aut = compile_linear_constraint(prog, self, '<')
+        if linear_aut is not None:
+            return linear_aut
+
         (aut_a, val_a) = self.a.evaluate(prog)
         (aut_b, val_b) = self.b.evaluate(prog)
 
@@ -263,15 +300,17 @@ class FunctionExpression(IRExpression):
 
     def evaluate_node(self, prog):
         return_val = VarRef(prog.fresh_name()).with_type(self.args[self.val_idx].get_type())
-        self.args[self.val_idx] = return_val
+        args = list(self.args)
+        args[self.val_idx] = return_val
         from pecan.lang.typed_ir_lowering import TypedIRLowering
-        return TypedIRLowering(prog).transform(Call(self.pred_name, self.args)).evaluate(prog), return_val
+        return TypedIRLowering(prog).transform(Call(self.pred_name, args)).evaluate(prog), return_val
 
     # Transforms the function expression into a regular call, with the result going into the variable provided.
     # For example: if we have something like P() = x, we probably want to transform this into just P(x)
     def to_call(self, result_var):
-        self.args[self.val_idx] = result_var
-        return Call(self.pred_name, self.args)
+        args = list(self.args)
+        args[self.val_idx] = result_var
+        return Call(self.pred_name, args)
 
     def transform(self, transformer):
         return transformer.transform_FunctionExpression(self)
@@ -309,8 +348,115 @@ class PredicateExpr(IRExpression):
         return other is not None and type(other) is self.__class__ and self.var == other.var and self.pred == other.pred
 
     def __hash__(self):
-        return hash((self.var, self.pred))
+        if self.hash_cache is None:
+            self.hash_cache = hash((self.var, self.pred))
+        return self.hash_cache
 
 class AutomatonArithmeticError(Exception):
     pass
 
+# A linear combination of variables: sum(coeffs[x] * x) + const
+class LinearForm:
+    def __init__(self, coeffs, const):
+        self.coeffs = coeffs
+        self.const = const
+
+    def combine(self, other, scale):
+        coeffs = dict(self.coeffs)
+        for var_name, c in other.coeffs.items():
+            coeffs[var_name] = coeffs.get(var_name, 0) + scale * c
+        return LinearForm(coeffs, self.const + scale * other.const)
+
+    def scale(self, c):
+        return LinearForm({var_name: c * coeff for var_name, coeff in self.coeffs.items()}, c * self.const)
+
+# Returns the LinearForm of `node`, or None if it isn't a linear combination of variables and natural number constants.
+# Subtraction of natural numbers is only defined when the result is also a natural number, so the form of every Sub
+# is added to `nonneg`, and `var_refs` collects the variables used (even if their coefficients cancel out).
+def linear_form(prog, node, nonneg, var_refs):
+    if type(node) is VarRef:
+        var_refs[node.var_name] = node
+        return LinearForm({node.var_name: 1}, 0)
+    elif node.is_int:
+        val = node.evaluate_int(prog)
+        return LinearForm({}, val) if val >= 0 else None
+    elif type(node) is Add or type(node) is Sub:
+        form_a = linear_form(prog, node.a, nonneg, var_refs)
+        form_b = linear_form(prog, node.b, nonneg, var_refs)
+        if form_a is None or form_b is None:
+            return None
+
+        if type(node) is Add:
+            return form_a.combine(form_b, 1)
+        else:
+            result = form_a.combine(form_b, -1)
+            nonneg.append(result)
+            return result
+    elif type(node) is Mul:
+        c, expr = (node.a, node.b) if node.a.is_int else (node.b, node.a)
+        if not c.is_int or c.evaluate_int(prog) < 0:
+            return None
+
+        form = linear_form(prog, expr, nonneg, var_refs)
+        return None if form is None else form.scale(c.evaluate_int(prog))
+    else:
+        return None
+
+def resolve_name(prog, pred_name, args):
+    name = prog.lookup_dynamic_call(pred_name, args).name
+    # If no structure matched the arguments, we use the default from #context
+    if name == pred_name:
+        name = prog.context.get(pred_name, pred_name)
+    return name
+
+def resolves_to(prog, pred_name, args, expected_name):
+    return resolve_name(prog, pred_name, args) == expected_name
+
+# Builds the automaton for `node.a op node.b` (op is '=' or '<') directly (see pecan.tools.linear_constraint), rather than
+# by combining adders, if it's a linear constraint over the standard binary natural numbers. Otherwise, returns None.
+def compile_linear_constraint(prog, node, op):
+    from pecan.automata.buchi import BuchiAutomaton
+    from pecan.tools.linear_constraint import build_linear_constraint
+
+    if not settings.use_linear_constraints():
+        return None
+
+    # Plain comparisons of variables are already a single call, so there's nothing to gain
+    if type(node.a) is VarRef and type(node.b) is VarRef:
+        return None
+
+    nonneg = []
+    var_refs = {}
+    form_a = linear_form(prog, node.a, nonneg, var_refs)
+    form_b = linear_form(prog, node.b, nonneg, var_refs)
+    if form_a is None or form_b is None or not var_refs:
+        return None
+
+    # The construction relies on the encoding used by bin_add/bin_less, so only use it when that's what we'd use anyway
+    refs = list(var_refs.values())
+    if not all(resolves_to(prog, 'adder', [v, v, v], 'bin_add') for v in refs):
+        return None
+    if op == '=' and not all(resolves_to(prog, 'equal', [v, v], 'default_equal') for v in refs):
+        return None
+    if op == '<' and not all(resolves_to(prog, 'less', [v, v], 'bin_less') for v in refs):
+        return None
+
+    var_map = prog.get_var_map()
+    for var_name in var_refs:
+        var_map.get_or_gen(var_name, BuchiAutomaton.fresh_ap, 1)
+
+    def build(form, op):
+        coeffs = [(var_name, form.coeffs.get(var_name, 0)) for var_name in var_refs]
+        return build_linear_constraint(coeffs, form.const, op, var_map)
+
+    result = build(form_a.combine(form_b, -1), op)
+
+    # f >= 0 is the same as -f - 1 < 0
+    for form in nonneg:
+        if result is None:
+            break
+        side_aut = build(form.scale(-1).combine(LinearForm({}, 1), -1), '<')
+        result = None if side_aut is None else result & side_aut
+
+    return result
+
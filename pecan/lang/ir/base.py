@@ -4,9 +4,16 @@
 import time
 
 from pecan.settings import settings
+from pecan.tools.resource_limits import resource_limits
 
 class IRNode:
     id = 0
+
+    # Hashing a formula hashes its whole subtree, and passes like CSE hash the same subtrees over and over, so formulas
+    # remember their hash. Transformers build new nodes rather than changing old ones, and a formula must not be changed
+    # in place once something above it may have been hashed, because we can't reset the hashes cached above it.
+    hash_cache = None
+
     @staticmethod
     def fresh_name():
         label = f"__pecan_var{IRNode.id}"
@@ -18,6 +25,12 @@ class IRNode:
         self.label = None
         self.type = None
 
+    # Hashes of strings differ between runs, so cached hashes mustn't outlive the process (e.g., in a pickle)
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop('hash_cache', None)
+        return state
+
     def label_var(self):
         from pecan.lang.ir.prog import VarRef
         if self.label is None:
@@ -26,6 +39,7 @@ class IRNode:
 
     def with_type(self, new_type):
         self.type = new_type
+        self.hash_cache = None
         return self
 
     def get_type(self):
@@ -53,6 +67,11 @@ class IRNode:
 
         return aut
 
+    # Automata that don't keep track of their states (e.g., TrueAutomaton) report -1 states and edges, and are already as
+    # simple as they get
+    def can_simplify(self, aut):
+        return aut.num_states() >= 0 and aut.num_edges() >= 0 and not resource_limits.should_skip_simplification()
+
     def get_display_node(self, prog):
         return self
 
@@ -61,20 +80,24 @@ class IRNode:
 
         start_time = time.time()
 
-        result = self.evaluate_node(prog)
+        # The resource limits may stop us anywhere in here, but whoever catches that keeps using prog
+        try:
+            resource_limits.check_time(self)
 
-        if type(result) is tuple:
-            sn, en = result[0].num_states(), result[0].num_edges()
-        else:
-            sn, en = result.num_states(), result.num_edges()
+            result = self.evaluate_node(prog)
 
-        if sn >= 0 and en >= 0:
             if type(result) is tuple:
-                result = (self.simplify(prog, result[0]), result[1])
+                resource_limits.check(self, result[0])
             else:
-                result = self.simplify(prog, result)
+                resource_limits.check(self, result)
 
-        prog.eval_level -= 1
+            if self.can_simplify(result[0] if type(result) is tuple else result):
+                if type(result) is tuple:
+                    result = (self.simplify(prog, result[0]), result[1])
+                else:
+                    result = self.simplify(prog, result)
+        finally:
+            prog.eval_level -= 1
 
         if type(result) is tuple:
             sn, en = result[0].num_states(), result[0].num_edges()
@@ -91,6 +114,16 @@ class IRNode:
 
         return result
 
+    # Returns 'true', 'false', or 'sometimes', like Automaton.truth_value. Consumers that only need to know this
+    # should call this instead of evaluate, so that nodes can avoid building automata they don't need (see Conjunction).
+    def truth_value(self, prog):
+        result = self.evaluate(prog)
+
+        if type(result) is tuple:
+            return result[0].truth_value()
+        else:
+            return result.truth_value()
+
     def transform(self, transformer):
         return NotImplementedError('Transform not implemented for {}'.format(self.__class__.__name__))
 
@@ -121,6 +154,11 @@ class UnaryIRExpression(IRExpression):
         self.a = a
 
     def with_type(self, new_type):
+        # Transformers rebuild each node with the type of the node it replaces, whose operands already have that type
+        # (we gave it to them), so we don't need to go all the way down again
+        if self.type is new_type:
+            return self
+
         self.a = self.a.with_type(new_type)
         return super().with_type(new_type)
 
@@ -128,7 +166,9 @@ class UnaryIRExpression(IRExpression):
         return other is not None and type(other) is self.__class__ and self.a == other.a and self.get_type() == other.get_type()
 
     def __hash__(self):
-        return hash((self.a, self.get_type()))
+        if self.hash_cache is None:
+            self.hash_cache = hash((self.a, self.get_type()))
+        return self.hash_cache
 
 class BinaryIRExpression(IRExpression):
     def __init__(self, a, b):
@@ -138,6 +178,10 @@ class BinaryIRExpression(IRExpression):
         self.b = b
 
     def with_type(self, new_type):
+        # See UnaryIRExpression.with_type
+        if self.type is new_type:
+            return self
+
         self.a = self.a.with_type(new_type)
         self.b = self.b.with_type(new_type)
         return super().with_type(new_type)
@@ -159,7 +203,9 @@ class BinaryIRExpression(IRExpression):
         return other is not None and type(other) is self.__class__ and self.a == other.a and self.b == other.b and self.get_type() == other.get_type()
 
     def __hash__(self):
-        return hash((self.a, self.b, self.get_type()))
+        if self.hash_cache is None:
+            self.hash_cache = hash((self.a, self.b, self.get_type()))
+        return self.hash_cache
 
 class IRPredicate(IRNode):
     def __init__(self):
@@ -191,7 +237,9 @@ class BinaryIRPredicate(IRPredicate):
         return other is not None and type(other) is self.__class__ and self.a == other.a and self.b == other.b
 
     def __hash__(self):
-        return hash((self.a, self.b))
+        if self.hash_cache is None:
+            self.hash_cache = hash((self.a, self.b))
+        return self.hash_cache
 
 class UnaryIRPredicate(IRPredicate):
     def __init__(self, a):
@@ -202,7 +250,9 @@ class UnaryIRPredicate(IRPredicate):
         return other is not None and type(other) is self.__class__ and self.a == other.a
 
     def __hash__(self):
-        return hash(self.a)
+        if self.hash_cache is None:
+            self.hash_cache = hash(self.a)
+        return self.hash_cache
 
 class TypeHint(IRNode):
     def __init__(self, expr_a, expr_b, body):
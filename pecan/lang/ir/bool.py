@@ -5,19 +5,33 @@ from pecan.lang.ir import *
 
 from pecan.automata.automaton import TrueAutomaton, FalseAutomaton
 
+from pecan.settings import settings
+
 class Conjunction(BinaryIRPredicate):
     def __init__(self, a, b):
         super().__init__(a, b)
 
     def evaluate_node(self, prog):
+        auts = []
+        for operand in flatten(Conjunction, self):
+            aut = operand.evaluate(prog)
+
+            if aut.is_empty():
+                return aut
+
+            auts.append(aut)
+
+        return join_all(self, prog, auts, lambda a, b: a & b, '∧')
+
+    def truth_value(self, prog):
         a_aut = self.a.evaluate(prog)
 
         if a_aut.is_empty():
-            return a_aut
+            return 'false'
 
         b_aut = self.b.evaluate(prog)
 
-        return a_aut & b_aut
+        return conjunction_truth_value(a_aut, b_aut)
 
     def transform(self, transformer):
         return transformer.transform_Conjunction(self)
@@ -30,13 +44,13 @@ class Disjunction(BinaryIRPredicate):
         super().__init__(a, b)
 
     def evaluate_node(self, prog):
-        a_aut = self.a.evaluate(prog)
-        b_aut = self.b.evaluate(prog)
+        auts = [operand.evaluate(prog) for operand in flatten(Disjunction, self)]
+        nonempty_auts = [aut for aut in auts if not aut.is_empty()]
 
-        if a_aut.is_empty():
-            return b_aut
+        if not nonempty_auts:
+            return auts[-1]
 
-        return a_aut | b_aut
+        return join_all(self, prog, nonempty_auts, lambda a, b: a | b, '∨')
 
     def transform(self, transformer):
         return transformer.transform_Disjunction(self)
@@ -51,6 +65,9 @@ class Complement(UnaryIRPredicate):
     def evaluate_node(self, prog):
         return self.a.evaluate(prog).complement()
 
+    def truth_value(self, prog):
+        return {'true': 'false', 'false': 'true', 'sometimes': 'sometimes'}[self.a.truth_value(prog)]
+
     def transform(self, transformer):
         return transformer.transform_Complement(self)
 
@@ -83,3 +100,72 @@ class BoolConst(IRPredicate):
     def __hash__(self):
         return hash(self.bool_val) # No fields to hash
 
+# Collects the operands of a chain of conjunctions (or disjunctions), e.g., P & (Q & R) gives [P, Q, R]
+def flatten(node_type, node):
+    if type(node) is node_type:
+        return flatten(node_type, node.a) + flatten(node_type, node.b)
+    else:
+        return [node]
+
+def aut_vars(aut):
+    if hasattr(aut, 'get_var_map'):
+        return set(var for var, _ in aut.get_var_map().items())
+    else:
+        return set()
+
+# A rough guess at the size (states plus edges) of the product of two automata: products of automata that share no
+# variables are as big as they can be, and the more variables they share, the more the product is constrained.
+def estimate_size(a_aut, b_aut):
+    shared = len(aut_vars(a_aut) & aut_vars(b_aut))
+    states = max(a_aut.num_states(), 0) * max(b_aut.num_states(), 0)
+    edges = max(a_aut.num_edges(), 0) * max(b_aut.num_edges(), 0)
+    return (states + edges) / (1 + shared)
+
+# Joins all the automata with join_f, always joining the pair whose result we expect to be smallest first,
+# rather than going in source order (so that P & Q & R doesn't build a huge P & Q when Q & R is tiny).
+def join_all(node, prog, auts, join_f, op_str):
+    if len(auts) == 1:
+        return auts[0]
+
+    source_estimate = estimate_size(auts[0], auts[1])
+    input_sizes = [aut.num_states() for aut in auts]
+
+    operands = [('#{}'.format(i), aut) for i, aut in enumerate(auts)]
+    intermediate_sizes = []
+    reordered = False
+
+    while len(operands) > 1:
+        _, i, j = min((estimate_size(operands[i][1], operands[j][1]), i, j)
+                      for i in range(len(operands)) for j in range(i + 1, len(operands)))
+
+        (a_desc, a_aut), (b_desc, b_aut) = operands[i], operands[j]
+        res = join_f(a_aut, b_aut)
+
+        # Simplify intermediate results like any other node's result; the final result is simplified by IRNode.evaluate
+        if len(operands) > 2 and node.can_simplify(res):
+            res = node.simplify(prog, res)
+
+        intermediate_sizes.append(res.num_states())
+        # Always joining the first two operands is exactly source order
+        reordered = reordered or (i, j) != (0, 1)
+        operands = [('({} {} {})'.format(a_desc, op_str, b_desc), res)] + [op for k, op in enumerate(operands) if k != i and k != j]
+
+    if reordered:
+        settings.record_stat('reordered conjunctions/disjunctions')
+
+    settings.log(0, lambda: node.indented(prog, 'Joined {} operands with sizes {} as {}: intermediate sizes {} (estimated cost of starting in source order: {})'.format(
+        len(auts), input_sizes, operands[0][0], intermediate_sizes, int(source_estimate))))
+
+    return operands[0][1]
+
+# Decides the truth value of a_aut & b_aut without building the product
+def conjunction_truth_value(a_aut, b_aut):
+    if not a_aut.intersects(b_aut):
+        settings.record_stat('products avoided by on-the-fly emptiness checks')
+        return 'false'
+
+    # The conjunction accepts everything exactly when both sides do
+    if a_aut.truth_value() == 'true' and b_aut.truth_value() == 'true':
+        return 'true'
+    else:
+        return 'sometimes'
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3.6
 # -*- coding=utf-8 -*-
 
+import hashlib
 import time
 
 from pecan.tools.shuffle_automata import ShuffleAutomata
@@ -9,6 +10,7 @@ from pecan.tools.hoa_loader import load_hoa
 from pecan.tools.labeled_aut_converter import convert_labeled_aut
 from pecan.tools.hoa_loader import load_hoa
 from pecan.tools.finite_loader import load_finite
+from pecan.tools.resource_limits import ResourceLimitExceeded
 from pecan.automata.buchi import BuchiAutomaton
 from pecan.lang.ir import *
 
@@ -121,17 +123,20 @@ class DirectiveAssertProp(IRNode):
         self.pred_name = pred_name
 
     def pred_truth_value(self, prog):
-        return Call(self.pred_name, []).evaluate(prog).truth_value()
+        return Call(self.pred_name, []).truth_value(prog)
 
     def evaluate(self, prog):
         settings.log(lambda: f'[INFO] Checking if {self.pred_name} is {self.display_truth_val()}.')
 
-        pred_truth_value = self.pred_truth_value(prog)
+        try:
+            pred_truth_value = self.pred_truth_value(prog)
 
-        if pred_truth_value == self.truth_val:
-            result = Result(f'{self.pred_name} is {self.display_truth_val()}.', True)
-        else:
-            result = Result(f'{self.pred_name} is not {self.display_truth_val()}.', False)
+            if pred_truth_value == self.truth_val:
+                result = Result(f'{self.pred_name} is {self.display_truth_val()}.', True)
+            else:
+                result = Result(f'{self.pred_name} is not {self.display_truth_val()}.', False)
+        except ResourceLimitExceeded as e:
+            result = Result(f'Could not check whether {self.pred_name} is {self.display_truth_val()}: {e}', False)
 
         settings.log(lambda: result.result_str())
 
@@ -155,6 +160,29 @@ class DirectiveAssertProp(IRNode):
     def __hash__(self):
         return hash((self.truth_val, self.pred_name))
 
+AUT_FORMATS = ['hoa', 'walnut', 'pecan', 'fsa-dict']
+
+def load_aut_file(realpath, aut_format, arg_names, pred_name):
+    start_time = time.time()
+
+    if aut_format == 'hoa':
+        # TODO: Rename the APs of the loaded automaton to be the same as the args specified
+        aut = load_hoa(realpath)
+    elif aut_format == 'walnut':
+        aut = convert_aut(realpath, arg_names)
+    elif aut_format == 'pecan':
+        aut = convert_labeled_aut(realpath, arg_names)
+    elif aut_format == 'fsa-dict':
+        aut = load_finite(realpath, arg_names)
+    else:
+        raise Exception('Unknown format: {}'.format(aut_format))
+
+    end_time = time.time()
+
+    settings.log(0, lambda: '[INFO] Loaded {} from {} in {:.2f} seconds ({} states, {} edges).'.format(pred_name, realpath, end_time - start_time, aut.num_states(), aut.num_edges()))
+
+    return aut
+
 class DirectiveLoadAut(IRNode):
     def __init__(self, filename, aut_format, pred):
         super().__init__()
@@ -164,27 +192,19 @@ class DirectiveLoadAut(IRNode):
 
     def evaluate(self, prog):
         # TODO: Support argument restrictions on loaded automata
-        start_time = time.time()
-        realpath = prog.locate_file(self.filename)
-        settings.log(lambda: f'[INFO] Loading {self.pred} from {realpath} in "{self.aut_format}" format.')
-
-        if self.aut_format == 'hoa':
-            # TODO: Rename the APs of the loaded automaton to be the same as the args specified
-            aut = load_hoa(realpath)
-        elif self.aut_format == 'walnut':
-            aut = convert_aut(realpath, [v.var_name for v in self.pred.args])
-        elif self.aut_format == 'pecan':
-            aut = convert_labeled_aut(realpath, [v.var_name for v in self.pred.args])
-        elif self.aut_format == 'fsa-dict':
-            aut = load_finite(realpath, [v.var_name for v in self.pred.args])
-        else:
+        if self.aut_format not in AUT_FORMATS:
             raise Exception('Unknown format: {}'.format(self.aut_format))
 
-        end_time = time.time()
+        realpath = prog.locate_file(self.filename)
+        # Said here rather than when the file is parsed, which may be much later (e.g., after a quiet stdlib load is over)
+        settings.log(lambda: f'[INFO] Loading {self.pred} from {realpath} in "{self.aut_format}" format.')
 
-        settings.log(0, lambda: '[INFO] Loaded {} in {:.2f} seconds ({} states, {} edges).'.format(self.pred, end_time - start_time, aut.num_states(), aut.num_edges()))
+        with open(realpath, 'rb') as f:
+            source_hash = hashlib.sha256(f.read() + repr((self.aut_format, self.pred)).encode('utf-8')).hexdigest()
 
-        prog.preds[self.pred.name] = NamedPred(self.pred.name, self.pred.args, {}, AutLiteral(aut))
+        # The file is only parsed once the automaton is needed (see LazyAutLiteral)
+        body = LazyAutLiteral(realpath, self.aut_format, self.pred.name, [v.var_name for v in self.pred.args], source_hash)
+        prog.preds[self.pred.name] = NamedPred(self.pred.name, self.pred.args, {}, body)
 
         return None
 
@@ -208,10 +228,8 @@ class DirectiveImport(IRNode):
 
     def evaluate(self, prog):
         realpath = prog.locate_file(self.filename)
-        from pecan.program import load
-        new_prog = load(realpath).copy_defaults(prog)
-        new_prog.evaluate()
-        prog.include(new_prog)
+        from pecan.tools.module_registry import import_module
+        prog.include(import_module(prog, realpath))
         return None
 
     def transform(self, transformer):
@@ -33,6 +33,12 @@ class PralineTerm(IRNode):
     def display(self):
         return repr(self)
 
+    # Compiled code (see pecan.lang.praline_compiler) is made of Python closures, which can't be pickled
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('compiled_code', None)
+        return state
+
 class PralineAlias(IRNode):
     def __init__(self, name, directive_name, term):
         super().__init__()
@@ -287,9 +293,13 @@ class PralineNeg(PralineUnaryOp):
         return PralineInt(-temp.get_value())
 
 class PralineList(PralineBinaryOp):
-    def __init__(self, head, tail):
+    def __init__(self, head, tail, is_value=False):
         super().__init__(head, tail)
 
+        # Whether this list was built by evaluating a list, and so only holds values. Evaluating it again would just copy
+        # it, which makes building a list one element at a time quadratic
+        self.is_value = is_value
+
     def transform(self, transformer):
         return transformer.transform_PralineList(self)
 
@@ -310,6 +320,9 @@ class PralineList(PralineBinaryOp):
         return '[{}]'.format(','.join([e.display() for e in elems]))
 
     def evaluate(self, prog):
+        if self.is_value:
+            return self
+
         if self.a is not None:
             new_a = self.a.evaluate(prog)
         else:
@@ -320,7 +333,7 @@ class PralineList(PralineBinaryOp):
         else:
             new_b = None
 
-        return PralineList(new_a, new_b)
+        return PralineList(new_a, new_b, is_value=True)
 
 class PralineMatch(PralineTerm):
     def __init__(self, t, arms):
@@ -769,10 +782,13 @@ class PralineLet(PralineTerm):
         return hash((self.var_name, self.expr, self.body))
 
 class PralineTuple(PralineTerm):
-    def __init__(self, vals):
+    def __init__(self, vals, is_value=False):
         super().__init__()
         self.vals = vals
 
+        # See PralineList
+        self.is_value = is_value
+
     def transform(self, transformer):
         return transformer.transform_PralineTuple(self)
 
@@ -780,7 +796,10 @@ class PralineTuple(PralineTerm):
         return '({})'.format(','.join(map(repr, self.vals)))
 
     def evaluate(self, prog):
-        return PralineTuple([v.evaluate(prog) for v in self.vals])
+        if self.is_value:
+            return self
+
+        return PralineTuple([v.evaluate(prog) for v in self.vals], is_value=True)
 
     def __eq__(self, other):
         return other is not None and type(other) is self.__class__ and self.vals == other.vals
@@ -792,19 +811,52 @@ class PralineTuple(PralineTerm):
         return '({})'.format(','.join([v.display() for v in self.vals]))
 
 class Closure(PralineTerm):
-    def __init__(self, env, args, body):
+    def __init__(self, env, args, body, applied=()):
         super().__init__()
-        self.env = env
-        self.args = args
+        self.base_env = env
+        self.params = args
         self.body = body
 
+        # The values of the first len(applied) params. We only build the environment that binds them (see bind) when
+        # the last argument is applied, rather than copying it for every argument.
+        self.applied = applied
+
+    # The params that we still need arguments for
+    @property
+    def args(self):
+        return self.params[len(self.applied):]
+
+    @property
+    def env(self):
+        return self.bind(self.applied)
+
+    def bind(self, applied):
+        if not self.base_env:
+            return { param.var_name: val for param, val in zip(self.params, applied) }
+
+        env = dict(self.base_env)
+        for param, val in zip(self.params, applied):
+            env[param.var_name] = val
+        return env
+
+    def body_code(self):
+        if not settings.use_praline_compiler():
+            return self.body.evaluate
+
+        code = self.body.__dict__.get('compiled_code')
+        if code is None:
+            from pecan.lang.praline_compiler import compiled
+            code = compiled(self.body)
+        return code
+
     def evaluate(self, prog):
-        if self.args: # If we still require more arguments
+        if len(self.applied) < len(self.params): # If we still require more arguments
             return self
         else: # Evaluate as though we are in the environment specified
-            prog.praline_local_define_all(self.env)
-            result = self.body.evaluate(prog)
-            prog.praline_local_cleanup(self.env.keys())
+            env = self.env
+            prog.praline_local_define_all(env)
+            result = self.body_code()(prog)
+            prog.praline_local_cleanup(env.keys())
             return result
 
     def transform(self, transformer):
@@ -814,19 +866,25 @@ class Closure(PralineTerm):
         return 'Closure({}, {}, {})'.format(self.env, self.args, self.body)
 
     def apply(self, prog, arg):
-        if not self.args:
+        if len(self.applied) >= len(self.params):
             raise Exception('Closure accepts no arguments!')
 
-        new_env = dict(self.env)
-        new_env[self.args[0].var_name] = arg
+        return self.apply_all(prog, (arg,))
 
-        if len(self.args) == 1:
-            prog.enter_praline_env(new_env)
-            result = self.body.evaluate(prog)
-            prog.exit_praline_env()
-            return result
-        else:
-            return Closure(new_env, self.args[1:], self.body)
+    # Applies several arguments at once (at most as many as we still need)
+    def apply_all(self, prog, args):
+        applied = self.applied + args
+
+        if len(applied) < len(self.params):
+            return Closure(self.base_env, self.params, self.body, applied)
+
+        env = self.bind(applied)
+        code = self.body_code()
+
+        prog.enter_praline_env(env)
+        result = code(prog)
+        prog.exit_praline_env()
+        return result
 
     def __eq__(self, other):
         return other is not None and type(other) is self.__class__ and self.env == other.env and self.args == other.args and self.body == other.body
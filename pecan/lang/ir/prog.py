@@ -3,6 +3,7 @@
 
 from colorama import Fore, Style
 
+import hashlib
 import os
 from functools import reduce
 import time
@@ -13,9 +14,10 @@ import spot
 
 from pecan.automata.automaton import FalseAutomaton
 from pecan.tools.hoa_loader import from_spot_aut
+from pecan.tools.resource_limits import resource_limits, ResourceLimitExceeded
 from pecan.lang.ir.base import *
 from pecan.settings import settings
-from pecan.utility import VarMap
+from pecan.utility import VarMap, APRegistry, LRUCache
 
 class VarRef(IRExpression):
     def __init__(self, var_name):
@@ -44,15 +46,22 @@ class VarRef(IRExpression):
         return hash(self.var_name)
 
 class AutLiteral(IRPredicate):
-    def __init__(self, aut, display_node=None):
+    def __init__(self, aut, display_node=None, source_hash=None):
         super().__init__()
         self.aut = aut
         self.is_int = False
         self.display_node = display_node
+        self.source_hash = source_hash
 
     def evaluate(self, prog):
         return self.aut
 
+    # Identifies the automaton for caching (see pecan.tools.predicate_cache)
+    def content_hash(self):
+        if self.source_hash is None:
+            self.source_hash = hashlib.sha256(self.aut.to_str().encode('utf-8')).hexdigest()
+        return self.source_hash
+
     def transform(self, transformer):
         return transformer.transform_AutLiteral(self)
 
@@ -71,6 +80,46 @@ class AutLiteral(IRPredicate):
     def __hash__(self):
         return hash((self.aut))
 
+# An automaton loaded from a file by #load, which we only read the first time the automaton is needed.
+# Libraries load many automata that most programs never use, and everything else we need to know about the predicate
+# (its arguments) comes from the #load directive itself.
+class LazyAutLiteral(AutLiteral):
+    def __init__(self, realpath, aut_format, pred_name, arg_names, source_hash, display_node=None):
+        self.realpath = realpath
+        self.aut_format = aut_format
+        self.pred_name = pred_name
+        self.arg_names = arg_names
+        self.loaded_aut = None
+        super().__init__(None, display_node=display_node, source_hash=source_hash)
+
+    @property
+    def aut(self):
+        if self.loaded_aut is None:
+            from pecan.lang.ir.directives import load_aut_file
+            self.loaded_aut = load_aut_file(self.realpath, self.aut_format, self.arg_names, self.pred_name)
+            settings.record_stat('lazy automata loaded')
+        return self.loaded_aut
+
+    @aut.setter
+    def aut(self, aut):
+        self.loaded_aut = aut
+
+    def is_loaded(self):
+        return self.loaded_aut is not None
+
+    def __repr__(self):
+        if self.display_node is not None:
+            return 'AutLiteral({})'.format(repr(self.display_node))
+        else:
+            return 'AutLiteral({})'.format(repr(self.realpath))
+
+    # Compare by where we come from, so that nothing is loaded just to compare or hash us
+    def __eq__(self, other):
+        return other is not None and type(other) is self.__class__ and self.source_hash == other.source_hash
+
+    def __hash__(self):
+        return hash(self.source_hash)
+
 class SpotFormula(IRPredicate):
     def __init__(self, formula_str):
         super().__init__()
@@ -182,6 +231,12 @@ class Call(IRPredicate):
     def evaluate_node(self, prog):
         return prog.call(self.name, self.args)
 
+    def truth_value(self, prog):
+        if not self.args and self.name in prog.preds:
+            return prog.preds[self.name].truth_value(prog)
+        else:
+            return super().truth_value(prog)
+
     def transform(self, transformer):
         return transformer.transform_Call(self)
 
@@ -192,7 +247,9 @@ class Call(IRPredicate):
         return other is not None and type(other) is self.__class__ and self.name == other.name and self.args == other.args
 
     def __hash__(self):
-        return hash((self.name, tuple(self.args)))
+        if self.hash_cache is None:
+            self.hash_cache = hash((self.name, tuple(self.args)))
+        return self.hash_cache
 
 class NamedPred(IRNode):
     def __init__(self, name, args, arg_restrictions, body, restriction_env=None, body_evaluated=None, arg_name_map=None):
@@ -246,10 +303,14 @@ class NamedPred(IRNode):
                 if settings.should_write_statistics():
                     prog.start_max_aut(self.name)
 
-                self.body_evaluated = self.body.evaluate(prog).relabel()
+                try:
+                    self.body_evaluated = self.evaluate_body(prog).relabel(prog.get_ap_registry(), [arg.var_name for arg in self.args])
+                finally:
+                    # Even if we went over a resource limit, so the predicates evaluated after us don't keep updating our entry
+                    if settings.should_write_statistics():
+                        sn, en, runtime = prog.finish_max_aut(self.name)
 
                 if settings.should_write_statistics():
-                    sn, en, runtime = prog.finish_max_aut(self.name)
                     sn = max(self.body_evaluated.num_states(), sn)
                     en = max(self.body_evaluated.num_edges(), en)
                     print('[INFO] Max states for {} is {}'.format(self.name, sn))
@@ -266,6 +327,39 @@ class NamedPred(IRNode):
         finally:
             prog.exit_scope()
 
+    # The same as call(prog).truth_value(), but if we haven't been evaluated yet, only does as much work as needed to find the truth value
+    def truth_value(self, prog):
+        from pecan.tools.predicate_cache import PredicateCache
+        cache = PredicateCache(settings.get_cache_dir(), settings.get_cache_max_size())
+
+        if self.body_evaluated is not None or cache.should_cache(self):
+            return self.call(prog).truth_value()
+
+        prog.enter_scope(dict(self.restriction_env))
+
+        try:
+            return self.body.truth_value(prog)
+        finally:
+            prog.exit_scope()
+
+    def evaluate_body(self, prog):
+        from pecan.tools.predicate_cache import PredicateCache
+        cache = PredicateCache(settings.get_cache_dir(), settings.get_cache_max_size())
+
+        if not cache.should_cache(self):
+            return self.body.evaluate(prog)
+
+        key = cache.key(prog, self)
+        aut = cache.lookup(key)
+
+        if aut is None:
+            aut = self.body.evaluate(prog)
+            cache.store(key, aut)
+        else:
+            settings.log(0, lambda: '[DEBUG] Loaded {} from the predicate cache'.format(self.name))
+
+        return aut
+
     def __repr__(self):
         if self.body_evaluated is None:
             return '{}({}) := {}'.format(self.name, ', '.join(map(repr, self.args)), self.body)
@@ -304,9 +398,16 @@ class Program(IRNode):
         self.aut_stats = {}
 
         self.var_map = []
+        self.ap_registry = kwargs.get('ap_registry', APRegistry())
+        self.constants_cache = kwargs.get('constants_cache', LRUCache(settings.get_constants_cache_size()))
+        # Not shared with other programs, because predicates with the same name may mean different things there
+        self.subformula_memo = LRUCache(settings.get_subformula_memo_size())
 
         self.generated_files = kwargs.get('generated_files', [])
 
+        # The modules imported by this program and the programs it imports (see pecan.tools.module_registry)
+        self.module_registry = kwargs.get('module_registry', {})
+
         from pecan.lang.type_inference import TypeInferer
         self.type_inferer = TypeInferer(self)
 
@@ -329,6 +430,21 @@ class Program(IRNode):
     def get_var_map(self):
         return self.var_map[-1]
 
+    def get_constants_cache(self):
+        # The size may have been changed (e.g., by Praline) since we were created
+        self.constants_cache.max_size = settings.get_constants_cache_size()
+        return self.constants_cache
+
+    def get_subformula_memo(self):
+        self.subformula_memo.max_size = settings.get_subformula_memo_size()
+        return self.subformula_memo
+
+    def get_ap_registry(self):
+        if settings.use_canonical_aps():
+            return self.ap_registry
+        else:
+            return None
+
     def enter_praline_env(self, new_env=None):
         if new_env is None:
             self.praline_envs.append({})
@@ -381,6 +497,10 @@ class Program(IRNode):
         self.eval_level = other_prog.eval_level
         self.result = other_prog.result
         self.search_paths.extend(other_prog.search_paths)
+        # other_prog may also be an AST program (see ASTToIR.transform_Program), which has no registry of its own
+        self.ap_registry = getattr(other_prog, 'ap_registry', self.ap_registry)
+        self.constants_cache = getattr(other_prog, 'constants_cache', self.constants_cache)
+        self.module_registry = getattr(other_prog, 'module_registry', self.module_registry)
         return self
 
     def include(self, other_prog):
@@ -440,6 +560,18 @@ class Program(IRNode):
         else:
             return d.evaluate(self)
 
+    def evaluate_definition(self, i, d):
+        resource_limits.begin()
+        try:
+            return self.run_definition(i, d)
+        except ResourceLimitExceeded as e:
+            # Give up on this definition, but keep going with the rest of the program
+            result = Result('Could not evaluate {}: {}'.format(d, e), False)
+            settings.log(lambda: result.result_str())
+            return result
+        finally:
+            resource_limits.end()
+
     def evaluate(self, old_env=None):
         from pecan.lib.praline.builtins import builtins
 
@@ -453,6 +585,16 @@ class Program(IRNode):
         msgs = []
         self.idx = 0
 
+        def add_result(result):
+            nonlocal succeeded
+            if result is not None and type(result) is Result:
+                if result.failed():
+                    succeeded = False
+                    msgs.append(result.message())
+
+        from pecan.tools.parallel import make_scheduler
+        scheduler = make_scheduler(self)
+
         # Don't use a for, because Praline code can insert new definitions dynamically
         while self.idx < len(self.defs):
             self.enter_var_map_scope()
@@ -461,16 +603,30 @@ class Program(IRNode):
             d = self.defs[self.idx]
 
             settings.log(0, lambda: '[DEBUG] Processing: {}'.format(d))
-            result = self.run_definition(self.idx, d)
-            if result is not None and type(result) is Result:
-                if result.failed():
-                    succeeded = False
-                    msgs.append(result.message())
+
+            if scheduler is None:
+                add_result(self.evaluate_definition(self.idx, d))
+            elif scheduler.can_defer(d):
+                scheduler.submit(self.idx, d)
+
+                for result in scheduler.collect():
+                    add_result(result)
+            else:
+                # Anything that changes more than the current scope has to wait for everything before it
+                if not scheduler.can_run_alongside(d):
+                    for result in scheduler.drain():
+                        add_result(result)
+
+                add_result(scheduler.run_here(self.idx, d))
 
             self.idx += 1 + self.emit_offset
 
             self.exit_var_map_scope()
 
+        if scheduler is not None:
+            for result in scheduler.drain():
+                add_result(result)
+
         # Clear all restrictions. All relevant restrictions will be held inside the restriction_env of the relevant predicates.
         # Having them also in our restrictions list just leads to double restricting, which is a waste of computation time
         self.restrictions.clear()
@@ -529,7 +685,7 @@ class Program(IRNode):
             raise Exception('Cannot exit the last scope!')
 
     def enter_var_map_scope(self, var_map=None):
-        self.var_map.append(var_map or VarMap())
+        self.var_map.append(var_map or VarMap(ap_registry=self.get_ap_registry()))
 
     def exit_var_map_scope(self):
         return self.var_map.pop()
@@ -13,20 +13,119 @@ class Exists(IRPredicate):
         self.pred = pred
 
     def evaluate_node(self, prog):
+        memo = prog.get_subformula_memo()
+        key, free_vars = self.memo_key(prog) if memo.max_size > 0 else (None, None)
+
+        if key is not None and key in memo:
+            settings.record_stat('subformula memo hits')
+            aut, memo_free_vars = memo.get(key)
+            return rename_free_vars(prog, aut, memo_free_vars, free_vars)
+
         for v, cond in zip(self.var_refs, self.conds):
             if cond is not None:
                 prog.restrict(v.var_name, cond)
 
-        all_constraints = self.get_prog_constraints(prog)
-        aut = self.with_cond(all_constraints + self.conds, self.pred).evaluate(prog)
-        res = aut.project(self.var_refs, prog.get_var_map())
+        try:
+            all_constraints = self.get_prog_constraints(prog)
+            aut = self.with_cond(all_constraints + self.conds, self.pred).evaluate(prog)
+            res = aut.project(self.var_refs, prog.get_var_map())
+        finally:
+            self.forget_conds(prog)
+
+        if key is not None:
+            settings.record_stat('subformula memo misses')
+            # Whoever we return res to may project it, which changes its var map in place
+            memo.put(key, (with_own_var_map(res), free_vars))
+
+        return res
+
+    # The key for this formula in the subformula memo: the same for all alpha-equivalent formulas (e.g., `exists y. x = 2*y`
+    # and `exists z. w = 2*z`) that mean the same thing here. Also returns the free variables of this formula, in the
+    # order that matches them up with the free variables of the other formulas with this key.
+    def memo_key(self, prog):
+        from pecan.lang.optimizer.tools import AlphaNormalizer
+
+        normalizer = AlphaNormalizer()
+        node = normalizer.normalize(self)
+
+        if normalizer.opaque:
+            return None, None
+
+        free_vars = list(normalizer.free_vars)
+
+        # Restrictions (e.g., from `Restrict x is nat`), predicates, and the #context are all looked up by name when
+        # we're evaluated, so what they are right now is part of the key too
+        restrictions = []
+        for var_name, new_name in normalizer.bound_vars:
+            restrictions.append(tuple(normalizer.normalize_with(var_name, new_name, r) for r in prog.get_restrictions(var_name)))
+        for i, var_name in enumerate(free_vars):
+            restrictions.append(tuple(normalizer.normalize_with(var_name, '__alpha_free{}'.format(i), r) for r in prog.get_restrictions(var_name)))
+
+        preds = tuple(sorted((name, id(prog.preds.get(name))) for name in normalizer.called_preds))
+        context = tuple(sorted((k, repr(v)) for k, v in prog.context.items()))
 
+        return (node, tuple(restrictions), preds, context), free_vars
+
+    def truth_value(self, prog):
         for v, cond in zip(self.var_refs, self.conds):
             if cond is not None:
-                prog.forget(v.var_name)
+                prog.restrict(v.var_name, cond)
+
+        try:
+            all_constraints = self.get_prog_constraints(prog)
+            body = self.with_cond(all_constraints + self.conds, self.pred)
+
+            if type(body) is Conjunction and type(body.b) is Complement:
+                # This is what `forall` looks like: the conjunction is empty exactly when body.a is included in body.b.a,
+                # which we can check without building the complement
+                a_aut = body.a.evaluate(prog)
+                b_aut = None if a_aut.is_empty() else body.b.a.evaluate(prog)
+
+                if b_aut is None or a_aut.contains(b_aut):
+                    res = 'false'
+                elif self.binds_all(a_aut, b_aut):
+                    res = 'true'
+                else:
+                    res = body.simplify(prog, a_aut & b_aut.complement()).project(self.var_refs, prog.get_var_map()).truth_value()
+            elif type(body) is Conjunction:
+                # Projecting doesn't change whether an automaton is empty, so we only need the product if it's nonempty
+                a_aut = body.a.evaluate(prog)
+                b_aut = None if a_aut.is_empty() else body.b.evaluate(prog)
+
+                if b_aut is None or not a_aut.intersects(b_aut):
+                    settings.record_stat('products avoided by on-the-fly emptiness checks')
+                    res = 'false'
+                elif self.binds_all(a_aut, b_aut):
+                    settings.record_stat('products avoided by on-the-fly emptiness checks')
+                    res = 'true'
+                else:
+                    res = body.simplify(prog, a_aut & b_aut).project(self.var_refs, prog.get_var_map()).truth_value()
+            elif type(body) is Complement:
+                aut = body.a.evaluate(prog)
+
+                if aut.is_universal():
+                    res = 'false'
+                elif self.binds_all(aut):
+                    res = 'true'
+                else:
+                    res = aut.complement().project(self.var_refs, prog.get_var_map()).truth_value()
+            else:
+                res = body.evaluate(prog).project(self.var_refs, prog.get_var_map()).truth_value()
+        finally:
+            self.forget_conds(prog)
 
         return res
 
+    def forget_conds(self, prog):
+        for v, cond in zip(self.var_refs, self.conds):
+            if cond is not None:
+                prog.forget(v.var_name)
+
+    # Whether all the free variables of the automata are bound here, so that the result is either true or false
+    def binds_all(self, *auts):
+        bound = set(v.var_name for v in self.var_refs)
+        return all(aut_vars(aut) <= bound for aut in auts)
+
     def get_prog_constraints(self, prog):
         all_constraints = []
 
@@ -60,5 +159,33 @@ class Exists(IRPredicate):
         return other is not None and type(other) is self.__class__ and self.var_refs == other.var_refs and self.conds == other.conds and self.pred == other.pred
 
     def __hash__(self):
-        return hash((tuple(self.var_refs), tuple(self.conds), self.pred))
-
+        if self.hash_cache is None:
+            self.hash_cache = hash((tuple(self.var_refs), tuple(self.conds), self.pred))
+        return self.hash_cache
+
+# Renames the free variables of an automaton built for a formula with free variables old_free_vars so that it's for the
+# alpha-equivalent formula with free variables new_free_vars
+def rename_free_vars(prog, aut, old_free_vars, new_free_vars):
+    if not hasattr(aut, 'get_var_map'):
+        return aut
+
+    arg_map = {var_name: var_name for var_name, _ in aut.get_var_map().items()}
+    for old_name, new_name in zip(old_free_vars, new_free_vars):
+        if old_name in arg_map:
+            arg_map[old_name] = new_name
+
+    # Never hand out the memoized automaton itself (see Exists.evaluate_node)
+    if all(old_name == new_name for old_name, new_name in arg_map.items()):
+        return with_own_var_map(aut)
+
+    return with_own_var_map(aut.substitute(arg_map, prog.get_var_map()))
+
+def with_own_var_map(aut):
+    if not hasattr(aut, 'get_var_map'):
+        return aut
+
+    # Not copy.copy, which would go through HOA (see BuchiAutomaton.__getstate__)
+    res = object.__new__(type(aut))
+    res.__dict__.update(aut.__dict__)
+    res.var_map = aut.get_var_map().clone()
+    return res
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+from functools import reduce
+
+from pecan.lang.optimizer.basic_optimizer import BasicOptimizer
+from pecan.lang.optimizer.tools import VariableUsage
+from pecan.lang.ir_transformer import IRTransformer
+
+from pecan.lang.ir import *
+
+from pecan.settings import settings
+
+# Like VariableUsage, but also notices nodes whose variables we can't see (e.g., automaton literals), which we must
+# assume mention every variable
+class MentionedVars(VariableUsage):
+    def __init__(self):
+        super().__init__()
+        self.opaque = False
+
+    def transform_AutLiteral(self, node):
+        self.opaque = True
+        return node
+
+    def transform_SpotFormula(self, node):
+        self.opaque = True
+        return node
+
+    def transform_IndexRange(self, node):
+        self.opaque = True
+        return node
+
+    def transform_EqualsCompareRange(self, node):
+        self.opaque = True
+        return node
+
+    def mentions(self, node, var_name):
+        self.opaque = False
+        used_vars = self.analyze(node)
+        return self.opaque or var_name in used_vars
+
+class NodeCount(IRTransformer):
+    def __init__(self):
+        super().__init__()
+        self.num_nodes = 0
+
+    def transform(self, node):
+        self.num_nodes += 1
+        return super().transform(node)
+
+    def count(self, node):
+        self.num_nodes = 0
+        self.transform(node)
+        return self.num_nodes
+
+# Pushes quantifiers as far inward as possible, so that each variable is projected away from the smallest product
+# that mentions it, rather than from the product of the entire body:
+#   ∃x. P(y) ∧ Q(x, y)  ==>  P(y) ∧ ∃x. Q(x, y)
+#   ∃x. P(y) ∨ Q(x, y)  ==>  (∃x. P(y)) ∨ (∃x. Q(x, y))  (and then UnusedVariableOptimizer gets rid of the first ∃x)
+# Quantifiers over several variables are split into nested quantifiers over one variable each, in the order given
+# by elimination_order, so that each variable can be pushed in separately.
+# Because `forall` is ¬∃¬ and BooleanOptimizer pushes complements inward, this handles forall as well.
+class MiniscopingOptimizer(BasicOptimizer):
+    def transform_Exists(self, node: Exists):
+        if len(node.var_refs) > 1:
+            if self.worth_splitting(node):
+                return self.split(node)
+            else:
+                return super().transform_Exists(node)
+        elif len(node.var_refs) == 0:
+            return super().transform_Exists(node)
+
+        v, cond = node.var_refs[0], node.conds[0]
+        pred = self.transform(node.pred)
+
+        if type(pred) is Conjunction:
+            dependent, independent = self.partition(flatten(Conjunction, pred), v.var_name)
+
+            # If nothing depends on v, UnusedVariableOptimizer will take care of it
+            if dependent and independent:
+                self.changed = True
+                settings.record_stat('quantifiers pushed past conjuncts')
+                return Conjunction(reduce(Conjunction, independent), self.transform(Exists([v], [cond], reduce(Conjunction, dependent))))
+
+        elif type(pred) is Disjunction:
+            dependent, independent = self.partition(flatten(Disjunction, pred), v.var_name)
+
+            if dependent and independent:
+                self.changed = True
+                settings.record_stat('quantifiers pushed past disjuncts')
+                return Disjunction(Exists([v], [cond], reduce(Disjunction, independent)), self.transform(Exists([v], [cond], reduce(Disjunction, dependent))))
+
+        return Exists([v], [cond], pred)
+
+    def partition(self, operands, var_name):
+        dependent = []
+        independent = []
+
+        for operand in operands:
+            if MentionedVars().mentions(operand, var_name):
+                dependent.append(operand)
+            else:
+                independent.append(operand)
+
+        return dependent, independent
+
+    # Splitting only pays off if some variable can then be pushed past something. Otherwise, we'd rather keep the
+    # quantifier whole, so that Exists.truth_value can see the whole body (e.g., to check a `forall` by inclusion)
+    def worth_splitting(self, node):
+        if type(node.pred) is Conjunction:
+            operands = flatten(Conjunction, node.pred)
+        elif type(node.pred) is Disjunction:
+            operands = flatten(Disjunction, node.pred)
+        else:
+            return False
+
+        var_names = set(v.var_name for v in node.var_refs)
+        for operand in operands:
+            analyzer = MentionedVars()
+            used_vars = analyzer.analyze(operand)
+            if not analyzer.opaque and not var_names <= used_vars:
+                return True
+
+        return False
+
+    def split(self, node):
+        var_names = set(v.var_name for v in node.var_refs)
+
+        # We can't split the quantifier if the restriction on one variable mentions another one, because the
+        # restriction stays with its own variable
+        for v, cond in zip(node.var_refs, node.conds):
+            if cond is not None and (MentionedVars().analyze(cond) & var_names) - {v.var_name}:
+                return Exists(node.var_refs, node.conds, self.transform(node.pred))
+
+        order = self.elimination_order(node)
+
+        # The first variable in the elimination order goes innermost, so that it is projected away first
+        res = node.pred
+        for i in order:
+            res = Exists([node.var_refs[i]], [node.conds[i]], res)
+
+        self.changed = True
+        settings.record_stat('quantifiers split')
+
+        return self.transform(res)
+
+    # Picks the order to eliminate (project away) the variables bound by node in, as in variable elimination for
+    # constraint problems: greedily eliminate the variable whose conjuncts are smallest (in number of nodes, a proxy for
+    # the size of their automata), then treat those conjuncts as a single conjunct mentioning all their other variables.
+    # Returns indices into node.var_refs; ties are broken by source order.
+    def elimination_order(self, node):
+        # Each conjunct is represented by (set of variables it mentions, size)
+        conjuncts = []
+        for conjunct in flatten(Conjunction, node.pred):
+            analyzer = MentionedVars()
+            used_vars = analyzer.analyze(conjunct)
+            if analyzer.opaque:
+                used_vars = set(v.var_name for v in node.var_refs)
+            conjuncts.append((used_vars, NodeCount().count(conjunct)))
+
+        remaining = list(range(len(node.var_refs)))
+        order = []
+
+        while remaining:
+            def cost(i):
+                var_name = node.var_refs[i].var_name
+                occurrences = [size for used_vars, size in conjuncts if var_name in used_vars]
+                return (sum(occurrences), len(occurrences), i)
+
+            best = min(remaining, key=cost)
+            var_name = node.var_refs[best].var_name
+
+            merged = [c for c in conjuncts if var_name in c[0]]
+            conjuncts = [c for c in conjuncts if var_name not in c[0]]
+            if merged:
+                conjuncts.append((set.union(*[used_vars for used_vars, _ in merged]) - {var_name}, sum(size for _, size in merged)))
+
+            remaining.remove(best)
+            order.append(best)
+
+        return order
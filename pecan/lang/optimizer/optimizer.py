@@ -6,6 +6,7 @@ from pecan.lang.optimizer.arithmetic import ArithmeticOptimizer
 from pecan.lang.optimizer.cse import CSEOptimizer
 from pecan.lang.optimizer.redundant_variable_optimizer import RedundantVariableOptimizer
 from pecan.lang.optimizer.unused_variable_optimizer import UnusedVariableOptimizer
+from pecan.lang.optimizer.miniscoping_optimizer import MiniscopingOptimizer
 from pecan.lang.ir import *
 
 from pecan.settings import settings
@@ -60,6 +61,9 @@ class Optimizer:
             # optimization_pass = [ ArithmeticOptimizer(self), CSEOptimizer(self), BooleanOptimizer(self), RedundantVariableOptimizer(self), UnusedVariableOptimizer(self) ]
             optimization_pass = [ ArithmeticOptimizer(self), CSEOptimizer(self), BooleanOptimizer(self), UnusedVariableOptimizer(self) ]
 
+            if settings.use_miniscoping():
+                optimization_pass.insert(-1, MiniscopingOptimizer(self))
+
         settings.log(2, lambda: f'Optimization passes: {optimization_pass}')
 
         new_node = node
@@ -144,3 +144,94 @@ class NodeFilter(IRTransformer):
             self.results.append(node)
         return super().transform(node)
 
+
+# Renames the variables of a node canonically, so that alpha-equivalent nodes (i.e., the same up to the names of
+# variables) are equal: bound variables are named by how deeply they are bound, and free variables by their first
+# occurrence. After normalize, free_vars holds the original names of the free variables, in order, bound_vars pairs
+# the original name of each bound variable with its new name, and called_preds holds the names of all predicates called.
+# Nodes whose variables we can't see (e.g., automaton literals) make the node opaque, in which case it shouldn't be
+# treated as equal to anything else.
+class AlphaNormalizer(IRTransformer):
+    def __init__(self):
+        super().__init__()
+        self.env = {}
+        self.depth = 0
+        self.free_vars = []
+        self.bound_vars = []
+        self.called_preds = set()
+        self.opaque = False
+
+    def rename(self, var_name):
+        if var_name in self.env:
+            return self.env[var_name]
+
+        if var_name not in self.free_vars:
+            self.free_vars.append(var_name)
+
+        return '__alpha_free{}'.format(self.free_vars.index(var_name))
+
+    def bind(self, var_names):
+        old_env = dict(self.env)
+
+        for var_name in var_names:
+            self.env[var_name] = '__alpha_bound{}'.format(self.depth)
+            self.bound_vars.append((var_name, self.env[var_name]))
+            self.depth += 1
+
+        return old_env
+
+    def unbind(self, old_env, num_vars):
+        self.env = old_env
+        self.depth -= num_vars
+
+    def transform_VarRef(self, node: VarRef):
+        return VarRef(self.rename(node.var_name)).with_type(node.get_type())
+
+    def transform_Call(self, node: Call):
+        self.called_preds.add(node.name)
+        return super().transform_Call(node)
+
+    def transform_Exists(self, node: Exists):
+        old_env = self.bind([v.var_name for v in node.var_refs])
+        res = super().transform_Exists(node)
+        self.unbind(old_env, len(node.var_refs))
+        return res
+
+    def transform_PredicateExpr(self, node: PredicateExpr):
+        old_env = self.bind([node.var.var_name])
+        res = PredicateExpr(self.transform(node.var), self.transform(node.pred)).with_type(node.get_type())
+        self.unbind(old_env, 1)
+        return res
+
+    def make_opaque(self, node):
+        self.opaque = True
+        return node
+
+    def transform_AutLiteral(self, node):
+        return self.make_opaque(node)
+
+    def transform_SpotFormula(self, node):
+        return self.make_opaque(node)
+
+    def transform_IndexRange(self, node):
+        return self.make_opaque(node)
+
+    def transform_EqualsCompareRange(self, node):
+        return self.make_opaque(node)
+
+    def transform_FunctionExpression(self, node):
+        return self.make_opaque(node)
+
+    def transform_TypeHint(self, node):
+        return self.make_opaque(node)
+
+    def normalize(self, node):
+        return self.transform(node)
+
+    # Normalizes a node mentioning a variable bound in the last node normalized (e.g., a restriction on that variable)
+    def normalize_with(self, var_name, new_name, node):
+        old_env = self.env
+        self.env = {var_name: new_name}
+        res = self.transform(node)
+        self.env = old_env
+        return res
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Compiles the bodies of Praline closures into Python closures, so that calling a Praline function doesn't walk its body
+# node by node: each node becomes a function of the program that computes the same value its evaluate method would.
+# The work that depends only on the shape of the term is done once, when compiling: dispatching on the type of each
+# node, flattening applications like `f x y z` so that f gets all of its arguments at once, and turning patterns into
+# matchers.
+# Local variables still live in the program's Praline environment (a dict), because builtins, Pecan terms (which
+# substitute the whole environment), and definitions without arguments (which are evaluated in their caller's
+# environment) all look them up by name.
+
+from pecan.lang.ir.praline import *
+
+# Values whose evaluate method just returns them (or, for lists and tuples not built by evaluating, an equal copy)
+VALUE_TYPES = { PralineInt, PralineString, PralineBool, PralineList, PralineTuple, PralinePecanLiteral, PralineAutomaton }
+
+def compiled(node):
+    code = node.__dict__.get('compiled_code')
+
+    if code is None:
+        code = PralineCompiler().compile(node)
+        node.compiled_code = code
+
+    return code
+
+class PralineCompiler:
+    def compile(self, node):
+        compile_f = getattr(self, 'compile_{}'.format(type(node).__name__), None)
+
+        # Anything we don't know how to compile (e.g., builtins) is just evaluated as before
+        if compile_f is None:
+            return node.evaluate
+
+        return compile_f(node)
+
+    def compile_constant(self, node):
+        def constant(prog):
+            return node
+        return constant
+
+    compile_PralineInt = compile_constant
+    compile_PralineString = compile_constant
+    compile_PralineBool = compile_constant
+    compile_PralinePecanLiteral = compile_constant
+    compile_PralineAutomaton = compile_constant
+
+    def compile_PralineVar(self, node):
+        name = node.var_name
+
+        def var(prog):
+            env = prog.praline_envs[-1]
+            if name in env:
+                val = env[name]
+            elif name in prog.praline_defs:
+                val = prog.praline_defs[name]
+            else:
+                val = prog.praline_lookup(name)
+
+            if type(val) in VALUE_TYPES:
+                return val
+
+            return val.evaluate(prog)
+
+        return var
+
+    def compile_PralineApp(self, node):
+        arg_nodes = []
+        while type(node) is PralineApp:
+            arg_nodes.append(node.arg)
+            node = node.receiver
+        arg_nodes.reverse()
+
+        receiver_code = self.compile(node)
+        arg_codes = [self.compile(arg) for arg in arg_nodes]
+        num_args = len(arg_codes)
+
+        # Applying a closure to fewer arguments than it needs has no effects, so we can evaluate all the arguments it
+        # needs first, and only then apply them all at once
+        def app(prog):
+            f = receiver_code(prog)
+            i = 0
+
+            while i < num_args:
+                if type(f) is Closure and len(f.applied) < len(f.params):
+                    j = min(i + len(f.params) - len(f.applied), num_args)
+                    if i == 0 and j == num_args:
+                        f = f.apply_all(prog, tuple([arg_code(prog) for arg_code in arg_codes]))
+                    else:
+                        f = f.apply_all(prog, tuple([arg_codes[k](prog) for k in range(i, j)]))
+                    i = j
+                else:
+                    f = f.apply(prog, arg_codes[i](prog))
+                    i += 1
+
+                if type(f) not in VALUE_TYPES:
+                    f = f.evaluate(prog)
+
+            return f
+
+        return app
+
+    def compile_int_op(self, node, op):
+        a_code = self.compile(node.a)
+        b_code = self.compile(node.b)
+
+        def int_op(prog):
+            eval_a = a_code(prog)
+            eval_b = b_code(prog)
+
+            if type(eval_a) is PralineInt and type(eval_b) is PralineInt:
+                return PralineInt(op(eval_a.val, eval_b.val))
+            else:
+                raise TypeError('Both operands should be integers in "{}"'.format(node))
+
+        return int_op
+
+    def compile_PralineAdd(self, node):
+        return self.compile_int_op(node, lambda a, b: a + b)
+
+    def compile_PralineSub(self, node):
+        return self.compile_int_op(node, lambda a, b: a - b)
+
+    def compile_PralineMul(self, node):
+        return self.compile_int_op(node, lambda a, b: a * b)
+
+    def compile_PralineDiv(self, node):
+        return self.compile_int_op(node, lambda a, b: a // b)
+
+    def compile_PralineExponent(self, node):
+        a_code = self.compile(node.a)
+        b_code = self.compile(node.b)
+
+        def exponent(prog):
+            eval_a = a_code(prog)
+            eval_b = b_code(prog)
+
+            if eval_a.is_int() and eval_b.is_int():
+                return PralineInt(eval_a.get_value()**eval_b.get_value())
+            elif eval_a.is_string() and eval_b.is_string():
+                return PralineString(eval_a.get_value() + eval_b.get_value())
+            else:
+                raise TypeError('Both operands should be integers or strings in "{}", but they are ({} : {}) and ({} : {}), respectively.'.format(node, eval_a, eval_a.typeof(), eval_b, eval_b.typeof()))
+
+        return exponent
+
+    def compile_PralineNeg(self, node):
+        a_code = self.compile(node.a)
+
+        def neg(prog):
+            temp = a_code(prog)
+
+            if not temp.is_int():
+                raise TypeError('operand should evaluate to an integer in "{}"'.format(temp, node))
+
+            return PralineInt(-temp.get_value())
+
+        return neg
+
+    def compile_PralineList(self, node):
+        if node.a is None and node.b is None:
+            def nil(prog):
+                return PralineList(None, None, is_value=True)
+            return nil
+
+        head_code = self.compile(node.a) if node.a is not None else None
+        tail_code = self.compile(node.b) if node.b is not None else None
+
+        def cons(prog):
+            new_a = head_code(prog) if head_code is not None else None
+            new_b = tail_code(prog) if tail_code is not None else None
+            return PralineList(new_a, new_b, is_value=True)
+
+        return cons
+
+    def compile_PralineTuple(self, node):
+        val_codes = [self.compile(v) for v in node.vals]
+
+        def tup(prog):
+            return PralineTuple([val_code(prog) for val_code in val_codes], is_value=True)
+
+        return tup
+
+    def compile_PralineIf(self, node):
+        cond_code = self.compile(node.cond)
+        e1_code = self.compile(node.e1)
+        e2_code = self.compile(node.e2)
+
+        def if_then_else(prog):
+            cond_eval = cond_code(prog)
+            if type(cond_eval) is PralineBool:
+                if cond_eval.val:
+                    return e1_code(prog)
+                else:
+                    return e2_code(prog)
+            else:
+                raise TypeError('cond should evaluate to a bool in "{}", got "{}"'.format(node, cond_eval))
+
+        return if_then_else
+
+    def compile_PralineDo(self, node):
+        term_codes = [self.compile(t) for t in node.terms]
+
+        def do(prog):
+            result = None
+            for term_code in term_codes:
+                result = term_code(prog)
+            return result
+
+        return do
+
+    def compile_PralineLambda(self, node):
+        params = node.params
+        body = node.body
+
+        def lam(prog):
+            return Closure(dict(prog.praline_envs[-1]), params, body)
+
+        return lam
+
+    def compile_PralineLet(self, node):
+        name = node.var_name
+        expr_code = self.compile(node.expr)
+        body_code = self.compile(node.body)
+
+        def let(prog):
+            val = expr_code(prog)
+            env = prog.praline_envs[-1]
+            env[name] = val
+            result = body_code(prog)
+            env.pop(name)
+            return result
+
+        return let
+
+    def compile_PralineLetPecan(self, node):
+        pecan_code = self.compile(node.pecan_term)
+        body_code = self.compile(node.body)
+
+        from pecan.lang.ir.prog import AutLiteral, VarRef
+        from pecan.lang.ir.arith import PredicateExpr
+
+        def let_pecan(prog):
+            result_node = pecan_code(prog).evaluate(prog).pecan_term
+
+            expr = PredicateExpr(VarRef(node.var_name), AutLiteral(result_node.evaluate(prog)))
+            prog.praline_local_define(node.var_name, PralinePecanTerm(expr).evaluate(prog))
+            result = body_code(prog)
+            prog.praline_local_cleanup([node.var_name])
+
+            return result
+
+        return let_pecan
+
+    def compile_PralineMatch(self, node):
+        t_code = self.compile(node.t)
+        arms = [(self.compile_pattern(arm.pat), self.compile(arm.expr)) for arm in node.arms]
+
+        def match(prog):
+            eval_t = t_code(prog)
+
+            for pat_match, expr_code in arms:
+                match_env = pat_match(eval_t, prog)
+
+                if match_env is not None:
+                    env = prog.praline_envs[-1]
+                    env.update(match_env)
+                    result = expr_code(prog)
+                    for name in match_env:
+                        env.pop(name)
+                    return result
+
+            raise Exception('Inexhaustive match arms in "{}" (got "{}")'.format(node, eval_t))
+
+        return match
+
+    # Patterns compile to functions that take the term to match, and return the variables it binds (or None)
+    def compile_pattern(self, pat):
+        if type(pat) is PralineMatchVar:
+            var = pat.var
+            def match_var(term, prog):
+                return {var: term}
+            return match_var
+
+        elif type(pat) is PralineMatchInt:
+            val = pat.val
+            def match_int(term, prog):
+                if term.is_int() and term.get_value() == val:
+                    return {}
+                else:
+                    return None
+            return match_int
+
+        elif type(pat) is PralineMatchString:
+            val = pat.val
+            def match_string(term, prog):
+                if term.is_string() and term.get_value() == val:
+                    return {}
+                else:
+                    return None
+            return match_string
+
+        elif type(pat) is PralineMatchList:
+            if pat.head is None:
+                def match_nil(term, prog):
+                    if type(term) is PralineList and term.a is None:
+                        return {}
+                    else:
+                        return None
+                return match_nil
+
+            head_match = self.compile_pattern(pat.head)
+            tail_match = self.compile_pattern(pat.tail)
+
+            def match_cons(term, prog):
+                if type(term) is not PralineList or term.a is None:
+                    return None
+
+                head_match_env = head_match(term.a, prog)
+                if head_match_env is None:
+                    return None
+
+                tail_match_env = tail_match(term.b, prog)
+                if tail_match_env is None:
+                    return None
+
+                head_match_env.update(tail_match_env)
+                return head_match_env
+
+            return match_cons
+
+        elif type(pat) is PralineMatchTuple:
+            val_matches = [self.compile_pattern(v) for v in pat.vals]
+
+            def match_tuple(term, prog):
+                if type(term) is not PralineTuple or len(val_matches) != len(term.vals):
+                    return None
+
+                match_env = {}
+                for val_match, t in zip(val_matches, term.vals):
+                    m = val_match(t, prog)
+                    if m is None:
+                        return None
+                    match_env.update(m)
+
+                return match_env
+
+            return match_tuple
+
+        else:
+            return pat.match
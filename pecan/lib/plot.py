@@ -1,3 +1,7 @@
+import multiprocessing
+import os
+import tempfile
+
 import buddy
 import spot
 
@@ -7,37 +11,331 @@ from pecan.automata.buchi import BuchiAutomaton
 
 from pecan.settings import settings
 
+# Dense bitmaps bigger than this are kept on disk (one byte per cell)
+MAX_IN_MEMORY_CELLS = 1 << 28
+
+# How many cells we write to a dense bitmap (or a file) at once
+TILE_CELLS = 1 << 20
+
+# Sets the given cells of array (e.g., a memmap) a tile's worth of cells at a time, so we never need a copy of all of
+# them at once. Cells are sorted, so each tile touches a small part of the array.
+def fill_tiled(array, cells):
+    for start in range(0, len(cells), TILE_CELLS):
+        array[tuple(cells[start:start + TILE_CELLS].T)] = True
+        if isinstance(array, np.memmap):
+            array.flush()
+
 # A multidimensional bitmap
+# The cells that are set are kept as a list of indices until someone needs the whole array, so that a bitmap for a
+# sparse plot (e.g., of a fractal at a deep layer) costs as much as the cells that are hit, not as its volume
 class Bitmap:
     # order of the dimension follows the same order as in C
     # e.g. Bitmap(2, 3) is roughly an "array": bool bitmap[2][3]
     def __init__(self, *dims):
         self.dims = dims
-        self.bitmap = 0 # use pylong as the bitmap
+        self.cells = []
+        self.dense = None
+
+    def volume(self):
+        volume = 1
+        for dim in self.dims:
+            volume *= dim
+        return volume
+
+    # The whole array, which is kept on disk (in a temporary file) if it's too big to comfortably keep in memory
+    @property
+    def bitmap(self):
+        if self.dense is None:
+            if self.volume() > MAX_IN_MEMORY_CELLS:
+                settings.log(0, lambda: '[DEBUG] Keeping a bitmap with {} cells on disk'.format(self.volume()))
+                dense = np.memmap(tempfile.TemporaryFile(), dtype=bool, mode='w+', shape=self.dims)
+            else:
+                dense = np.zeros(self.dims, dtype=bool)
+
+            fill_tiled(dense, self.hits())
+            self.dense = dense
+            self.cells = []
+        return self.dense
 
     def get_index(self, indices):
         if type(indices) is int:
             assert indices < self.dims[0]
             return indices
 
-        array_index = 0
-        base = 1
-        for dim, index in list(zip(self.dims, indices))[::-1]:
+        indices = tuple(indices)
+        for dim, index in zip(self.dims, indices):
             assert index < dim, "index out of range, index {} in {}".format(indices, self.dims)
-            array_index += base * index
-            base *= dim
 
-        return array_index
+        return indices
 
     def __getitem__(self, indices):
-        return self.bitmap & (1 << self.get_index(indices)) != 0
+        return bool(self.bitmap[self.get_index(indices)])
 
     def __setitem__(self, indices, value):
-        if bool(value):
-            self.bitmap |= 1 << self.get_index(indices)
+        if bool(value) and self.dense is None:
+            index = self.get_index(indices)
+            self.set_cells(np.array([ index if type(index) is tuple else (index,) ], dtype=np.int64))
         else:
-            self.bitmap &= ~(1 << self.get_index(indices))
+            self.bitmap[self.get_index(indices)] = bool(value)
+
+    # Sets all the cells whose indices are the rows of cells (an array of shape (number of cells, number of dimensions))
+    def set_cells(self, cells):
+        if self.dense is None:
+            self.cells.append(cells)
+        else:
+            self.dense[tuple(cells.T)] = True
+
+    # The indices of the cells that are set, in order, as an array of shape (number of cells, number of dimensions)
+    def hits(self):
+        if self.dense is not None:
+            return np.argwhere(self.dense)
+
+        if not self.cells:
+            return np.zeros((0, len(self.dims)), dtype=np.int64)
+
+        self.cells = [ np.unique(np.concatenate(self.cells), axis=0) ]
+        return self.cells[0]
+
+    def count(self):
+        return len(self.hits())
+
+    # Writes the bitmap as a .npy file, without holding the whole array in memory
+    def save_npy(self, path):
+        array = np.lib.format.open_memmap(path, mode='w+', dtype=bool, shape=self.dims)
+        fill_tiled(array, self.hits())
+        del array
+
+    # Writes the indices of the cells that are set, one cell per line
+    def save_cells(self, f, prefix=()):
+        hits = self.hits()
+        for start in range(0, len(hits), TILE_CELLS):
+            chunk = hits[start:start + TILE_CELLS]
+            if prefix:
+                chunk = np.hstack([ np.tile(np.array(prefix, dtype=np.int64), (len(chunk), 1)), chunk ])
+            np.savetxt(f, chunk, fmt='%d')
+
+    # Yields (tile origin, tile), where each tile is a bool array of shape at most tile_size along each dimension,
+    # holding the cells of the bitmap from origin on. Only tiles with at least one cell set are yielded.
+    def tiles(self, tile_size):
+        hits = self.hits()
+        if len(hits) == 0:
+            return
+
+        tile_indices = hits // tile_size
+        order = np.lexsort(tile_indices.T[::-1])
+        hits, tile_indices = hits[order], tile_indices[order]
+
+        boundaries = np.flatnonzero(np.any(np.diff(tile_indices, axis=0) != 0, axis=1)) + 1
+        for chunk in np.split(np.arange(len(hits)), boundaries):
+            origin = tile_indices[chunk[0]] * tile_size
+            shape = tuple(min(tile_size, dim - o) for dim, o in zip(self.dims, origin))
+
+            tile = np.zeros(shape, dtype=bool)
+            tile[tuple((hits[chunk] - origin).T)] = True
+            yield tuple(int(o) for o in origin), tile
+
+# The states of aut from which some word is accepted, as a list of bools indexed by state number
+def live_states(aut):
+    si = spot.scc_info(aut)
+    si.determine_unknown_acceptance()
+
+    # SCCs are numbered in reverse topological order, so every successor of an SCC comes before it
+    live_sccs = []
+    for scc in range(si.scc_count()):
+        live_sccs.append(si.is_accepting_scc(scc) or any(live_sccs[succ] for succ in si.succ(scc)))
+
+    return [ si.reachable_state(s) and live_sccs[si.scc_of(s)] for s in range(aut.num_states()) ]
+
+"""
+Finds the cells hit by a Buchi automaton layer by layer, instead of checking every prefix separately.
+
+A cell at layer n corresponds to a prefix of n letters, and is hit if some word accepted by the automaton starts with
+that prefix, i.e., if reading the prefix can take us to a live state (one from which some word is accepted).
+So we keep, for every cell hit at the current layer, the set of live states its prefix can take us to; the cells of
+the next layer are its children, one per letter, and we get their sets by following the transitions on that letter.
+Cells whose set is empty are dropped, along with all the cells below them.
+
+State sets are bitmasks of states, and are numbered as we discover them, so that the transitions between sets can be
+kept in a NumPy array (set number x letter -> set number, where 0 is the empty set), and each layer is computed by
+indexing into that array for all the cells at once.
+"""
+class LayerSweep:
+    # letters is a list of BDDs, one per letter, and components[letter] is the index of the letter along each dimension
+    def __init__(self, aut, letters, components, alphabet_sizes):
+        self.aut = aut
+        self.letters = letters
+        self.components = np.array(components, dtype=np.int64).reshape(len(letters), len(alphabet_sizes))
+        self.alphabet_sizes = np.array(alphabet_sizes, dtype=np.int64)
+
+        self.live = live_states(aut)
+        self.successors = self.build_successors()
+
+        self.set_numbers = { 0: 0 }
+        self.sets = [0]
+        self.transitions = []
+
+    # successors[s][letter] is the set of live states we can go to from s on letter
+    def build_successors(self):
+        successors = []
+
+        for s in range(self.aut.num_states()):
+            succs = [0] * len(self.letters)
+
+            if self.live[s]:
+                for e in self.aut.out(s):
+                    if not self.live[e.dst]:
+                        continue
+
+                    for letter, letter_bdd in enumerate(self.letters):
+                        if e.cond & letter_bdd != buddy.bddfalse:
+                            succs[letter] |= 1 << e.dst
+
+            successors.append(succs)
+
+        return successors
+
+    def set_number(self, state_set):
+        if state_set not in self.set_numbers:
+            self.set_numbers[state_set] = len(self.sets)
+            self.sets.append(state_set)
+        return self.set_numbers[state_set]
+
+    def states_of(self, state_set):
+        s = 0
+        while state_set:
+            if state_set & 1:
+                yield s
+            state_set >>= 1
+            s += 1
+
+    # Makes sure we know the transitions of every set up to (and including) the set numbered max_set_number
+    def transition_table(self, max_set_number):
+        while len(self.transitions) <= max_set_number:
+            states = list(self.states_of(self.sets[len(self.transitions)]))
+
+            row = []
+            for letter in range(len(self.letters)):
+                next_set = 0
+                for s in states:
+                    next_set |= self.successors[s][letter]
+                row.append(self.set_number(next_set))
+
+            self.transitions.append(row)
+
+        return np.array(self.transitions, dtype=np.int64).reshape(len(self.transitions), len(self.letters))
+
+    # The cells hit at layer 0 (just the single cell), as a pair (cells, set numbers)
+    def initial_layer(self):
+        init = self.aut.get_init_state_number()
+        dim = len(self.alphabet_sizes)
+
+        if not self.live[init]:
+            return np.zeros((0, dim), dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        return np.zeros((1, dim), dtype=np.int64), np.array([ self.set_number(1 << init) ], dtype=np.int64)
+
+    def next_layer(self, cells, set_numbers):
+        if len(set_numbers) == 0:
+            return cells, set_numbers
+
+        table = self.transition_table(int(set_numbers.max()))[set_numbers]
+        parents, letters = np.nonzero(table)
+
+        return cells[parents] * self.alphabet_sizes + self.components[letters], table[parents, letters]
+
+    # The sets (as bitmasks of states) with the given numbers, which mean nothing to other LayerSweeps
+    def state_sets(self, set_numbers):
+        return [ self.sets[n] for n in set_numbers ]
+
+    def set_numbers_of(self, state_sets):
+        return np.array([ self.set_number(state_set) for state_set in state_sets ], dtype=np.int64)
 
+    # Yields (layer, cells, set numbers) for every layer up to max_layer, starting from start = (layer, cells, set numbers)
+    # if given, and from layer 0 otherwise
+    def layers(self, max_layer, start=None):
+        if start is None:
+            start = (0,) + self.initial_layer()
+
+        start_layer, cells, set_numbers = start
+        yield start_layer, cells, set_numbers
+
+        for layer in range(start_layer + 1, max_layer + 1):
+            cells, set_numbers = self.next_layer(cells, set_numbers)
+            settings.log(0, lambda: '[DEBUG] Layer {}: {} cells hit, {} state sets seen'.format(layer, len(cells), len(self.sets)))
+            yield layer, cells, set_numbers
+
+# Translates letters (one number per dimension) into BDDs over the APs of a Buchi automaton
+class LetterEncoder:
+    def __init__(self, buchi_aut, dimensions, alphabet_sizes):
+        self.dimensions = dimensions
+        self.alphabet_sizes = alphabet_sizes
+
+        self.translation_cache = {}
+
+        self.bdds = {}
+        for var, aps in buchi_aut.var_map.items():
+            self.bdds[var] = [ buddy.bdd_ithvar(buchi_aut.aut.register_ap(ap)) for ap in aps ]
+
+    # The BDD of a letter given as a dictionary, e.g. { "a": 1, "b": 0 }
+    def letter_bdd(self, dict_letter):
+        assignment_bdd = buddy.bddtrue
+        for var, letter in dict_letter.items():
+            if (var,letter) not in self.translation_cache:
+                m = len(self.bdds[var])
+                sym = buddy.bddtrue
+                for i, bdd in enumerate(self.bdds[var]):
+                    # test if the ith bit is 1
+                    if letter & (1 << (m - i - 1)):
+                        sym &= bdd
+                    else:
+                        sym &= buddy.bdd_not(bdd)
+                self.translation_cache[(var,letter)] = sym
+            assignment_bdd &= self.translation_cache[(var,letter)]
+        return assignment_bdd
+
+    def radix(self):
+        radix = 1
+        for var in self.dimensions:
+            radix *= self.alphabet_sizes[var]
+        return radix
+
+    # Splits a letter (a number less than the product of the alphabet sizes) into one component per dimension,
+    # with the first dimension as the least significant "digit"
+    def split_letter(self, letter):
+        splitted_letter = {}
+        prev_radix = 1
+
+        for dim in self.dimensions:
+            k = self.alphabet_sizes[dim]
+            splitted_letter[dim] = letter // prev_radix % k
+            prev_radix *= k
+
+        return splitted_letter
+
+    def make_layer_sweep(self, buchi_aut):
+        letters = [ self.split_letter(letter) for letter in range(self.radix()) ]
+
+        return LayerSweep(buchi_aut.aut,
+                          [ self.letter_bdd(letter) for letter in letters ],
+                          [ [ letter[dim] for dim in self.dimensions ] for letter in letters ],
+                          [ self.alphabet_sizes[dim] for dim in self.dimensions ])
+
+# Each worker of the pool used by BuchiPlotter gets its own copy of the automaton (sent as HOA, see
+# BuchiAutomaton.__getstate__), and its own LayerSweep, which it uses for every part of the plot it is given
+worker_sweep = None
+
+def init_worker(buchi_aut, dimensions, alphabet_sizes):
+    global worker_sweep
+    worker_sweep = LetterEncoder(buchi_aut, dimensions, alphabet_sizes).make_layer_sweep(buchi_aut)
+
+# Sweeps the cells below the given cells (with their state sets, as bitmasks) at start_layer, and returns the cells hit
+# at each of the given layers
+def sweep_part(part):
+    start_layer, cells, state_sets, layers = part
+
+    start = (start_layer, cells, worker_sweep.set_numbers_of(state_sets))
+
+    return { layer: layer_cells for layer, layer_cells, _ in worker_sweep.layers(max(layers), start=start) if layer in layers }
 
 class PlotMethod:
     def plot_layer(self, k, layer, cell_bitmap, labels):
@@ -77,13 +375,13 @@ class Matplotlib1DPlotMethod(MatplotlibPlotMethod):
         base = alphabet_sizes[0] ** layer
         length = 1 / base
 
-        for x in range(base):
-            if cell_bitmap[x]:
-                self.pt.plot(
-                    [ x * length, x * length + length ],
-                    [ layer, layer ],
-                    color=self.color,
-                )
+        xs = cell_bitmap.hits()[:, 0]
+        self.pt.hlines(
+            [ layer ] * len(xs),
+            xs * length,
+            xs * length + length,
+            color=self.color,
+        )
 
         assert len(labels) == 1
         self.pt.xlabel(labels[0])
@@ -98,22 +396,15 @@ class Matplotlib2DPlotMethod(MatplotlibPlotMethod):
         assert len(alphabet_sizes) == 2
         k1, k2 = alphabet_sizes
 
-        # total number of cells
-        total = k1 ** layer * k2 ** layer
+        from matplotlib.collections import PolyCollection
 
-        for x in range(k1 ** layer):
-            for y in range(k2 ** layer):
-                if settings.get_show_progress():
-                    print("\r\033[2Kdrawing {}/{} squares".format(x * k2 ** layer + y + 1, total), end="")
-
-                if cell_bitmap[x, y]:
-                    self.pt.fill(
-                        [ x, x + 1, x + 1, x ],
-                        [ y, y, y + 1, y + 1 ],
-                        self.color,
-                    )
-        if settings.get_show_progress():
-            print("")
+        # only the cells that are hit get drawn, all at once as unit squares
+        hits = cell_bitmap.hits()
+        squares = hits[:, np.newaxis, :] + np.array([ [0, 0], [1, 0], [1, 1], [0, 1] ])
+
+        ax = self.pt.gca()
+        ax.add_collection(PolyCollection(squares, facecolors=self.color, edgecolors=self.color))
+        ax.autoscale_view()
 
         assert len(labels) == 2
         self.pt.xlabel(labels[0])
@@ -128,32 +419,25 @@ class Matplotlib3DPlotMethod(MatplotlibPlotMethod):
         assert len(alphabet_sizes) == 3
         k1, k2, k3 = alphabet_sizes
 
-        voxels = np.zeros((k1 ** layer, k2 ** layer, k3 ** layer), dtype=np.uint8)
-
-        settings.log(lambda: "Preparing voxel map...")
+        # Matplotlib draws each voxel separately (and copies the whole array), so this is only for small plots
+        if cell_bitmap.volume() > MAX_IN_MEMORY_CELLS:
+            raise Exception('Cannot draw {} voxels in 3D; use the "npy" or "cells" plot methods to export large plots instead'.format(cell_bitmap.volume()))
 
-        for x in range(k1 ** layer):
-            for y in range(k2 ** layer):
-                for z in range(k3 ** layer):
-                    if cell_bitmap[x, y, z]:
-                        voxels[x, y, z] = 1
+        voxels = cell_bitmap.bitmap
 
         if color_by_axis is not None:
             settings.log(lambda: "Preparing color map...")
-            colors = np.empty(np.shape(voxels), dtype=object)
             cmap = self.pt.get_cmap("jet")
 
             axis_index = labels.index(color_by_axis)
 
-            for x in range(k1 ** layer):
-                for y in range(k2 ** layer):
-                    for z in range(k3 ** layer):
-                        if axis_index == 0:
-                            colors[x, y, z] = cmap(x / k1 ** layer)
-                        elif axis_index == 1:
-                            colors[x, y, z] = cmap(y / k2 ** layer)
-                        elif axis_index == 2:
-                            colors[x, y, z] = cmap(z / k3 ** layer)
+            # color each voxel by its (normalized) coordinate along the axis: we only need one color per coordinate,
+            # and broadcasting them to the shape of the plot doesn't copy them
+            axis_size = np.shape(voxels)[axis_index]
+            color_shape = [1, 1, 1, 4]
+            color_shape[axis_index] = axis_size
+            axis_colors = cmap(np.arange(axis_size) / axis_size).reshape(color_shape)
+            colors = np.broadcast_to(axis_colors, np.shape(voxels) + (4,))
 
         settings.log(lambda: "Drawing voxels...")
 
@@ -175,13 +459,112 @@ class Matplotlib3DPlotMethod(MatplotlibPlotMethod):
         ax.zaxis.set_ticklabels([])
 
 
+"""
+Plot methods that write the hit cells to files as they go, rather than drawing them, so that large plots never need
+the whole volume or a matplotlib figure in memory. The files are written when the plot is saved; when several layers
+are plotted, each layer gets its own file(s), named after the path to save to and the layer.
+"""
+class ExportPlotMethod(PlotMethod):
+    def __init__(self):
+        self.layers = []
+
+    def plot_layer(self, alphabet_sizes, layer, cell_bitmap, labels, **kwargs):
+        self.layers.append((layer, cell_bitmap, labels))
+
+    def show(self):
+        settings.log(0, lambda: '[WARN] Nothing to show for a plot that is only exported to files')
+
+    def layer_path(self, path, layer, suffix=''):
+        if len(self.layers) == 1 and not suffix:
+            return path
+        root, ext = os.path.splitext(path)
+        return '{}-layer{}{}{}'.format(root, layer, suffix, ext)
+
+    # Should write the given layer, and return the paths of the files written
+    def save_layer(self, path, layer, cell_bitmap, labels):
+        raise NotImplementedError()
+
+    # Returns the paths of all the files written
+    def save(self, path):
+        paths = []
+        for layer, cell_bitmap, labels in self.layers:
+            paths.extend(self.save_layer(path, layer, cell_bitmap, labels))
+        return paths
+
+    def cleanup(self):
+        self.layers = []
+
+"""
+Writes the hit cells as text, one cell per line: the layer, followed by the index of the cell along each dimension
+"""
+class CellsExportMethod(ExportPlotMethod):
+    def save(self, path):
+        with open(path, 'w') as f:
+            for layer, cell_bitmap, labels in self.layers:
+                f.write('# layer {}\n'.format(' '.join(labels)))
+                cell_bitmap.save_cells(f, prefix=(layer,))
+        return [path]
+
+"""
+Writes each layer as a (dense) .npy file of bools, filled in on disk
+"""
+class NpyExportMethod(ExportPlotMethod):
+    def save_layer(self, path, layer, cell_bitmap, labels):
+        path = self.layer_path(path, layer)
+        cell_bitmap.save_npy(path)
+        return [path]
+
+"""
+Writes each layer of a 2D plot as PNG tiles of at most TILE_SIZE x TILE_SIZE pixels, one pixel per cell, with x going
+right and y going up. Tiles without any hit cells aren't written. The tile whose lower left corner is cell (x, y) is
+saved as <path>-layer<n>-<x>-<y>.png
+"""
+class PngTilesExportMethod(ExportPlotMethod):
+    TILE_SIZE = 4096
+
+    def __init__(self, color="blue"):
+        super().__init__()
+        self.color = color
+
+    def save_layer(self, path, layer, cell_bitmap, labels):
+        import matplotlib.image
+        from matplotlib.colors import ListedColormap
+
+        cmap = ListedColormap(["white", self.color])
+
+        paths = []
+        for (x, y), tile in cell_bitmap.tiles(PngTilesExportMethod.TILE_SIZE):
+            tile_path = self.layer_path(path, layer, '-{}-{}'.format(x, y))
+            # Images go row by row from the top, so y has to be flipped
+            matplotlib.image.imsave(tile_path, tile.T[::-1].astype(np.uint8), cmap=cmap, vmin=0, vmax=1)
+            paths.append(tile_path)
+
+        return paths
+
 class BuchiPlotter:
+    # When plotting in parallel, how many parts to split the cells into for each worker, so that one worker getting
+    # the densest part of the plot doesn't hold everyone else up
+    PARTS_PER_WORKER = 4
+
     PLOT_METHOD_MAP = {
         "matplotlib": {
             1: Matplotlib1DPlotMethod,
             2: Matplotlib2DPlotMethod,
             3: Matplotlib3DPlotMethod,
         },
+        "cells": {
+            1: CellsExportMethod,
+            2: CellsExportMethod,
+            3: CellsExportMethod,
+        },
+        "npy": {
+            1: NpyExportMethod,
+            2: NpyExportMethod,
+            3: NpyExportMethod,
+        },
+        "png_tiles": {
+            2: PngTilesExportMethod,
+        },
     }
 
     def __init__(
@@ -196,6 +579,7 @@ class BuchiPlotter:
         show=False,
         plot_method="matplotlib",
         color_by_axis=None,
+        workers=None,
     ):
         super().__init__()
         self.prog = prog
@@ -208,11 +592,6 @@ class BuchiPlotter:
         self.color_by_axis = color_by_axis # only available for 3d
         self.show = show
 
-        self.translation_cache = {}
-
-        self.bdds = {}
-        for var, aps in buchi_aut.var_map.items():
-            self.bdds[var] = [ buddy.bdd_ithvar(buchi_aut.aut.register_ap(ap)) for ap in aps ]
         self.prefix_word = spot.twa_word(buchi_aut.aut.get_dict())
         self.prefix_word.cycle.append(buddy.bddtrue)
 
@@ -222,6 +601,14 @@ class BuchiPlotter:
         # fix an arbitrary order of the arguments
         self.dimensions = list(self.alphabet_sizes.keys())
 
+        self.encoder = LetterEncoder(buchi_aut, self.dimensions, self.alphabet_sizes)
+
+        # By default, use as many processes as we may use for checking theorems (see --jobs)
+        from pecan.tools import parallel
+        if workers is None:
+            workers = 1 if parallel.in_job else settings.get_jobs()
+        self.workers = workers
+
         if plot_method not in BuchiPlotter.PLOT_METHOD_MAP:
             raise Exception("unsupported plot method {}".format(plot_method))
 
@@ -241,20 +628,7 @@ class BuchiPlotter:
     def accept_prefix(self, prefix, n=3):
         self.prefix_word.prefix.clear()
         for dict_letter in prefix:
-            assignment_bdd = buddy.bddtrue
-            for var, letter in dict_letter.items():
-                if (var,letter) not in self.translation_cache:
-                    m = len(self.bdds[var])
-                    sym = buddy.bddtrue
-                    for i, bdd in enumerate(self.bdds[var]):
-                        # test if the ith bit is 1
-                        if letter & (1 << (m - i - 1)):
-                            sym &= bdd
-                        else:
-                            sym &= buddy.bdd_not(bdd)
-                    self.translation_cache[(var,letter)] = sym
-                assignment_bdd &= self.translation_cache[(var,letter)]
-            self.prefix_word.prefix.append(assignment_bdd)
+            self.prefix_word.prefix.append(self.encoder.letter_bdd(dict_letter))
 
         prefix_aut = self.prefix_word.as_automaton()
         accepts = self.buchi_aut.aut.intersects(prefix_aut)
@@ -267,43 +641,72 @@ class BuchiPlotter:
         return s
 
     """
-    Return a bitmap (integer) which can be bitwisely interpreted
-    as a voxel map of dimension (<k> ** <layer>) x (<k> ** <layer>) x ... x (<k> ** <layer>)
-                                |______________________<dim> mults_________________________|
-    where k is the maximum alphabet size, dim is the number of variables in the buchi automata var_map
+    Return a bitmap for each of the given layers (as a dictionary from layer to bitmap), where the bitmap for layer n
+    is a voxel map of dimension (<k1> ** <n>) x (<k2> ** <n>) x ... x (<kd> ** <n>),
+    where k1, ..., kd are the alphabet sizes of the variables in the buchi automata var_map
 
     In the bitmap, each true bit means the corresponding cell contains an omega word that
     is accepted by <buchi_aut>
     """
+    def get_hit_cell_bitmaps(self, buchi_aut, layers):
+        layers = set(layers)
+        bitmaps = { layer: Bitmap(*[ self.alphabet_sizes[dim] ** layer for dim in self.dimensions ]) for layer in layers }
+
+        def record(layer, cells):
+            bitmaps[layer].set_cells(cells)
+
+        # Every layer comes out of the same sweep, each one refining the cells hit at the layer before it
+        sweep = self.encoder.make_layer_sweep(buchi_aut)
+        for layer, cells, set_numbers in sweep.layers(max(layers)):
+            if settings.get_show_progress():
+                print("\r\033[2Kplotting layer {}: {} cells hit".format(layer, len(cells)), end="")
+
+            if layer in layers:
+                record(layer, cells)
+
+            # Once there are enough cells to keep every worker busy, split the rest of the sweep between them
+            if self.workers > 1 and layer < max(layers) and len(cells) >= self.workers * BuchiPlotter.PARTS_PER_WORKER:
+                self.sweep_in_parallel(buchi_aut, layer, cells, sweep.state_sets(set_numbers),
+                                       [ l for l in layers if l > layer ], record)
+                break
+
+        # newline
+        if settings.get_show_progress():
+            print("")
+
+        return bitmaps
+
+    def sweep_in_parallel(self, buchi_aut, start_layer, cells, state_sets, layers, record):
+        parts = []
+        for idxs in np.array_split(np.arange(len(cells)), self.workers * BuchiPlotter.PARTS_PER_WORKER):
+            parts.append((start_layer, cells[idxs], [ state_sets[i] for i in idxs ], layers))
+
+        context = multiprocessing.get_context()
+        with context.Pool(self.workers, initializer=init_worker, initargs=(buchi_aut, self.dimensions, self.alphabet_sizes)) as pool:
+            for i, part_cells in enumerate(pool.imap_unordered(sweep_part, parts)):
+                if settings.get_show_progress():
+                    print("\r\033[2Kplotting layers {}-{}: {}/{} parts done".format(start_layer + 1, max(layers), i + 1, len(parts)), end="")
+
+                # the parts are disjoint subtrees, so we just OR their cells together
+                for layer, layer_cells in part_cells.items():
+                    record(layer, layer_cells)
+
     def get_hit_cell_bitmap(self, buchi_aut, layer):
+        return self.get_hit_cell_bitmaps(buchi_aut, [layer])[layer]
+
+    # The same as get_hit_cell_bitmap, but testing every prefix separately (much slower; see benchmarks/plot.py)
+    def get_hit_cell_bitmap_by_prefixes(self, buchi_aut, layer):
         # sample using the highest largest alphabet size first
-        radix = 1
-        for var in self.dimensions:
-            radix *= self.alphabet_sizes[var]
+        radix = self.encoder.radix()
 
         hit_bitmap = Bitmap(*[ self.alphabet_sizes[dim] ** layer for dim in self.dimensions ])
 
-        # TODO: parallelize this. If we do parallelize this, remove the translation cache probably
         for n in range(radix ** layer):
             if settings.get_show_progress():
                 print("\r\033[2Kplotting layer {}: {}/{} prefixes tested".format(layer, n + 1, radix ** layer), end="")
 
-            word = BuchiPlotter.encode_word(n, layer, radix)
-            splitted_word = []
-
             # split each letter into separate components
-            # reject the word directly if any of the letters exceeds any of the alphabet sizes
-            for letter in word:
-                splitted_letter = {}
-                prev_radix = 1
-
-                for i, dim in enumerate(self.dimensions):
-                    k = self.alphabet_sizes[dim]
-                    component = letter // prev_radix % k
-                    splitted_letter[dim] = component
-                    prev_radix *= k
-
-                splitted_word.append(splitted_letter)
+            splitted_word = [ self.encoder.split_letter(letter) for letter in BuchiPlotter.encode_word(n, layer, radix) ]
 
             if self.accept_prefix(splitted_word):
                 # each word component corresponds to one (sub)index in the bitmap
@@ -336,12 +739,14 @@ class BuchiPlotter:
 
         # layers is a list of tuple [(layer_num, bitmap), (layer_num, bitmap), ...]
         # that records the cell bitmap at each layer
-        layers = []
         if dim == 1 and (self.layer_from is not None and self.layer_to is not None):
-            for layer in range(self.layer_from, self.layer_to + 1):
-                layers.append((layer, self.get_hit_cell_bitmap(self.buchi_aut, layer)))
+            layer_nums = list(range(self.layer_from, self.layer_to + 1))
         else:
-            layers = [(self.layer, self.get_hit_cell_bitmap(self.buchi_aut, self.layer))]
+            layer_nums = [self.layer]
+
+        # all the layers come out of the same sweep
+        bitmaps = self.get_hit_cell_bitmaps(self.buchi_aut, layer_nums)
+        layers = [ (layer, bitmaps[layer]) for layer in layer_nums ]
 
         # plot all layers in the specified method
         for layer, cell_bitmap in layers:
@@ -353,8 +758,9 @@ class BuchiPlotter:
 
         if self.save_to:
             settings.log(lambda: '[INFO] Saving plot to {}'.format(self.save_to))
-            self.plot_method.save(self.save_to)
-            self.prog.add_generated_file(self.save_to)
+            # Exported plots may be written to several files
+            for path in self.plot_method.save(self.save_to) or [self.save_to]:
+                self.prog.add_generated_file(path)
 
         if self.show:
             self.plot_method.show()
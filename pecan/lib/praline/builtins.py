@@ -69,12 +69,7 @@ class TruthValue(Builtin):
 
     def evaluate(self, prog):
         pecan_node = prog.praline_lookup('t').evaluate(prog).get_term()
-        res = pecan_node.evaluate(prog)
-        if isinstance(res, tuple):
-            tval = res[0].truth_value()
-        else:
-            tval = res.truth_value()
-        return PralineString(tval)
+        return PralineString(pecan_node.truth_value(prog))
 
 class ToString(Builtin):
     def __init__(self):
@@ -227,7 +222,7 @@ class AutToStr(Builtin):
         aut = prog.praline_lookup('aut').evaluate(prog)
         if type(aut) is PralinePecanLiteral:
             term = aut.get_term()
-            if type(term) is AutLiteral:
+            if isinstance(term, AutLiteral):
                 return PralineString(term.aut.to_str())
             else:
                 raise Exception('Expected an AutLiteral but got {}'.format(term))
@@ -314,8 +309,25 @@ class SetSettings(Builtin):
             'quiet': settings.set_quiet,
             'opt_level': settings.set_opt_level,
             'heuristics': settings.set_use_heuristics,
+            'simplification_policy': settings.set_simplification_policy,
+            'simplification_budget': settings.set_simplification_budget,
+            'timeout': settings.set_timeout,
+            'max_states': settings.set_max_states,
+            'max_edges': settings.set_max_edges,
+            'linear_constraints': settings.set_linear_constraints,
+            'miniscoping': settings.set_miniscoping,
+            'constants_cache_size': settings.set_constants_cache_size,
+            'subformula_memo_size': settings.set_subformula_memo_size,
+            'jobs': settings.set_jobs,
+            'parse_cache': settings.set_parse_cache,
+            'module_cache': settings.set_module_cache,
+            'praline_compiler': settings.set_praline_compiler,
             'load_stdlib': settings.set_load_stdlib,
             'output_hoa': settings.set_output_hoa,
+            'use_cache': settings.set_use_cache,
+            'cache_all': settings.set_cache_all,
+            'cache_dir': settings.set_cache_dir,
+            'cache_max_size': settings.set_cache_max_size,
         }
 
         if name in settings_dict:
@@ -8,6 +8,7 @@ from pecan.lang.type_inference import TypeInferer
 from pecan.lang.ast_to_ir import ASTToIR
 from pecan.lang.typed_ir_lowering import TypedIRLowering
 from pecan.lang.optimizer.optimizer import UntypedOptimizer, Optimizer
+from pecan.tools import parse_cache
 
 from pecan.settings import settings
 
@@ -33,7 +34,7 @@ def load(pecan_file, *args, **kwargs):
         return from_source(f.read(), *args, **kwargs)
 
 def from_source(source_code, *args, **kwargs):
-    prog = pecan_parser.parse(source_code)
+    prog = parse_cache.parse(pecan_parser, source_code)
 
     settings.log(4, lambda: 'Parsed program:')
     settings.log(4, lambda: prog)
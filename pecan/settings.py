@@ -18,14 +18,36 @@ class Settings:
         self.history_file = 'pecan_history'
         self.simplification_level = 1
         self.should_use_heuristics = False
+        self.simplification_policy = 'default'
+        self.simplification_budget = None
+        self.timeout = None
+        self.max_states = None
+        self.max_edges = None
         self.only_min_opt = False
         self.extract_implications = False
         self.write_statistics = False
         self.output_hoa = None
         self.output_json = False
         self.show_progress = True
+        self.canonical_aps = True
+        self.weak_automata = True
+        self.linear_constraints = True
+        self.miniscoping = True
+        self.cache_enabled = True
+        self.should_cache_all = False
+        self.cache_dir = '.pecan_cache'
+        self.cache_max_size = 1024 * 1024 * 1024
+        self.constants_cache_size = 1000
+        self.subformula_memo_size = 1000
+        self.jobs = 1
+        self.stdlib_snapshot = True
+        self.parse_cache = True
+        self.module_cache = True
+        self.praline_compiler = True
 
         self.output = ''
+        self.stats = {}
+        self.max_stat_names = set()
 
         self.stdlib_prog = None
 
@@ -60,6 +82,147 @@ class Settings:
         self.write_statistics = write_statistics
         return self
 
+    def record_stat(self, name, amount=1):
+        self.stats[name] = self.stats.get(name, 0) + amount
+        return self
+
+    def record_max_stat(self, name, value):
+        self.max_stat_names.add(name)
+        self.stats[name] = max(self.stats.get(name, value), value)
+        return self
+
+    def get_max_stat_names(self):
+        return self.max_stat_names
+
+    # Adds in stats recorded somewhere else (e.g., in a parallel job)
+    def merge_stats(self, stats, max_stat_names):
+        for name, value in stats.items():
+            if name in max_stat_names:
+                self.record_max_stat(name, value)
+            else:
+                self.record_stat(name, value)
+        return self
+
+    def get_stats(self):
+        return self.stats
+
+    def reset_stats(self):
+        self.stats = {}
+        return self
+
+    def set_canonical_aps(self, canonical_aps):
+        self.canonical_aps = canonical_aps
+        return self
+
+    def use_canonical_aps(self):
+        return self.canonical_aps
+
+    def set_weak_automata(self, weak_automata):
+        self.weak_automata = weak_automata
+        return self
+
+    def use_weak_automata(self):
+        return self.weak_automata
+
+    def set_linear_constraints(self, linear_constraints):
+        self.linear_constraints = linear_constraints
+        return self
+
+    def use_linear_constraints(self):
+        return self.linear_constraints
+
+    def set_miniscoping(self, miniscoping):
+        self.miniscoping = miniscoping
+        return self
+
+    def use_miniscoping(self):
+        return self.miniscoping
+
+    def set_use_cache(self, use_cache):
+        self.cache_enabled = use_cache
+        return self
+
+    def use_cache(self):
+        return self.cache_enabled
+
+    def set_cache_all(self, cache_all):
+        self.should_cache_all = cache_all
+        return self
+
+    def cache_all(self):
+        return self.should_cache_all
+
+    def get_cache_dir(self):
+        return Path.home() / self.cache_dir
+
+    def set_cache_dir(self, cache_dir):
+        self.cache_dir = cache_dir
+        return self
+
+    def get_cache_max_size(self):
+        return self.cache_max_size
+
+    def set_cache_max_size(self, max_size):
+        self.cache_max_size = max_size
+        return self
+
+    # The number of constant automata (see IntConst) each program keeps around
+    def get_constants_cache_size(self):
+        return self.constants_cache_size
+
+    def set_constants_cache_size(self, size):
+        self.constants_cache_size = size
+        return self
+
+    # The number of automata for quantified formulas each program keeps around to reuse for alpha-equivalent formulas
+    # (see Exists.memo_key); 0 turns this off
+    def get_subformula_memo_size(self):
+        return self.subformula_memo_size
+
+    def set_subformula_memo_size(self, size):
+        self.subformula_memo_size = size
+        return self
+
+    # How many processes to use to check theorems in parallel (see pecan.tools.parallel)
+    def get_jobs(self):
+        return self.jobs
+
+    def set_jobs(self, jobs):
+        self.jobs = jobs
+        return self
+
+    # Whether to keep a snapshot of the evaluated standard library in the cache directory (see pecan.tools.stdlib_snapshot)
+    def use_stdlib_snapshot(self):
+        return self.stdlib_snapshot
+
+    def set_stdlib_snapshot(self, stdlib_snapshot):
+        self.stdlib_snapshot = stdlib_snapshot
+        return self
+
+    # Whether to keep the parsed AST of each file in the cache directory (see pecan.tools.parse_cache)
+    def use_parse_cache(self):
+        return self.parse_cache
+
+    def set_parse_cache(self, parse_cache):
+        self.parse_cache = parse_cache
+        return self
+
+    # Whether to evaluate each imported file only once per program (see pecan.tools.module_registry)
+    def use_module_cache(self):
+        return self.module_cache
+
+    def set_module_cache(self, module_cache):
+        self.module_cache = module_cache
+        return self
+
+    # Whether to compile the bodies of Praline functions before running them (see pecan.lang.praline_compiler)
+    def use_praline_compiler(self):
+        return self.praline_compiler
+
+    def set_praline_compiler(self, praline_compiler):
+        self.praline_compiler = praline_compiler
+        return self
+
     def get_extract_implications(self):
         return self.extract_implications
 
@@ -81,6 +244,44 @@ class Settings:
         self.simplification_level = new_level
         return self
 
+    def get_simplification_policy(self):
+        return self.simplification_policy
+
+    def set_simplification_policy(self, policy_name):
+        self.simplification_policy = policy_name
+        return self
+
+    # The total number of seconds that simplification policies should try to spend on postprocessing, or None for no limit
+    def get_simplification_budget(self):
+        return self.simplification_budget
+
+    def set_simplification_budget(self, budget):
+        self.simplification_budget = budget
+        return self
+
+    # The number of seconds each top-level definition (e.g., each theorem) may take, or None for no limit
+    def get_timeout(self):
+        return self.timeout
+
+    def set_timeout(self, timeout):
+        self.timeout = timeout
+        return self
+
+    # The largest automaton any single operation may produce, or None for no limit
+    def get_max_states(self):
+        return self.max_states
+
+    def set_max_states(self, max_states):
+        self.max_states = max_states
+        return self
+
+    def get_max_edges(self):
+        return self.max_edges
+
+    def set_max_edges(self, max_edges):
+        self.max_edges = max_edges
+        return self
+
     def get_history_file(self):
         return Path.home() / self.history_file
 
@@ -160,8 +361,8 @@ class Settings:
                 self.set_debug_level(orig_debug_level - 1)
 
                 if self.stdlib_prog is None:
-                    self.stdlib_prog = loader(prog.locate_file('std.pn'), *args, **kwargs)
-                    self.stdlib_prog.evaluate()
+                    from pecan.tools.stdlib_snapshot import load_stdlib
+                    self.stdlib_prog = load_stdlib(prog.locate_file('std.pn'), loader, args, kwargs)
 
                 prog.include(self.stdlib_prog)
             finally:
@@ -6,6 +6,7 @@ import ast
 import spot
 
 from pecan.automata.buchi import BuchiAutomaton
+from pecan.automata.weak import as_weak
 from pecan.utility import VarMap
 
 def from_spot_aut(base_aut):
@@ -15,23 +16,27 @@ def from_spot_aut(base_aut):
     for ap in base_aut.ap():
         var_map[ap.ap_name()] = [ap.ap_name()]
 
-    return BuchiAutomaton(base_aut, var_map)
+    return as_weak(base_aut, var_map)
 
 def load_hoa(path):
     with open(path, 'r') as f:
-        lines = f.readlines()
+        return from_hoa_str(f.read())
+
+# Reads an automaton in the format written by BuchiAutomaton.to_str (HOA, possibly preceded by a VAR_MAP line)
+def from_hoa_str(s):
+    lines = s.splitlines(True)
 
     try:
         if lines[0].startswith('VAR_MAP: '):
             idx = lines[0].index(':')
             var_map_str = lines[0][idx + 1:].strip()
-            var_map = ast.literal_eval(var_map_str)
+            var_map = VarMap(ast.literal_eval(var_map_str))
 
             for k, vs in var_map.items():
                 for v in vs:
                     BuchiAutomaton.update_counter(v)
 
-            return BuchiAutomaton(spot.automaton('\n'.join(lines[1:])), var_map)
+            return as_weak(spot.automaton('\n'.join(lines[1:])), var_map)
     except ValueError:
         pass
 
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Builds the automaton for a linear constraint c_1*x_1 + ... + c_n*x_n + k = 0 (or < 0) over natural numbers written
+# in binary, least significant bit first (the encoding used by bin_add and bin_less in library/std.pn), in one go.
+# This is the classic carry construction: after reading the low i bits of every variable, the state is the carry r,
+# where (c_1*x_1 + ... + c_n*x_n + k) = (value of the low i bits of the sum) + 2^i * (value of the rest + r).
+
+import itertools as it
+
+import buddy
+import spot
+
+from pecan.automata.buchi import BuchiAutomaton
+from pecan.settings import settings
+from pecan.utility import VarMap
+
+# Beyond this, enumerating every letter of the alphabet (2^n for n variables) is a bad idea, so just use the adders
+MAX_VARS = 12
+
+def build_linear_constraint(coeffs, const, op, var_map):
+    if len(coeffs) > MAX_VARS or any(len(var_map[var_name]) != 1 for var_name, _ in coeffs):
+        return None
+
+    aut = spot.make_twa_graph()
+    aut.set_buchi()
+    aut.prop_state_acc(True)
+
+    var_names = [var_name for var_name, _ in coeffs]
+    bdds = [buddy.bdd_ithvar(aut.register_ap(var_map[var_name][0])) for var_name in var_names]
+
+    letters = []
+    for bits in it.product([0, 1], repeat=len(coeffs)):
+        cond = buddy.bddtrue
+        for bit, bdd in zip(bits, bdds):
+            cond &= bdd if bit else buddy.bdd_not(bdd)
+        letters.append((sum(c * bit for (_, c), bit in zip(coeffs, bits)), cond))
+
+    zero_cond = letters[0][1]
+
+    # Once every variable has only zeros left, we go to `done`, which is the only accepting state.
+    # The rest of the sum is then 0, so the constraint holds if the carry is 0 (for =) or negative (for <).
+    done = aut.new_state()
+    aut.new_edge(done, done, zero_cond, [0])
+
+    states = {}
+    queue = []
+    def state_for(carry):
+        if carry not in states:
+            states[carry] = aut.new_state()
+            queue.append(carry)
+        return states[carry]
+
+    aut.set_init_state(state_for(const))
+
+    while queue:
+        carry = queue.pop()
+        src = states[carry]
+
+        edges = {}
+        for total, cond in letters:
+            total += carry
+            # For =, the low bit of the sum must be 0 for it to be 0
+            if op == '=' and total % 2 != 0:
+                continue
+
+            dst = state_for(total // 2)
+
+            edges[dst] = edges.get(dst, buddy.bddfalse) | cond
+
+        for dst, cond in edges.items():
+            aut.new_edge(src, dst, cond)
+
+        if (op == '=' and carry == 0) or (op == '<' and carry < 0):
+            aut.new_edge(src, done, zero_cond)
+
+    settings.record_stat('linear constraints compiled')
+    settings.log(1, lambda: 'Compiled linear constraint {} {} 0 to an automaton with {} states'.format(
+        ' + '.join('{}*{}'.format(c, v) for v, c in coeffs) + ' + {}'.format(const), op, aut.num_states()))
+
+    res_var_map = VarMap()
+    for var_name in var_names:
+        res_var_map[var_name] = [var_map[var_name][0]]
+
+    return BuchiAutomaton(aut, res_var_map)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Remembers every file evaluated by #import, so that a file imported several times by the same program (e.g., by several
+# of the files it imports) is only parsed and evaluated once. Later imports just get the definitions of the module
+# evaluated the first time, including the automata already built for its predicates.
+# The registry belongs to the program at the root of the imports (see Program.copy_defaults), like the AP registry and the
+# constants cache that the module's automata were built with. Another program evaluates the module again, and so also
+# reports the module's own results (e.g., of its #assert_prop) again.
+# A module is only reused if it was imported under the same conditions: same contents, same context (e.g., which
+# adder to use), and the same settings that change the automata we build.
+
+import hashlib
+
+from pecan.settings import settings
+from pecan.tools.stdlib_snapshot import evaluation_settings
+
+
+def module_key(prog, realpath):
+    with open(realpath, 'rb') as f:
+        content_hash = hashlib.sha256(f.read()).hexdigest()
+
+    return (realpath, content_hash, tuple(sorted(prog.context.items())), evaluation_settings())
+
+def import_module(prog, realpath):
+    from pecan.program import load
+
+    if not settings.use_module_cache():
+        new_prog = load(realpath).copy_defaults(prog)
+        new_prog.evaluate()
+        return new_prog
+
+    key = module_key(prog, realpath)
+
+    if key in prog.module_registry:
+        settings.record_stat('module cache hits')
+        return prog.module_registry[key]
+
+    settings.record_stat('module cache misses')
+
+    new_prog = load(realpath).copy_defaults(prog)
+    new_prog.evaluate()
+
+    # The module shares the context of the program that imported it first, which will keep changing after this
+    new_prog.context = dict(new_prog.context)
+
+    prog.module_registry[key] = new_prog
+
+    return new_prog
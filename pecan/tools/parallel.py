@@ -0,0 +1,261 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Evaluates the top-level definitions of a program in parallel (see --jobs).
+# Spot and buddy keep their state per process, so each job is a forked process. Forking gives the job a copy of the
+# program exactly as it would be if we'd gotten to the job sequentially, so the only definitions we need to run in a
+# job are the expensive ones that don't change the program: #assert_prop. The rest are run in the parent, in order.
+# Jobs send back their result, their output (which we print in program order, along with the output of definitions
+# run in the parent), their stats, and the automata of the predicates they evaluated along the way (as HOA with a
+# VAR_MAP), so that later jobs don't have to build them again.
+# A job that needs a predicate that some running job is building waits for that job first.
+
+import io
+import multiprocessing
+import multiprocessing.connection
+import sys
+import traceback
+from contextlib import redirect_stdout
+
+from pecan.settings import settings
+
+# Set in forked jobs, so that they never fork jobs of their own
+in_job = False
+
+def make_scheduler(prog):
+    if in_job or settings.get_jobs() <= 1:
+        return None
+
+    # The output of definitions run in the parent would be interleaved with the output of jobs
+    if settings.get_debug_level() > 0:
+        return None
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        settings.log(0, lambda: '[DEBUG] Cannot fork on this platform, so ignoring --jobs')
+        return None
+
+    return Scheduler(prog, settings.get_jobs())
+
+# The names of all the predicates that evaluating pred_name might evaluate
+def dependencies(prog, pred_name):
+    from pecan.lang.ir.prog import Call
+    from pecan.lang.optimizer.tools import NodeFilter
+
+    deps = set()
+    to_visit = [pred_name]
+
+    while to_visit:
+        name = to_visit.pop()
+        if name in deps or name not in prog.preds:
+            continue
+
+        deps.add(name)
+
+        pred = prog.preds[name]
+        nodes = NodeFilter(lambda node: type(node) is Call)
+        nodes.transform(pred.body)
+        for rs in pred.restriction_env.values():
+            for r in rs:
+                nodes.transform(r)
+
+        to_visit.extend(node.name for node in nodes.results)
+
+        # Calls may be resolved dynamically (e.g., `adder`), so anything we might be dispatched to is also a dependency
+        to_visit.extend(prog.context.values())
+        for val_dict in prog.types.values():
+            to_visit.extend(v.name for v in val_dict.values())
+
+    return deps
+
+class Job:
+    def __init__(self, d, deps):
+        self.d = d
+        self.deps = deps
+        self.process = None
+        self.conn = None
+        self.payload = None
+
+    def done(self):
+        return self.payload is not None
+
+class Scheduler:
+    def __init__(self, prog, num_jobs):
+        self.prog = prog
+        self.num_jobs = num_jobs
+        self.context = multiprocessing.get_context('fork')
+
+        # Jobs whose output hasn't been printed yet, in program order
+        self.pending = []
+
+    def can_defer(self, d):
+        from pecan.lang.ir.directives import DirectiveAssertProp
+        return type(d) is DirectiveAssertProp
+
+    # Definitions that only change the program in ways that jobs already forked won't see
+    def can_run_alongside(self, d):
+        from pecan.lang.ir.prog import NamedPred, Restriction
+        from pecan.lang.ir.directives import DirectiveContext, DirectiveEndContext, DirectiveForget, DirectiveStructure
+        return type(d) in [NamedPred, Restriction, DirectiveContext, DirectiveEndContext, DirectiveForget, DirectiveStructure]
+
+    # Evaluates a definition here in the parent. Anything it prints (e.g., warnings about free variables) is held back
+    # until the jobs before it have printed theirs, as is its result.
+    def run_here(self, idx, d):
+        from pecan.lang.ir.prog import Result
+
+        if not self.pending:
+            return self.prog.evaluate_definition(idx, d)
+
+        output_start = len(settings.output)
+        stdout = io.StringIO()
+        job = Job(d, set())
+        self.pending.append(job)
+
+        try:
+            with redirect_stdout(stdout):
+                result = self.prog.evaluate_definition(idx, d)
+        except Exception:
+            # We're about to stop, so print everything up to here first, as we would have without --jobs
+            self.hold_back(job, stdout, output_start)
+            self.drain()
+            raise
+
+        self.hold_back(job, stdout, output_start)
+
+        if type(result) is Result:
+            job.payload['result'] = (result.message(), result.succeeded())
+
+        return None
+
+    def hold_back(self, job, stdout, output_start):
+        job.payload = { 'stdout': stdout.getvalue(), 'output': settings.output[output_start:] }
+        settings.output = settings.output[:output_start]
+
+    def running(self):
+        return [job for job in self.pending if job.process is not None and not job.done()]
+
+    def submit(self, idx, d):
+        deps = set(name for name in dependencies(self.prog, d.pred_name)
+                   if self.prog.preds[name].body_evaluated is None)
+
+        # If someone is already building a predicate we need, wait for it and use theirs instead of building it again
+        for job in self.running():
+            if job.deps & deps:
+                self.wait_for(job)
+
+        while len(self.running()) >= self.num_jobs:
+            self.wait_for_any()
+
+        job = Job(d, deps)
+
+        # Otherwise, anything still buffered would be printed again by the job when it exits
+        sys.stdout.flush()
+
+        job.conn, child_conn = self.context.Pipe(duplex=False)
+        job.process = self.context.Process(target=run_job, args=(self.prog, idx, d, deps, child_conn))
+        job.process.start()
+        child_conn.close()
+
+        self.pending.append(job)
+        settings.record_stat('parallel jobs')
+
+    def wait_for_any(self):
+        running = self.running()
+        ready = multiprocessing.connection.wait([job.conn for job in running])
+        for job in running:
+            if job.conn in ready:
+                self.receive(job)
+
+    def wait_for(self, job):
+        if not job.done():
+            self.receive(job)
+
+    def receive(self, job):
+        try:
+            job.payload = job.conn.recv()
+        except EOFError:
+            job.payload = { 'error': 'Job for {} exited without a result (exit code {})'.format(job.d, job.process.exitcode) }
+
+        job.conn.close()
+        job.process.join()
+
+        settings.merge_stats(job.payload.get('stats', {}), job.payload.get('max_stats', set()))
+        self.install_automata(job.payload.get('automata', {}))
+
+    def install_automata(self, automata):
+        from pecan.tools.hoa_loader import from_hoa_str
+
+        for name, hoa in automata.items():
+            pred = self.prog.preds.get(name)
+            if pred is not None and pred.body_evaluated is None:
+                pred.body_evaluated = from_hoa_str(hoa)
+                settings.record_stat('automata received from parallel jobs')
+
+    # Prints the output of the jobs at the front of the queue that are done, and returns their results
+    def collect(self):
+        from pecan.lang.ir.prog import Result
+
+        results = []
+
+        while self.pending and self.pending[0].done():
+            job = self.pending.pop(0)
+
+            print(job.payload.get('stdout', ''), end='')
+            settings.output += job.payload.get('output', '')
+
+            if job.payload.get('error') is not None:
+                self.terminate()
+                raise Exception(job.payload['error'])
+
+            if job.payload.get('result') is not None:
+                msg, succeeded = job.payload['result']
+                results.append(Result(msg, succeeded))
+
+        return results
+
+    # Waits for all jobs, and returns all their results
+    def drain(self):
+        for job in self.pending:
+            self.wait_for(job)
+
+        return self.collect()
+
+    def terminate(self):
+        for job in self.running():
+            job.process.terminate()
+            job.process.join()
+        self.pending = []
+
+def run_job(prog, idx, d, deps, conn):
+    global in_job
+    in_job = True
+
+    from pecan.lang.ir.prog import Result
+
+    settings.reset_stats()
+    output_start = len(settings.output)
+    stdout = io.StringIO()
+    payload = {}
+
+    try:
+        with redirect_stdout(stdout):
+            result = prog.evaluate_definition(idx, d)
+
+        if type(result) is Result:
+            payload['result'] = (result.message(), result.succeeded())
+
+        automata = {}
+        for name in deps:
+            aut = prog.preds[name].body_evaluated
+            if aut is not None and aut.get_aut_type() == 'buchi':
+                automata[name] = aut.to_str()
+        payload['automata'] = automata
+    except Exception:
+        payload['error'] = 'Error while evaluating {}:\n{}'.format(d, traceback.format_exc())
+
+    payload['stdout'] = stdout.getvalue()
+    payload['output'] = settings.output[output_start:]
+    payload['stats'] = settings.get_stats()
+    payload['max_stats'] = settings.get_max_stat_names()
+
+    conn.send(payload)
+    conn.close()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Keeps the parsed AST of each .pn file in the cache directory, keyed by a hash of its contents and of the parser, so
+# that files that haven't changed (e.g., imported libraries) aren't parsed again on every run.
+# The parser generates fresh names for some constructs (e.g., `min`, or pattern arguments in Praline), and those names
+# must not clash with names generated elsewhere in the run that loads the AST. So the names an AST was parsed with are
+# stored relative to the counter they came from, and are renumbered from the current counter when the AST is loaded.
+
+import hashlib
+import os
+import pickle
+import re
+import sys
+
+from pecan.settings import settings
+from pecan.tools.predicate_cache import PredicateCache
+from pecan.tools.stdlib_snapshot import hash_dir
+
+# Bump this whenever what we store in the cache changes
+PARSE_CACHE_FORMAT_VERSION = 1
+
+IR_NAME = re.compile(r'__pecan_var(\d+)')
+PRALINE_NAME = re.compile(r'__arg(\d+)')
+
+parser_hash = None
+
+def get_parser_hash():
+    global parser_hash
+
+    if parser_hash is None:
+        lang_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'lang')
+
+        h = hashlib.sha256()
+        h.update('{}\n{}\n'.format(PARSE_CACHE_FORMAT_VERSION, sys.version).encode('utf-8'))
+        hash_dir(h, os.path.join(lang_dir, 'lark'), extensions={'.py', '.lark'})
+        hash_dir(h, os.path.join(lang_dir, 'ast'), extensions={'.py'})
+        with open(os.path.join(lang_dir, 'parser.py'), 'rb') as f:
+            h.update(f.read())
+
+        parser_hash = h.hexdigest()
+
+    return parser_hash
+
+def cache_path(source_code):
+    h = hashlib.sha256()
+    h.update(get_parser_hash().encode('utf-8'))
+    h.update(source_code.encode('utf-8'))
+    return os.path.join(settings.get_cache_dir(), 'parse-{}.pickle'.format(h.hexdigest()))
+
+def fresh_name_counters():
+    from pecan.lang.ir.base import IRNode
+    from pecan.lang.ast.praline import PralineTerm
+    return IRNode.id, PralineTerm.var_counter
+
+# Replaces the names generated while parsing by their offset from the counter they were generated from
+class ASTPickler(pickle.Pickler):
+    def __init__(self, f, start_counters, end_counters):
+        super().__init__(f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.ranges = [('ir', IR_NAME, start_counters[0], end_counters[0]),
+                       ('praline', PRALINE_NAME, start_counters[1], end_counters[1])]
+
+    def persistent_id(self, obj):
+        if type(obj) is not str:
+            return None
+
+        for kind, pattern, start, end in self.ranges:
+            m = pattern.fullmatch(obj)
+            if m is not None and start <= int(m.group(1)) < end:
+                return (kind, int(m.group(1)) - start)
+
+        return None
+
+class ASTUnpickler(pickle.Unpickler):
+    def __init__(self, f, start_counters):
+        super().__init__(f)
+        self.start_counters = start_counters
+
+    def persistent_load(self, pid):
+        kind, offset = pid
+        if kind == 'ir':
+            return '__pecan_var{}'.format(self.start_counters[0] + offset)
+        elif kind == 'praline':
+            return '__arg{}'.format(self.start_counters[1] + offset)
+        else:
+            raise pickle.UnpicklingError('Unknown generated name: {}'.format(pid))
+
+def read_cached(path):
+    from pecan.lang.ir.base import IRNode
+    from pecan.lang.ast.praline import PralineTerm
+
+    if not os.path.exists(path):
+        return None
+
+    start_counters = fresh_name_counters()
+
+    try:
+        with open(path, 'rb') as f:
+            num_ir_names, num_praline_names = pickle.load(f)
+            prog = ASTUnpickler(f, start_counters).load()
+    except Exception as e:
+        settings.log(0, lambda: '[DEBUG] Could not load cached parse {}: {}'.format(path, e))
+        return None
+
+    # Skip past the names we just handed out, as if we'd parsed the file
+    IRNode.id = start_counters[0] + num_ir_names
+    PralineTerm.var_counter = start_counters[1] + num_praline_names
+
+    # Touch the file so that eviction removes the least recently used entries first (see PredicateCache.evict)
+    os.utime(path, None)
+
+    return prog
+
+def write_cached(path, prog, start_counters, end_counters):
+    os.makedirs(settings.get_cache_dir(), exist_ok=True)
+
+    # Write to a temporary file first so that a concurrent reader never sees a partially written file
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((end_counters[0] - start_counters[0], end_counters[1] - start_counters[1]), f)
+            ASTPickler(f, start_counters, end_counters).dump(prog)
+        os.replace(tmp_path, path)
+    except (Exception, RecursionError) as e:
+        settings.log(0, lambda: '[DEBUG] Could not write cached parse {}: {}'.format(path, e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    PredicateCache(settings.get_cache_dir(), settings.get_cache_max_size()).evict()
+
+def parse(parser, source_code):
+    if not settings.use_parse_cache() or not settings.use_cache():
+        return parser.parse(source_code)
+
+    path = cache_path(source_code)
+    prog = read_cached(path)
+
+    if prog is not None:
+        settings.record_stat('parse cache hits')
+        return prog
+
+    settings.record_stat('parse cache misses')
+
+    start_counters = fresh_name_counters()
+    prog = parser.parse(source_code)
+    write_cached(path, prog, start_counters, fresh_name_counters())
+
+    return prog
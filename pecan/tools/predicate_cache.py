@@ -0,0 +1,149 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+import hashlib
+import os
+import re
+
+from pecan.settings import settings
+
+# Bump this whenever the meaning of a cached automaton might change (e.g., the encoding of numbers or the file format)
+CACHE_FORMAT_VERSION = 1
+
+# Fresh names depend on the order things were created in, so they shouldn't make otherwise identical predicates look different
+fresh_name_pattern = re.compile(r'__pecan_var\d+')
+
+def normalize_names(s):
+    names = {}
+    def rename(match):
+        if match.group(0) not in names:
+            names[match.group(0)] = '__v{}'.format(len(names))
+        return names[match.group(0)]
+
+    return fresh_name_pattern.sub(rename, s)
+
+def hash_str(s):
+    return hashlib.sha256(s.encode('utf-8')).hexdigest()
+
+class PredicateCache:
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def should_cache(self, pred):
+        from pecan.lang.ir.annotation import Annotation
+
+        if not settings.use_cache():
+            return False
+
+        # Either everything is cached (--cache-dir), or only the predicates the user asked for
+        return settings.cache_all() or (type(pred.body) is Annotation and pred.body.annotation_name == '@cache')
+
+    def key(self, prog, pred):
+        return hash_str('{}\n{}'.format(CACHE_FORMAT_VERSION, self.pred_hash(prog, pred.name, pred, {})))
+
+    def pred_hash(self, prog, name, pred, seen):
+        if name in seen:
+            # Recursive predicates can't actually be evaluated, but make sure we don't loop forever
+            return seen[name] or 'recursive {}'.format(name)
+
+        seen[name] = None
+
+        from pecan.lang.ir.prog import Call, AutLiteral
+        from pecan.lang.optimizer.tools import NodeFilter
+
+        restriction_env = sorted((var, repr(rs)) for var, rs in pred.restriction_env.items())
+        parts = [repr(pred.args), repr(pred.body), repr(restriction_env)]
+
+        nodes = NodeFilter(lambda node: type(node) is Call or isinstance(node, AutLiteral))
+        nodes.transform(pred.body)
+        for rs in pred.restriction_env.values():
+            for r in rs:
+                nodes.transform(r)
+
+        dep_names = set()
+        for node in nodes.results:
+            if type(node) is Call:
+                dep_names.add(node.name)
+            else:
+                parts.append(node.content_hash())
+
+        # Calls may be resolved dynamically (e.g., `adder` depending on the types of the arguments), so anything we might
+        # be dispatched to is also a dependency
+        parts.append(repr(sorted(prog.context.items())))
+        dep_names.update(prog.context.values())
+        for t, val_dict in prog.types.items():
+            parts.append('{}: {}'.format(repr(t), repr(sorted((k, repr(v)) for k, v in val_dict.items()))))
+            dep_names.update(v.name for v in val_dict.values())
+
+        for dep_name in sorted(dep_names):
+            if dep_name in prog.preds:
+                parts.append('{}: {}'.format(dep_name, self.pred_hash(prog, dep_name, prog.preds[dep_name], seen)))
+
+        seen[name] = hash_str(normalize_names('\n'.join(parts)))
+        return seen[name]
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, '{}.aut'.format(key))
+
+    def lookup(self, key):
+        from pecan.tools.hoa_loader import load_hoa
+
+        path = self.path_for(key)
+
+        if not os.path.exists(path):
+            settings.record_stat('predicate cache misses')
+            return None
+
+        try:
+            aut = load_hoa(path)
+        except Exception as e:
+            settings.log(0, lambda: '[DEBUG] Could not load cached automaton {}: {}'.format(path, e))
+            settings.record_stat('predicate cache misses')
+            return None
+
+        # Touch the file so that eviction removes the least recently used entries first
+        os.utime(path, None)
+
+        settings.record_stat('predicate cache hits')
+        return aut
+
+    def store(self, key, aut):
+        if aut.get_aut_type() != 'buchi':
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Write to a temporary file first so that a concurrent reader never sees a partially written automaton
+        path = self.path_for(key)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(aut.to_str())
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    # Everything we keep in the cache directory counts towards max_size: the cached automata, the parsed files
+    # (see pecan.tools.parse_cache), and the snapshots of the standard library (see pecan.tools.stdlib_snapshot)
+    def is_cache_file(self, name):
+        return name.endswith('.aut') or ((name.startswith('parse-') or name.startswith('stdlib-')) and name.endswith('.pickle'))
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and self.is_cache_file(entry.name):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+
+            try:
+                os.remove(path)
+                total_size -= size
+                settings.record_stat('cache evictions')
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Enforces the limits set by --timeout (per top-level definition, e.g., per theorem) and --max-states/--max-edges
+# (per operation, i.e., on the automaton produced by each IR node).
+# Spot's operations can't be interrupted from Python, so limits are checked at IR node boundaries: a single runaway
+# operation is only noticed once it returns, but everything after it is skipped.
+
+import time
+
+from pecan.settings import settings
+
+class ResourceLimitExceeded(Exception):
+    pass
+
+class ResourceLimits:
+    def __init__(self):
+        self.depth = 0
+        self.start_time = None
+        self.timeout = None
+        self.max_states_seen = 0
+        self.max_edges_seen = 0
+
+    # Definitions can be nested (e.g., imports, or Praline code running Pecan code), but only the outermost one gets a budget
+    def begin(self):
+        if self.depth == 0:
+            self.start_time = time.time()
+            self.timeout = settings.get_timeout()
+            self.max_states_seen = 0
+            self.max_edges_seen = 0
+
+        self.depth += 1
+        return self
+
+    def end(self):
+        self.depth -= 1
+        return self
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        return time.time() - self.start_time
+
+    # Once we've used half of our time, stop spending time simplifying automata, and hope we can finish without it
+    def should_skip_simplification(self):
+        if self.depth > 0 and self.timeout is not None and self.elapsed() > self.timeout / 2:
+            settings.record_stat('simplifications skipped to stay within --timeout')
+            return True
+        return False
+
+    def describe_sizes(self):
+        return 'largest automaton so far has {} states and {} edges'.format(self.max_states_seen, self.max_edges_seen)
+
+    def check_time(self, node):
+        if self.depth > 0 and self.timeout is not None and self.elapsed() > self.timeout:
+            raise ResourceLimitExceeded('exceeded time limit of {}s after {:.2f}s while evaluating {} ({})'.format(
+                self.timeout, self.elapsed(), node, self.describe_sizes()))
+
+    def check(self, node, aut):
+        sn, en = aut.num_states(), aut.num_edges()
+        self.max_states_seen = max(self.max_states_seen, sn)
+        self.max_edges_seen = max(self.max_edges_seen, en)
+        settings.record_max_stat('peak automaton states', sn)
+        settings.record_max_stat('peak automaton edges', en)
+
+        max_states = settings.get_max_states()
+        if max_states is not None and sn > max_states:
+            raise ResourceLimitExceeded('{} produced an automaton with {} states and {} edges, more than the limit of {} states ({})'.format(
+                node, sn, en, max_states, self.describe_sizes()))
+
+        max_edges = settings.get_max_edges()
+        if max_edges is not None and en > max_edges:
+            raise ResourceLimitExceeded('{} produced an automaton with {} states and {} edges, more than the limit of {} edges ({})'.format(
+                node, sn, en, max_edges, self.describe_sizes()))
+
+        self.check_time(node)
+
+resource_limits = ResourceLimits()
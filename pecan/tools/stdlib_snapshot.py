@@ -0,0 +1,120 @@
+#!/usr/bin/env python3.6
+# -*- coding=utf-8 -*-
+
+# Keeps a pickled copy of the evaluated standard library (lowered IR, Praline definitions, structures, and the
+# automata already built) in the cache directory, so that we don't parse and evaluate library/std.pn on every run.
+# A snapshot is only used if nothing it could depend on has changed: the library, Pecan's own source, the versions
+# of Python and spot, and the settings that change how the library is evaluated.
+
+import hashlib
+import os
+import pickle
+import sys
+
+import spot
+
+from pecan.settings import settings
+from pecan.tools.predicate_cache import PredicateCache
+
+# Bump this whenever what we store in a snapshot changes
+SNAPSHOT_FORMAT_VERSION = 1
+
+def hash_dir(h, path, extensions=None):
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            if extensions is not None and os.path.splitext(filename)[1] not in extensions:
+                continue
+
+            full_path = os.path.join(root, filename)
+            h.update(os.path.relpath(full_path, path).encode('utf-8'))
+            with open(full_path, 'rb') as f:
+                h.update(f.read())
+
+# The settings that change the automata we build for a program
+def evaluation_settings():
+    return (settings.get_opt_level(), settings.min_opt(), settings.use_weak_automata(), settings.use_linear_constraints(),
+            settings.use_miniscoping(), settings.use_canonical_aps())
+
+def snapshot_key(std_path):
+    h = hashlib.sha256()
+
+    h.update('{}\n{}\n{}\n'.format(SNAPSHOT_FORMAT_VERSION, sys.version, spot.version()).encode('utf-8'))
+    h.update(repr(evaluation_settings()).encode('utf-8'))
+
+    hash_dir(h, os.path.dirname(os.path.realpath(std_path)))
+    hash_dir(h, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'), extensions={'.py', '.lark'})
+
+    return h.hexdigest()
+
+def snapshot_path(std_path):
+    return os.path.join(settings.get_cache_dir(), 'stdlib-{}.pickle'.format(snapshot_key(std_path)))
+
+def read_snapshot(path):
+    from pecan.lang.ir.base import IRNode
+    from pecan.automata.buchi import BuchiAutomaton
+
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except Exception as e:
+        settings.log(0, lambda: '[DEBUG] Could not load stdlib snapshot {}: {}'.format(path, e))
+        return None
+
+    # Make sure the names we generate from now on don't clash with the ones in the snapshot
+    IRNode.id = max(IRNode.id, snapshot['ir_id'])
+    BuchiAutomaton.id = max(BuchiAutomaton.id, snapshot['ap_id'])
+
+    # Touch the file so that eviction removes the least recently used entries first (see PredicateCache.evict)
+    os.utime(path, None)
+
+    return snapshot['prog']
+
+def write_snapshot(path, prog):
+    from pecan.lang.ir.base import IRNode
+    from pecan.automata.buchi import BuchiAutomaton
+    from pecan.utility import LRUCache
+
+    # The keys of the memo mention the identities of predicates, which mean nothing once unpickled
+    prog.subformula_memo = LRUCache(settings.get_subformula_memo_size())
+
+    os.makedirs(settings.get_cache_dir(), exist_ok=True)
+
+    # Write to a temporary file first so that a concurrent reader never sees a partially written snapshot
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({ 'prog': prog, 'ir_id': IRNode.id, 'ap_id': BuchiAutomaton.id }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except (Exception, RecursionError) as e:
+        settings.log(0, lambda: '[DEBUG] Could not write stdlib snapshot {}: {}'.format(path, e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    # Every change to the library, to Pecan, or to the settings above gets a new snapshot, so old ones have to go somewhere
+    PredicateCache(settings.get_cache_dir(), settings.get_cache_max_size()).evict()
+
+def load_stdlib(std_path, loader, args, kwargs):
+    if not settings.use_stdlib_snapshot() or not settings.use_cache():
+        prog = loader(std_path, *args, **kwargs)
+        prog.evaluate()
+        return prog
+
+    path = snapshot_path(std_path)
+    prog = read_snapshot(path)
+
+    if prog is not None:
+        settings.record_stat('stdlib snapshot hits')
+        return prog
+
+    settings.record_stat('stdlib snapshot misses')
+
+    prog = loader(std_path, *args, **kwargs)
+    prog.evaluate()
+    write_snapshot(path, prog)
+
+    return prog
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3.6
 # -*- coding=utf-8 -*-
 
+from collections import OrderedDict
 import copy
 import os
 
@@ -22,12 +23,55 @@ def unzip(xs):
 
     return lefts, rights
 
+# Hands out one AP per (variable, bit position), so that every automaton built in a program agrees on how each variable
+# is represented. Conjunctions/disjunctions of automata sharing variables then don't need to rename anything.
+class APRegistry:
+    def __init__(self):
+        self.aps = {}
+
+    def get_or_gen(self, var_name, gen_func, n_reps):
+        aps = self.aps.setdefault(var_name, [])
+
+        while len(aps) < n_reps:
+            aps.append(gen_func())
+
+        return aps[:n_reps]
+
+# A dictionary holding at most max_size entries, evicting the least recently used entry first
+class LRUCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        if key not in self.entries:
+            return default
+
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+        return value
+
 class VarMap:
-    def __init__(self, var_reps=None):
+    def __init__(self, var_reps=None, ap_registry=None):
         self.var_reps = var_reps or {}
+        self.ap_registry = ap_registry
 
     def clone(self):
-        return VarMap(copy.deepcopy(self.var_reps))
+        return VarMap(copy.deepcopy(self.var_reps), self.ap_registry)
 
     def __contains__(self, item):
         return item in self.var_reps
@@ -66,7 +110,10 @@ class VarMap:
 
     def get_or_gen(self, var_name, gen_func, n_reps):
         if var_name not in self:
-            self[var_name] = [ gen_func() for _ in range(n_reps) ]
+            if self.ap_registry is not None:
+                self[var_name] = self.ap_registry.get_or_gen(var_name, gen_func, n_reps)
+            else:
+                self[var_name] = [ gen_func() for _ in range(n_reps) ]
 
         return self[var_name]
 
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3.6
 # -*- coding=utf-8 -*-
 
+import os
+import tempfile
+
 from pecan import program
 from pecan.settings import settings
 
@@ -13,6 +16,15 @@ def run_file(filename):
 
     settings.set_quiet(orig_quiet)
 
+# Loads examples/test_plot.pn, returning the program, the alphabet sizes to plot pred_name with, and its automaton
+def load_plot_example(pred_name):
+    alphabets = { 'sierpinski3': { 'x': 3, 'y': 3 }, 'hilbert': { 'x': 2, 'y': 2, 't': 4 } }[pred_name]
+
+    prog = program.load('examples/test_plot.pn')
+    prog.evaluate()
+
+    return prog, alphabets, prog.call(pred_name)
+
 def test_praline_define_aut():
     run_file('examples/test_praline_define_aut.pn')
 
@@ -58,6 +70,204 @@ def test_chicken_mcnugget():
 def test_arith_props():
     run_file('examples/arith_props.pn')
 
+def test_arith_props_without_weak_automata():
+    settings.set_weak_automata(False)
+
+    try:
+        run_file('examples/arith_props.pn')
+    finally:
+        settings.set_weak_automata(True)
+
+def test_weak_determinization():
+    import spot
+    from pecan.automata.weak import determinize_weak
+
+    # Finitely many a's: recognized by a weak automaton, but not by any weak deterministic one
+    assert determinize_weak(spot.translate('FG !a')) is None
+
+    aut = spot.translate('F(a & X b)')
+    res = determinize_weak(aut)
+    assert res is not None
+    assert spot.is_deterministic(res) and spot.are_equivalent(res, aut)
+
+def test_complement_cache():
+    import spot
+    from pecan.automata.buchi import BuchiAutomaton
+    from pecan.utility import VarMap
+
+    settings.reset_stats()
+    aut = BuchiAutomaton(spot.translate('GF a'), VarMap({'x': ['a']}))
+    comp = aut.complement()
+
+    # Complementing twice gives back the automaton we started with, without building anything
+    assert comp.complement() is aut
+    assert aut.complement() is comp
+    assert settings.get_stats().get('complement cache hits', 0) == 2
+
+    # Changing an automaton in place forgets the link in both directions
+    infinitely_many = BuchiAutomaton(spot.translate('GF a'), VarMap({'x': ['a']}))
+    finitely_many = BuchiAutomaton(spot.translate('FG !a'), VarMap({'x': ['a']}))
+    infinitely_many.link_complement(finitely_many)
+    settings.reset_stats()
+    infinitely_many.postprocess()
+    assert settings.get_stats().get('postprocess calls', 0) == 1
+    assert infinitely_many.get_cached_complement() is None and finitely_many.get_cached_complement() is None
+
+    # States 1 and 2 have the same edges, so merge_states changes the automaton
+    duplicated = BuchiAutomaton(spot.automaton("""HOA: v1
+States: 4
+Start: 0
+AP: 1 "a"
+acc-name: Buchi
+Acceptance: 1 Inf(0)
+properties: trans-labels explicit-labels state-acc
+--BODY--
+State: 0
+[0] 1
+[!0] 2
+State: 1
+[t] 3
+State: 2
+[t] 3
+State: 3 {0}
+[t] 3
+--END--
+"""), VarMap({'x': ['a']}))
+    complement = duplicated.complement()
+    duplicated.merge_states()
+    assert duplicated.num_states() == 3
+    assert duplicated.get_cached_complement() is None and complement.get_cached_complement() is None
+
+def test_expression_frequency_hashes_once():
+    from pecan.lang.ir import Add, VarRef
+    from pecan.lang.optimizer.tools import ExpressionFrequency
+
+    n = 200
+    expr = VarRef('x')
+    for i in range(n):
+        expr = Add(expr, VarRef('y{}'.format(i)))
+
+    hashed = []
+    orig_hash = VarRef.__hash__
+    VarRef.__hash__ = lambda self: hashed.append(self) or orig_hash(self)
+    try:
+        freq = ExpressionFrequency().count(expr)
+    finally:
+        VarRef.__hash__ = orig_hash
+
+    assert len(freq) == 2 * n + 1
+    # Each Add remembers its hash, so counting hashes each variable a few times, rather than once per Add above it
+    assert len(hashed) <= 4 * (n + 1)
+
+def test_truth_value_without_products():
+    from pecan.lang.ir import Call
+
+    orig_quiet = settings.is_quiet()
+    settings.set_quiet(True)
+    # So that the quantifiers we check stay at the top of each predicate
+    settings.set_opt_level(0)
+
+    try:
+        prog = program.load('examples/test_truth_value.pn')
+        assert prog.evaluate().result.succeeded()
+
+        for pred_name, truth_val, products_avoided in [('exists_successor', 'true', 1), ('one_is_two', 'false', 1), ('is_even', 'sometimes', 0)]:
+            settings.reset_stats()
+            assert Call(pred_name, []).truth_value(prog) == truth_val
+            assert settings.get_stats().get('products avoided by on-the-fly emptiness checks', 0) == products_avoided
+    finally:
+        settings.set_opt_level(1)
+        settings.set_quiet(orig_quiet)
+
+def test_join_order():
+    import functools
+    from pecan.lang.ir import BoolConst
+    from pecan.lang.ir.bool import join_all
+
+    orig_quiet = settings.is_quiet()
+    settings.set_quiet(True)
+
+    try:
+        prog = program.load('examples/test_join_order.pn')
+        assert prog.evaluate().result.succeeded()
+
+        auts = [prog.call('big_x'), prog.call('big_y'), prog.call('two_apart')]
+        source_order = functools.reduce(lambda a, b: a.conjunction(b), auts)
+
+        settings.reset_stats()
+        res = join_all(BoolConst(True), prog, auts, lambda a, b: a.conjunction(b), '&')
+        assert settings.get_stats().get('reordered conjunctions/disjunctions', 0) == 1
+        assert res.contains(source_order) and source_order.contains(res)
+    finally:
+        settings.set_quiet(orig_quiet)
+
+def test_ap_registry():
+    from pecan.lang.ir import VarRef
+
+    orig_quiet = settings.is_quiet()
+    settings.set_quiet(True)
+
+    try:
+        prog = program.load('examples/test_ap_registry.pn')
+        assert prog.evaluate().result.succeeded()
+
+        three, odd, three_y = prog.call('three'), prog.call('odd'), prog.call('three_y')
+
+        # Predicates over the same variable get the same APs for it, namely the ones the registry handed out
+        x_aps = three.get_var_map()['x']
+        assert odd.get_var_map()['x'] == x_aps
+        assert prog.get_ap_registry().aps['x'][:len(x_aps)] == x_aps
+
+        # Sharing APs doesn't mix up the predicates: 3 is odd, but not every odd number is 3
+        assert not three.intersects(odd.complement())
+        assert odd.intersects(three.complement())
+
+        # Substituting y for x gives the same automaton as defining the predicate over y
+        prog.enter_var_map_scope()
+        try:
+            substituted = prog.lookup_pred_by_name('three').call(prog, [VarRef('y')])
+        finally:
+            prog.exit_var_map_scope()
+
+        assert substituted.get_var_map()['y'] == three_y.get_var_map()['y']
+        assert substituted.contains(three_y) and three_y.contains(substituted)
+    finally:
+        settings.set_quiet(orig_quiet)
+
+def test_ap_substitute_swap_and_chain():
+    from pecan.automata.buchi import BuchiAutomaton, Substitution, buchi_transform, rename_aps
+    from pecan.utility import VarMap
+
+    orig_quiet = settings.is_quiet()
+    settings.set_quiet(True)
+
+    try:
+        prog = program.load('examples/test_ap_substitute.pn')
+        assert prog.evaluate().result.succeeded()
+
+        less = prog.call('less')
+        [x_ap], [y_ap] = less.get_var_map()['x'], less.get_var_map()['y']
+        z_ap = BuchiAutomaton.fresh_ap()
+
+        # How substitutions were done before renaming in bulk: compose each edge's condition with one AP at a time,
+        # going through fresh APs so the substitutions can't interfere with each other
+        def compose_aps(aut, ap_subs):
+            tmp_subs = {k: BuchiAutomaton.fresh_ap() for k in ap_subs}
+            aut = buchi_transform(aut, Substitution({aut.register_ap(k): v for k, v in tmp_subs.items()}))
+            return buchi_transform(aut, Substitution({aut.register_ap(tmp_subs[k]): v for k, v in ap_subs.items()}))
+
+        for ap_subs in [{x_ap: y_ap, y_ap: x_ap}, {x_ap: y_ap, y_ap: z_ap}]:
+            var_map = VarMap({'x': [ap_subs[x_ap]], 'y': [ap_subs[y_ap]]})
+            renamed = BuchiAutomaton(rename_aps(less.get_aut(), ap_subs), var_map)
+            composed = BuchiAutomaton(compose_aps(less.get_aut(), ap_subs), var_map.clone())
+            assert renamed.contains(composed) and composed.contains(renamed)
+
+        # Read with the original APs, the swapped automaton accepts y < x, which never overlaps with x < y
+        swapped = BuchiAutomaton(rename_aps(less.get_aut(), {x_ap: y_ap, y_ap: x_ap}), VarMap({'x': [x_ap], 'y': [y_ap]}))
+        assert not swapped.intersects(less)
+    finally:
+        settings.set_quiet(orig_quiet)
+
 def test_fa19_poster_session():
     run_file('examples/fa19-poster-session.pn')
 
@@ -94,6 +304,22 @@ def test_quant_multiple_vars():
 def test_annotations():
     run_file('examples/test_annotations.pn')
 
+def test_predicate_cache():
+    orig_cache_dir = settings.cache_dir
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        settings.set_cache_dir(cache_dir)
+
+        try:
+            hits_before = settings.get_stats().get('predicate cache hits', 0)
+            run_file('examples/test_cache.pn')
+            assert settings.get_stats().get('predicate cache hits', 0) == hits_before
+
+            run_file('examples/test_cache.pn')
+            assert settings.get_stats().get('predicate cache hits', 0) > hits_before
+        finally:
+            settings.set_cache_dir(orig_cache_dir)
+
 def test_thue_morse_periods():
     run_file('examples/thue_morse_periods.pn')
 
@@ -112,6 +338,94 @@ def test_sup_function():
 def test_finite_basics():
     run_file('examples/test_finite_aut.pn')
 
+def test_universality():
+    run_file('examples/test_universality.pn')
+
+def test_simplification_policies():
+    run_file('examples/test_simplification_policy.pn')
+
+def test_linear_constraints():
+    run_file('examples/test_linear_constraints.pn')
+
+def test_linear_constraints_with_adders():
+    settings.set_linear_constraints(False)
+
+    try:
+        run_file('examples/test_linear_constraints.pn')
+    finally:
+        settings.set_linear_constraints(True)
+
+def test_miniscoping():
+    run_file('examples/test_miniscoping.pn')
+
+def test_no_miniscoping():
+    settings.set_miniscoping(False)
+
+    try:
+        run_file('examples/test_miniscoping.pn')
+    finally:
+        settings.set_miniscoping(True)
+
+def test_subformula_memo():
+    settings.reset_stats()
+    run_file('examples/test_subformula_memo.pn')
+    assert settings.get_stats().get('subformula memo hits', 0) > 0
+
+def test_large_constants():
+    # Without linear constraints, the constants are built on their own (see IntConst)
+    settings.set_linear_constraints(False)
+
+    try:
+        run_file('examples/test_large_constants.pn')
+    finally:
+        settings.set_linear_constraints(True)
+
+def test_no_constants_cache():
+    settings.set_linear_constraints(False)
+    settings.set_constants_cache_size(0)
+
+    try:
+        run_file('examples/test_large_constants.pn')
+    finally:
+        settings.set_constants_cache_size(1000)
+        settings.set_linear_constraints(True)
+
+def test_max_states_limit():
+    orig_quiet = settings.is_quiet()
+    settings.set_quiet(True)
+
+    prog = program.load('examples/test_universality.pn')
+    settings.set_max_states(1)
+
+    try:
+        result = prog.evaluate().result
+        assert result.failed()
+        assert 'more than the limit of 1 states' in result.message()
+        # Every theorem is reported, not just the first one that went over the limit
+        assert 'fsa_not_all_even' in result.message()
+        # Stopping partway through evaluating a theorem doesn't leave anything behind for the next one
+        assert prog.eval_level == 0
+    finally:
+        settings.set_max_states(None)
+        settings.set_quiet(orig_quiet)
+
+def test_max_states_limit_statistics():
+    orig_quiet = settings.is_quiet()
+    settings.set_quiet(True)
+    settings.set_write_statistics(True)
+
+    prog = program.load('examples/test_universality.pn')
+    settings.set_max_states(1)
+
+    try:
+        assert prog.evaluate().result.failed()
+        # Predicates that went over the limit don't leave their statistics behind
+        assert prog.aut_stats == {}
+    finally:
+        settings.set_max_states(None)
+        settings.set_write_statistics(False)
+        settings.set_quiet(orig_quiet)
+
 def test_constraints():
     run_file('examples/test_constraints.pn')
 
@@ -129,3 +443,198 @@ def test_fractal():
     # TODO: Add some correctness testing for fractals
     run_file('examples/fractal.pn')
 
+
+def test_parallel_jobs():
+    settings.set_jobs(2)
+
+    try:
+        run_file('examples/test_miniscoping.pn')
+    finally:
+        settings.set_jobs(1)
+
+def test_parallel_jobs_results_in_order():
+    orig_quiet = settings.is_quiet()
+    settings.set_quiet(True)
+    settings.set_max_states(1)
+
+    try:
+        sequential = program.load('examples/test_universality.pn').evaluate().result
+
+        settings.set_jobs(3)
+        parallel = program.load('examples/test_universality.pn').evaluate().result
+
+        assert parallel.failed() == sequential.failed()
+        assert parallel.message() == sequential.message()
+    finally:
+        settings.set_jobs(1)
+        settings.set_max_states(None)
+        settings.set_quiet(orig_quiet)
+
+def test_parallel_jobs_output_in_order():
+    orig_quiet = settings.is_quiet()
+    orig_output_json = settings.get_output_json()
+    settings.set_quiet(False).set_output_json(True)
+
+    try:
+        start = len(settings.get_output())
+        program.load('examples/test_parallel_output.pn').evaluate()
+        sequential = settings.get_output()[start:]
+
+        settings.set_jobs(2)
+        start = len(settings.get_output())
+        program.load('examples/test_parallel_output.pn').evaluate()
+        parallel = settings.get_output()[start:]
+
+        # The warning printed while defining is_successor comes after the output of the theorem before it
+        assert 'Free variables found in is_successor' in parallel
+        assert parallel == sequential
+    finally:
+        settings.set_jobs(1)
+        settings.set_quiet(orig_quiet).set_output_json(orig_output_json)
+
+def test_stdlib_snapshot():
+    orig_cache_dir = settings.cache_dir
+    orig_stdlib_prog = settings.stdlib_prog
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        settings.set_cache_dir(cache_dir)
+
+        try:
+            # The first run writes the snapshot, and the second one should load it
+            settings.stdlib_prog = None
+            run_file('examples/test_arith.pn')
+
+            settings.stdlib_prog = None
+            settings.reset_stats()
+            run_file('examples/test_arith.pn')
+            assert settings.get_stats().get('stdlib snapshot hits', 0) == 1
+        finally:
+            settings.set_cache_dir(orig_cache_dir)
+            settings.stdlib_prog = orig_stdlib_prog
+
+def test_parse_cache():
+    orig_cache_dir = settings.cache_dir
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        settings.set_cache_dir(cache_dir)
+
+        try:
+            # min generates fresh names while parsing, which have to be renamed when we load the cached AST
+            run_file('examples/test_min_function.pn')
+
+            settings.reset_stats()
+            run_file('examples/test_min_function.pn')
+            assert settings.get_stats().get('parse cache hits', 0) >= 1
+        finally:
+            settings.set_cache_dir(orig_cache_dir)
+
+def test_cache_eviction():
+    orig_cache_dir = settings.cache_dir
+    orig_cache_max_size = settings.get_cache_max_size()
+    orig_stdlib_prog = settings.stdlib_prog
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        settings.set_cache_dir(cache_dir).set_cache_max_size(0)
+
+        try:
+            # Load the standard library again, so that we write (and evict) its snapshot too
+            settings.stdlib_prog = None
+            settings.reset_stats()
+            run_file('examples/test_min_function.pn')
+            # Parsed files and snapshots count towards the size of the cache like cached automata do, so none of them are kept
+            assert settings.get_stats().get('cache evictions', 0) >= 1
+            assert not any(name.startswith('parse-') for name in os.listdir(cache_dir))
+            assert not any(name.startswith('stdlib-') for name in os.listdir(cache_dir))
+        finally:
+            settings.set_cache_dir(orig_cache_dir).set_cache_max_size(orig_cache_max_size)
+            settings.stdlib_prog = orig_stdlib_prog
+
+def test_diamond_import():
+    settings.reset_stats()
+    run_file('examples/test_diamond_import.pn')
+    assert settings.get_stats().get('module cache hits', 0) >= 1
+
+def test_failing_import_per_program():
+    orig_quiet = settings.is_quiet()
+    orig_output_json = settings.get_output_json()
+    settings.set_quiet(False).set_output_json(True)
+    try:
+        # Each program imports the module for itself, so both report that its assertion failed
+        for _ in range(2):
+            settings.reset_stats()
+            start = len(settings.get_output())
+            program.load('examples/test_import_failing_module.pn').evaluate()
+            assert settings.get_stats().get('module cache misses', 0) == 1
+            assert 'all_zero is not true.' in settings.get_output()[start:]
+    finally:
+        settings.set_quiet(orig_quiet).set_output_json(orig_output_json)
+
+def test_lazy_load():
+    settings.reset_stats()
+    run_file('examples/test_lazy_load.pn')
+    assert settings.get_stats().get('lazy automata loaded', 0) == 1
+
+def test_lazy_load_output():
+    orig_quiet = settings.is_quiet()
+    orig_output_json = settings.get_output_json()
+    settings.set_quiet(False).set_output_json(True)
+    try:
+        start = len(settings.get_output())
+        program.load('examples/test_lazy_load.pn').evaluate()
+        # Each #load says what it loads when it runs, even if the file is never parsed
+        assert 'Loading has_zeros(' in settings.get_output()[start:]
+        assert 'Loading all_ones(' in settings.get_output()[start:]
+
+        start = len(settings.get_output())
+        program.load('examples/test_lazy_load_stdlib.pn').evaluate()
+        # The standard library is loaded quietly, so parsing bin_add when we first need it doesn't say anything either
+        assert 'bin_add' not in settings.get_output()[start:]
+    finally:
+        settings.set_quiet(orig_quiet).set_output_json(orig_output_json)
+
+def test_plot_layer_sweep():
+    from pecan.lib.plot import BuchiPlotter
+
+    # The layer-by-layer sweep should hit exactly the same cells as testing every prefix separately
+    for name, layer in [('sierpinski3', 3), ('hilbert', 2)]:
+        prog, alphabets, aut = load_plot_example(name)
+        plotter = BuchiPlotter(prog, alphabets, aut, layer=layer, save_to=None)
+        assert (plotter.get_hit_cell_bitmap(aut, layer).bitmap == plotter.get_hit_cell_bitmap_by_prefixes(aut, layer).bitmap).all()
+
+def test_plot_parallel():
+    from pecan.lib.plot import BuchiPlotter
+
+    prog, alphabets, aut = load_plot_example('hilbert')
+    sequential = BuchiPlotter(prog, alphabets, aut, layer=4, save_to=None, workers=1).get_hit_cell_bitmap(aut, 4)
+    parallel = BuchiPlotter(prog, alphabets, aut, layer=4, save_to=None, workers=2).get_hit_cell_bitmap(aut, 4)
+    assert (sequential.bitmap == parallel.bitmap).all()
+
+def test_plot_layer_range():
+    from pecan.lib.plot import BuchiPlotter
+
+    prog, alphabets, aut = load_plot_example('sierpinski3')
+
+    # A range of layers comes out of one sweep, and each layer matches plotting it on its own
+    plotter = BuchiPlotter(prog, alphabets, aut, layer=4, save_to=None, workers=1)
+    bitmaps = plotter.get_hit_cell_bitmaps(aut, [2, 3, 4])
+
+    for layer in [2, 3, 4]:
+        fresh = BuchiPlotter(prog, alphabets, aut, layer=layer, save_to=None, workers=1).get_hit_cell_bitmap(aut, layer)
+        assert (bitmaps[layer].hits() == fresh.hits()).all()
+        assert bitmaps[layer].count() == fresh.count() > 0
+
+def test_plot_export():
+    import numpy as np
+    from pecan.lib.plot import BuchiPlotter
+
+    prog, alphabets, aut = load_plot_example('sierpinski3')
+    hits = BuchiPlotter(prog, alphabets, aut, layer=3, save_to=None).get_hit_cell_bitmap(aut, 3).hits()
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        npy_path = os.path.join(out_dir, 'plot.npy')
+        BuchiPlotter(prog, alphabets, aut, layer=3, save_to=npy_path, plot_method='npy').plot()
+        assert (np.argwhere(np.load(npy_path)) == hits).all()
+
+        cells_path = os.path.join(out_dir, 'plot.txt')
+        BuchiPlotter(prog, alphabets, aut, layer=3, save_to=cells_path, plot_method='cells').plot()
+        assert (np.loadtxt(cells_path, dtype=int, ndmin=2)[:, 1:] == hits).all()
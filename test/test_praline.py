@@ -28,6 +28,14 @@ def test_praline_list():
 def test_praline_match():
     run_file('examples/test_praline_match.pn', '4\n[1,4,9,16]\n-49\n')
 
+def test_praline_match_no_compiler():
+    settings.set_praline_compiler(False)
+
+    try:
+        run_file('examples/test_praline_match.pn', '4\n[1,4,9,16]\n-49\n')
+    finally:
+        settings.set_praline_compiler(True)
+
 def test_praline_compose():
     run_file('examples/test_praline_compose.pn', '1\n0\n2\n')
 